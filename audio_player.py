@@ -1,17 +1,269 @@
 import pygame
+import io
 import time
 import os
+import queue
 import asyncio
+import threading
+import numpy as np
+from collections import deque
+from concurrent.futures import Future
 import soundfile as sf
 from mutagen.mp3 import MP3
 
 
+class PlaybackItem:
+    """
+    One queued file, or decoded PCM audio (sound is set).
+    future is True once it played to the end, False if it was skipped
+    """
+
+    def __init__(self, file_path, on_start=None, sound=None, length=None):
+        self.file_path = file_path
+        self.on_start = on_start
+        self.sound = sound
+        self.future = Future()
+        self.length = length
+        self.started = None
+        self.ends = None
+        self.announced = False  # on_start was called
+
+
 class AudioManager:
 
     def __init__(self):
         # Use higher frequency to prevent audio glitching noises
         # Use higher buffer because why not (default is 512)
         pygame.mixer.init(frequency=48000, buffer=1024) 
+        # Playback engine: queued files are played one after another on a dedicated thread
+        self.playback_queue = queue.Queue()
+        self.now_playing = None
+        # PCM chunks play on their own channel, the next chunk is always queued behind the current one so there's no gap
+        pygame.mixer.set_reserved(1)
+        self.pcm_channel = pygame.mixer.Channel(0)
+        self.pcm_playing = deque()  # chunks on the channel (playing or queued), in order
+        self.pcm_lock = threading.Lock()  # the playback thread changes pcm_playing, status() copies it
+        self.skip_event = threading.Event()
+        self.playback_thread = threading.Thread(target=self._playback_loop, daemon=True)
+        self.playback_thread.start()
+
+    @staticmethod
+    def _file_length(file_path):
+        """Length of a wav or mp3 file in seconds, None for other formats"""
+        _, ext = os.path.splitext(file_path) # Get the extension of this file
+        if ext.lower() == '.wav':
+            with sf.SoundFile(file_path) as wav_file:
+                return wav_file.frames / wav_file.samplerate
+        if ext.lower() == '.mp3':
+            return MP3(file_path).info.length
+        return None
+
+    def enqueue(self, file_path, on_start=None, on_done=None):
+        """
+        Queue a file for playback and return right away.
+        on_start(item) is called on the playback thread right before the file starts,
+        on_done(future) once it finished, was skipped or cancelled.
+        Returns a Future that is True once the file played to the end, False if it was skipped
+        """
+        return self._enqueue_item(PlaybackItem(file_path, on_start), on_done)
+
+    def _enqueue_item(self, item, on_done=None):
+        if on_done:
+            item.future.add_done_callback(on_done)
+        self.playback_queue.put(item)
+        return item.future
+
+    def _mixer_format(self):
+        """(frequency, bytes per sample, channels) of the mixer"""
+        if not pygame.mixer.get_init(): # Reinitialize mixer if needed
+            pygame.mixer.init(frequency=48000, buffer=1024) 
+        frequency, size, channels = pygame.mixer.get_init()
+        # size is in bits, negative for signed samples
+        return frequency, abs(size) // 8, channels
+
+    def _make_sound(self, samples, sample_rate=None, channels=1):
+        """
+        Convert PCM samples to a pygame Sound in the mixer's format.
+        samples: int16 bytes, or a numpy array (float -1..1 or int16) of shape (frames,) or (frames, channels).
+        Returns the Sound and its length in seconds, worked out from the number of frames
+        """
+        frequency, _, mixer_channels = self._mixer_format()
+        if isinstance(samples, (bytes, bytearray, memoryview)):
+            samples = np.frombuffer(samples, dtype=np.int16)
+        samples = np.asarray(samples)
+        if samples.dtype.kind == 'f':
+            samples = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+        if samples.ndim == 1:
+            samples = samples.reshape(-1, channels)
+        if sample_rate and sample_rate != frequency and len(samples) > 1:
+            # Linear resampling to the mixer rate
+            frames = int(round(len(samples) * frequency / sample_rate))
+            positions = np.linspace(0, len(samples) - 1, frames)
+            samples = np.stack([np.interp(positions, np.arange(len(samples)), samples[:, c])
+                                for c in range(samples.shape[1])], axis=1).astype(np.int16)
+        if samples.shape[1] != mixer_channels:
+            mono = samples.mean(axis=1, keepdims=True).astype(np.int16)
+            samples = np.repeat(mono, mixer_channels, axis=1)
+        sound = pygame.mixer.Sound(buffer=np.ascontiguousarray(samples, dtype=np.int16).tobytes())
+        return sound, len(samples) / frequency
+
+    def enqueue_pcm(self, samples, sample_rate=None, channels=1, on_start=None, on_done=None):
+        """
+        Queue decoded audio (see _make_sound) and return right away. Consecutive chunks play without gaps.
+        Returns a Future like enqueue()
+        """
+        sound, length = self._make_sound(samples, sample_rate, channels)
+        return self._enqueue_item(PlaybackItem(None, on_start, sound, length), on_done)
+
+    def enqueue_decoded(self, file_path, on_start=None, on_done=None, data=None):
+        """
+        Decode a file now (on the caller's thread) and queue it as PCM, so it follows the previous chunk without a gap.
+        data: the file's bytes if they are already in memory, then the file isn't read
+        """
+        frequency, sample_bytes, channels = self._mixer_format()
+        sound = pygame.mixer.Sound(io.BytesIO(data) if data is not None else file_path)
+        # The sound is in the mixer's format, the length comes from the sample count instead of re-reading the file
+        length = len(sound.get_raw()) / (sample_bytes * channels * frequency)
+        return self._enqueue_item(PlaybackItem(file_path, on_start, sound, length), on_done)
+
+    @staticmethod
+    def _announce(item):
+        item.announced = True
+        if item.on_start:
+            try:
+                item.on_start(item)
+            except Exception as e:
+                print(f"Error in playback start callback: {e}")
+
+    def _settle_pcm(self):
+        """Call on_start of PCM chunks that started playing, resolve the futures of those that finished (or were skipped)"""
+        if self.skip_event.is_set() and self.pcm_playing:
+            self.pcm_channel.stop()
+            with self.pcm_lock:
+                skipped = list(self.pcm_playing)
+                self.pcm_playing.clear()
+            for item in skipped:
+                item.future.set_result(False)
+            self.skip_event.clear()
+        now = time.time()
+        for item in list(self.pcm_playing):
+            if item.started > now:
+                break
+            if not item.announced:
+                self._announce(item)
+        while self.pcm_playing and self.pcm_playing[0].ends <= now:
+            with self.pcm_lock:
+                item = self.pcm_playing.popleft()
+            item.future.set_result(True)
+
+    def _wait_for_pcm(self, until):
+        """Wait until until() is true, settling PCM chunks meanwhile. False if the chunks were skipped"""
+        while not until():
+            if self.skip_event.is_set():
+                self._settle_pcm()
+                return False
+            self._settle_pcm()
+            time.sleep(0.005)
+        return True
+
+    def _play_pcm_item(self, item):
+        """Put a PCM chunk on the channel, without waiting for it to finish"""
+        # The channel holds one queued sound, wait until the previously queued chunk started
+        if not self._wait_for_pcm(lambda: self.pcm_channel.get_queue() is None):
+            item.future.set_result(False)
+            return
+        now = time.time()
+        previous_end = self.pcm_playing[-1].ends if self.pcm_playing else now
+        if self.pcm_channel.get_busy():
+            self.pcm_channel.queue(item.sound)
+        else:
+            self.pcm_channel.play(item.sound)
+            previous_end = now
+        item.started = max(previous_end, now)
+        item.ends = item.started + item.length
+        with self.pcm_lock:
+            self.pcm_playing.append(item)
+        # A queued chunk is announced by _settle_pcm once the one before it ended
+        if item.started <= now:
+            self._announce(item)
+
+    def _playback_loop(self):
+        while True:
+            try:
+                item = self.playback_queue.get(timeout=0.02)
+            except queue.Empty:
+                self._settle_pcm()
+                continue
+            if not item.future.set_running_or_notify_cancel():
+                continue
+            if item.sound is not None:
+                self._play_pcm_item(item)
+                continue
+            # Files play after the PCM chunks before them
+            self._wait_for_pcm(lambda: not self.pcm_playing)
+            self.now_playing = item
+            self.skip_event.clear()
+            try:
+                if not pygame.mixer.get_init(): # Reinitialize mixer if needed
+                    pygame.mixer.init(frequency=48000, buffer=1024) 
+                pygame.mixer.music.load(item.file_path)
+                item.length = self._file_length(item.file_path)
+                item.started = time.time()
+                self._announce(item)
+                pygame.mixer.music.play()
+                while pygame.mixer.music.get_busy() and not self.skip_event.wait(0.05):
+                    pass
+                skipped = self.skip_event.is_set()
+                if skipped:
+                    pygame.mixer.music.stop()
+                self.now_playing = None
+                item.future.set_result(not skipped)
+            except Exception as e:
+                print(f"Error playing {item.file_path}: {e}")
+                self.now_playing = None
+                item.future.set_exception(e)
+
+    def skip(self):
+        """Stop the file (or the PCM chunks) that's playing, the queue continues with the next one"""
+        if self.now_playing is not None or self.pcm_playing:
+            self.skip_event.set()
+            return True
+        return False
+
+    def clear(self):
+        """Cancel everything that's queued and stop the current file"""
+        cancelled = 0
+        while True:
+            try:
+                item = self.playback_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item.future.cancel():
+                cancelled += 1
+        self.skip()
+        return cancelled
+
+    def is_busy(self):
+        return self.now_playing is not None or bool(self.pcm_playing) or not self.playback_queue.empty()
+
+    def wait_until_idle(self, poll=0.05):
+        """Block until nothing is playing or queued"""
+        while self.is_busy():
+            time.sleep(poll)
+
+    def status(self):
+        item = self.now_playing
+        with self.pcm_lock:
+            pcm_playing = list(self.pcm_playing)
+        if item is None and pcm_playing:
+            item = pcm_playing[0]
+        return {
+            "now_playing": (item.file_path or "pcm") if item else None,
+            "elapsed": round(time.time() - item.started, 2) if item and item.started else None,
+            "length": round(item.length, 2) if item and item.length else None,
+            "queued": self.playback_queue.qsize() + max(len(pcm_playing) - 1, 0),
+            "pcm_buffered_seconds": round(max(pcm_playing[-1].ends - time.time(), 0), 2) if pcm_playing else 0.0
+        }
 
     def play_audio(self, file_path, sleep_during_playback=True, delete_file=False, play_using_music=True):
         """
@@ -25,37 +277,34 @@ class AudioManager:
         if not pygame.mixer.get_init(): # Reinitialize mixer if needed
             pygame.mixer.init(frequency=48000, buffer=1024) 
         if play_using_music:
-            # Pygame Music can only play one file at a time
-            pygame.mixer.music.load(file_path)
-            pygame.mixer.music.play()
+            # Pygame Music can only play one file at a time, it belongs to the playback thread so the file is queued
+            future = self.enqueue(file_path)
         else:
             # Pygame Sound lets you play multiple sounds simultaneously
             pygame_sound = pygame.mixer.Sound(file_path) 
             pygame_sound.play()
 
         if sleep_during_playback:
-            # Calculate length of the file, based on the file format
-            _, ext = os.path.splitext(file_path) # Get the extension of this file
-            if ext.lower() == '.wav':
-                wav_file = sf.SoundFile(file_path)
-                file_length = wav_file.frames / wav_file.samplerate
-                wav_file.close()
-            elif ext.lower() == '.mp3':
-                mp3_file = MP3(file_path)
-                file_length = mp3_file.info.length
+            if play_using_music:
+                # Wait until the file was played (or skipped)
+                try:
+                    future.result()
+                except Exception:
+                    return
             else:
-                print("Cannot play audio, unknown file type")
-                return
+                # Calculate length of the file, based on the file format
+                file_length = self._file_length(file_path)
+                if file_length is None:
+                    print("Cannot play audio, unknown file type")
+                    return
 
-            # Sleep until file is done playing
-            time.sleep(file_length)
+                # Sleep until file is done playing
+                time.sleep(file_length)
 
              # Delete the file if requested
             if delete_file:
                 try:
-                    if play_using_music:
-                        pygame.mixer.music.stop()  # Stop the music playback
-                    else:
+                    if not play_using_music:
                         pygame_sound.stop()  # Stop the sound playback
 
                     # Ensure the file is closed before deleting
@@ -69,6 +318,16 @@ class AudioManager:
                 except Exception as e:
                     print(f"Error deleting file: {e}")
 
+    def play_sound(self, file_path):
+        """
+        Play a file on a free pygame Sound channel and return right away, e.g. for sounds under other audio.
+        Returns the channel (for fadeout/stop, None if no channel was free) and the length in seconds
+        """
+        if not pygame.mixer.get_init(): # Reinitialize mixer if needed
+            pygame.mixer.init(frequency=48000, buffer=1024) 
+        pygame_sound = pygame.mixer.Sound(file_path)
+        return pygame_sound.play(), pygame_sound.get_length()
+
     async def play_audio_async(self, file_path):
         """
         Parameters:
@@ -81,15 +340,8 @@ class AudioManager:
         pygame_sound.play()
 
         # Calculate length of the file, based on the file format
-        _, ext = os.path.splitext(file_path) # Get the extension of this file
-        if ext.lower() == '.wav':
-            wav_file = sf.SoundFile(file_path)
-            file_length = wav_file.frames / wav_file.samplerate
-            wav_file.close()
-        elif ext.lower() == '.mp3':
-            mp3_file = MP3(file_path)
-            file_length = mp3_file.info.length
-        else:
+        file_length = self._file_length(file_path)
+        if file_length is None:
             print("Cannot play audio, unknown file type")
             return
 
@@ -0,0 +1,154 @@
+import os
+import time
+import threading
+from rich import print
+from audio_stream import AudioStream
+
+
+class ArtifactExistsError(Exception):
+    """Raised when an artifact id is registered a second time"""
+
+
+class AudioArtifactStore:
+    """
+    Response audio of recent turns, served to the browser from memory.
+    Every artifact is an AudioStream, readers can start while it's still being written.
+    Artifacts in use (being produced, played or downloaded) are reference counted and never evicted.
+    Unused ones are dropped after ttl seconds, or oldest first once the store is over its byte budget.
+    Finished artifacts larger than spill_bytes are moved to disk so they don't sit in memory.
+    """
+
+    def __init__(self, directory="audio_artifacts", max_bytes=64 * 1024 * 1024, ttl=600, spill_bytes=2 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_bytes = spill_bytes
+        self.artifacts = {}  # id -> AudioStream, oldest first
+        self.lock = threading.Lock()
+        self.registered = threading.Condition(self.lock)
+        self.evicted = 0
+        self.spilled = 0
+        os.makedirs(directory, exist_ok=True)
+        # Spilled files of a previous run have no artifact anymore
+        for file_name in os.listdir(directory):
+            try:
+                os.remove(os.path.join(directory, file_name))
+            except OSError as e:
+                print(f"Error deleting old audio artifact: {e}")
+
+    def create(self, artifact_id):
+        """
+        Register a new artifact. Only turns create artifacts, an id that's already taken
+        (e.g. a browser reusing its stream id) raises ArtifactExistsError instead of writing into the old one
+        """
+        with self.lock:
+            if artifact_id in self.artifacts:
+                raise ArtifactExistsError(f"Audio artifact {artifact_id} already exists")
+            artifact = self.artifacts[artifact_id] = AudioStream(artifact_id, on_close=self._closed)
+            self.registered.notify_all()
+            artifact.last_used = time.time()
+        self._sweep()
+        return artifact
+
+    def wait_for(self, artifact_id, timeout):
+        """
+        The artifact with this id, waits up to timeout seconds for a turn to register it
+        (the browser may ask for it before its request arrived). None if nothing registered it
+        """
+        with self.registered:
+            self.registered.wait_for(lambda: artifact_id in self.artifacts, timeout)
+            artifact = self.artifacts.get(artifact_id)
+            if artifact is not None:
+                artifact.last_used = time.time()
+            return artifact
+
+    def get(self, artifact_id):
+        with self.lock:
+            artifact = self.artifacts.get(artifact_id)
+            if artifact is not None:
+                artifact.last_used = time.time()
+            return artifact
+
+    def acquire(self, artifact):
+        with self.lock:
+            artifact.refs += 1
+            artifact.last_used = time.time()
+
+    def release(self, artifact):
+        with self.lock:
+            artifact.refs -= 1
+            artifact.last_used = time.time()
+        self._sweep()
+
+    def iter_chunks(self, artifact):
+        """artifact.iter_chunks(), holding a reference while the reader is active"""
+        self.acquire(artifact)
+        try:
+            yield from artifact.iter_chunks()
+        finally:
+            self.release(artifact)
+
+    def read_range(self, artifact, start, end):
+        """artifact.read_range(), holding a reference so the artifact isn't spilled or dropped during the read"""
+        self.acquire(artifact)
+        try:
+            return artifact.read_range(start, end)
+        finally:
+            self.release(artifact)
+
+    def _closed(self, artifact):
+        self._sweep()
+
+    def _spill(self, artifact):
+        """Move a finished artifact's audio to disk"""
+        path = os.path.join(self.directory, f"{artifact.stream_id}.mp3")
+        with artifact.condition:
+            with open(path, "wb") as f:
+                for chunk in artifact.chunks:
+                    f.write(chunk)
+            artifact.path = path
+            artifact.chunks = []
+        self.spilled += 1
+
+    def _drop(self, artifact_id):
+        artifact = self.artifacts.pop(artifact_id)
+        # Wakes up waiting readers, without calling back into the store
+        artifact.on_close = None
+        artifact.close()
+        self.evicted += 1
+        if artifact.path:
+            try:
+                os.remove(artifact.path)
+            except OSError as e:
+                print(f"Error deleting audio artifact: {e}")
+
+    def _sweep(self):
+        """Spill big finished artifacts, drop expired ones and the oldest unused ones above the byte budget"""
+        now = time.time()
+        with self.lock:
+            for artifact_id, artifact in list(self.artifacts.items()):
+                if artifact.refs > 0:
+                    continue
+                if now - artifact.last_used > self.ttl:
+                    self._drop(artifact_id)
+                elif artifact.closed and not artifact.path and artifact.size > self.spill_bytes:
+                    self._spill(artifact)
+            total = sum(artifact.size for artifact in self.artifacts.values())
+            for artifact_id, artifact in list(self.artifacts.items()):
+                if total <= self.max_bytes:
+                    break
+                if artifact.refs == 0 and artifact.closed:
+                    total -= artifact.size
+                    self._drop(artifact_id)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "artifacts": len(self.artifacts),
+                "open": sum(1 for artifact in self.artifacts.values() if not artifact.closed),
+                "in_use": sum(1 for artifact in self.artifacts.values() if artifact.refs > 0),
+                "memory_bytes": sum(artifact.size for artifact in self.artifacts.values() if not artifact.path),
+                "disk_bytes": sum(artifact.size for artifact in self.artifacts.values() if artifact.path),
+                "evicted": self.evicted,
+                "spilled": self.spilled
+            }
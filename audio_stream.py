@@ -0,0 +1,92 @@
+import time
+import threading
+
+
+class AudioStream:
+    """
+    Mp3 audio of one turn that's still being produced.
+    The speech pipeline writes sentence clips as they are synthesized, HTTP readers get every chunk
+    as soon as it's written. Readers that connect late start from the first chunk.
+    Once closed, AudioArtifactStore may move the audio to disk (path is set and chunks emptied).
+    """
+
+    def __init__(self, stream_id, mimetype="audio/mpeg", on_close=None):
+        self.stream_id = stream_id
+        self.mimetype = mimetype
+        self.on_close = on_close
+        self.chunks = []
+        self.size = 0
+        self.path = None
+        self.refs = 0
+        self.started = False
+        self.closed = False
+        self.created = time.time()
+        self.last_used = self.created
+        self.condition = threading.Condition()
+
+    def write(self, data):
+        if not data:
+            return
+        with self.condition:
+            self.chunks.append(data)
+            self.size += len(data)
+            self.condition.notify_all()
+
+    def start(self):
+        """The turn that writes the stream started, readers wait for chunks with a timeout from now on"""
+        with self.condition:
+            self.started = True
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify_all()
+        if self.on_close:
+            self.on_close(self)
+
+    def iter_chunks(self, timeout=300, block_size=64 * 1024):
+        """
+        Yields the chunks in order, waits for new ones until the stream is closed (or nothing arrives for timeout seconds).
+        Until the turn started (it may be queued behind others) readers wait without a timeout,
+        the turn closes the stream whatever happens
+        """
+        if self.path:
+            with open(self.path, "rb") as f:
+                while True:
+                    block = f.read(block_size)
+                    if not block:
+                        return
+                    yield block
+        position = 0
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: position < len(self.chunks) or self.closed or self.started)
+                if position >= len(self.chunks) and not self.closed:
+                    self.condition.wait_for(lambda: position < len(self.chunks) or self.closed, timeout)
+                if position >= len(self.chunks):
+                    return
+                chunk = self.chunks[position]
+            position += 1
+            yield chunk
+
+    def read_range(self, start, end):
+        """Bytes start..end (inclusive) of a closed stream. Hold a reference (AudioArtifactStore.read_range) so it isn't spilled or dropped meanwhile"""
+        with self.condition:
+            path, chunks = self.path, list(self.chunks)
+        if path:
+            with open(path, "rb") as f:
+                f.seek(start)
+                return f.read(end - start + 1)
+        parts = []
+        offset = 0
+        for chunk in chunks:
+            chunk_end = offset + len(chunk)
+            if chunk_end > start and offset <= end:
+                parts.append(chunk[max(start - offset, 0):end - offset + 1])
+            offset = chunk_end
+            if offset > end:
+                break
+        return b"".join(parts)
@@ -0,0 +1,288 @@
+import math
+import threading
+from concurrent.futures import Future
+from collections import deque
+from rich import print
+
+
+class WordCountTokenizer:
+    """Counts whitespace separated words (the old 'ollama' fallback)"""
+
+    def count(self, text):
+        return len(text.split())
+
+
+class CharApproxTokenizer:
+    """Approximates tokens from the text length. ~4 characters per token fits Qwen/Llama models on English text"""
+
+    def __init__(self, chars_per_token=4.0):
+        self.chars_per_token = chars_per_token
+
+    def count(self, text):
+        return math.ceil(len(text) / self.chars_per_token)
+
+
+class TiktokenTokenizer:
+    """Exact token counts for OpenAI models using tiktoken"""
+
+    def __init__(self, encoding_name="cl100k_base"):
+        import tiktoken
+        self.encoding = tiktoken.get_encoding(encoding_name)
+
+    def count(self, text):
+        return len(self.encoding.encode(text))
+
+
+def make_tokenizer(name="approx"):
+    """
+    Build a tokenizer from a short name:
+    "approx" (characters / 4), "words" (word count) or "tiktoken" / "tiktoken:<encoding name>"
+    """
+    if name == "approx":
+        return CharApproxTokenizer()
+    if name == "words":
+        return WordCountTokenizer()
+    if name.startswith("tiktoken"):
+        _, _, encoding_name = name.partition(":")
+        return TiktokenTokenizer(encoding_name or "cl100k_base")
+    raise ValueError(f"Unknown tokenizer '{name}'. Choices are: approx, words, tiktoken[:<encoding>]")
+
+
+class TokenBudgetHistory:
+    """
+    Chat history that keeps track of its token count.
+    Every message is tokenized once when it's added, the total is kept up to date,
+    and the oldest messages are evicted in O(1) when the budget is exceeded.
+    The first system message is pinned and never evicted, followed by an optional summary
+    of older turns (see ConversationCompactor).
+    There is also a single replaceable context slot (e.g. recent Twitch chat) that is placed
+    right before the user message it was set for instead of being stored in the history.
+    All methods are thread safe so the history can be compacted in the background.
+    """
+
+    def __init__(self, max_tokens=8000, tokenizer=None, tokens_per_message=4):
+        self.max_tokens = max_tokens
+        self.tokenizer = tokenizer or CharApproxTokenizer()
+        # every message follows <im_start>{role/name}\n{content}<im_end>\n
+        self.tokens_per_message = tokens_per_message
+        self.pinned = None  # (message, tokens)
+        self.summary = None  # (message, tokens)
+        self.context = None  # (message, tokens)
+        self.context_anchor = None  # the user message the context belongs to, None until it's appended
+        self.turns = deque()  # (message, tokens), oldest first
+        self.total_tokens = 0
+        self.lock = threading.RLock()
+
+    def count_message(self, message):
+        """Token count of a single message"""
+        return self.tokenizer.count(str(message.get("content", ""))) + self.tokens_per_message
+
+    def reset(self, messages=()):
+        """
+        Replace the whole history, the first message is pinned if it's a system message.
+        A conversation summary right after it (e.g. from a restored journal) goes back into the summary slot
+        """
+        with self.lock:
+            self.pinned = None
+            self.summary = None
+            self.context = None
+            self.context_anchor = None
+            self.turns.clear()
+            self.total_tokens = 0
+            for message in messages:
+                if message is None:
+                    continue
+                if self.pinned is None and not self.turns and message.get("role") == "system":
+                    tokens = self.count_message(message)
+                    self.pinned = (message, tokens)
+                    self.total_tokens += tokens
+                elif (self.pinned and self.summary is None and not self.turns
+                      and str(message.get("content", "")).startswith(ConversationCompactor.SUMMARY_PREFIX)):
+                    tokens = self.count_message(message)
+                    self.summary = (message, tokens)
+                    self.total_tokens += tokens
+                else:
+                    self.append(message)
+
+    def append(self, message):
+        tokens = self.count_message(message)
+        with self.lock:
+            self.turns.append((message, tokens))
+            self.total_tokens += tokens
+            if self.context and self.context_anchor is None and message.get("role") == "user":
+                self.context_anchor = message
+        return tokens
+
+    def set_context(self, content):
+        """
+        Fill the context slot with content, None empties it. The previous context is replaced, not kept.
+        The context stays in front of the next user message, also after the reply was added
+        """
+        message = {"role": "system", "content": content} if content else None
+        tokens = self.count_message(message) if message else 0
+        with self.lock:
+            if self.context:
+                self.total_tokens -= self.context[1]
+            self.context = (message, tokens) if message else None
+            self.context_anchor = None
+            self.total_tokens += tokens
+
+    def evict_oldest(self):
+        """Remove the oldest non-pinned message and return it"""
+        with self.lock:
+            message, tokens = self.turns.popleft()
+            self.total_tokens -= tokens
+            return message
+
+    def trim(self):
+        """Evict old messages until the history fits the budget. The newest message is always kept. Returns the removed messages"""
+        removed = []
+        with self.lock:
+            while self.total_tokens > self.max_tokens and len(self.turns) > 1:
+                removed.append(self.evict_oldest())
+        return removed
+
+    def oldest_block(self, max_tokens, keep_recent=4):
+        """The oldest messages adding up to about max_tokens, never touching the keep_recent newest ones"""
+        block = []
+        block_tokens = 0
+        with self.lock:
+            candidates = len(self.turns) - keep_recent
+            for message, tokens in self.turns:
+                if len(block) >= candidates or block_tokens >= max_tokens:
+                    break
+                block.append(message)
+                block_tokens += tokens
+        return block
+
+    def replace_with_summary(self, block, summary_message):
+        """
+        Atomically swap the messages in block (the oldest turns) for summary_message.
+        Returns False without changing anything if the history changed in the meantime
+        and block is no longer at the front of it.
+        """
+        summary_tokens = self.count_message(summary_message)
+        with self.lock:
+            if len(block) > len(self.turns):
+                return False
+            for expected, (message, _) in zip(block, self.turns):
+                if message is not expected:
+                    return False
+            for _ in block:
+                self.evict_oldest()
+            if self.summary:
+                self.total_tokens -= self.summary[1]
+            self.summary = (summary_message, summary_tokens)
+            self.total_tokens += summary_tokens
+        return True
+
+    def messages(self):
+        """The history as a plain list of messages, ready to send to the model"""
+        with self.lock:
+            result = [self.pinned[0]] if self.pinned else []
+            if self.summary:
+                result.append(self.summary[0])
+            start = len(result)
+            result.extend(message for message, _ in self.turns)
+            if self.context:
+                # Right before its user message, so everything in front of it stays the same
+                position = len(result)
+                if self.context_anchor is not None:
+                    # The oldest turn if the user message was evicted meanwhile
+                    position = start
+                    for index in range(len(result) - 1, start - 1, -1):
+                        if result[index] is self.context_anchor:
+                            position = index
+                            break
+                elif self.turns and self.turns[-1][0].get("role") == "user":
+                    position -= 1
+                result.insert(position, self.context[0])
+        return result
+
+    def __iter__(self):
+        return iter(self.messages())
+
+    def __len__(self):
+        return len(self.turns) + (1 if self.pinned else 0) + (1 if self.summary else 0) + (1 if self.context else 0)
+
+
+class ConversationCompactor:
+    """
+    Keeps the history under budget by summarizing old turns instead of dropping them.
+    Once the history passes the high-water mark, a background thread summarizes a block
+    of the oldest turns (together with the previous summary) into one summary message and
+    swaps it in atomically. Between compactions the prompt prefix stays the same,
+    so the model server can reuse its cached prefix.
+    """
+
+    SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+    def __init__(self, history, summarize, high_water=0.75, block_fraction=0.5, keep_recent=4, on_compacted=None,
+                 submit=None):
+        """
+        Parameters:
+        history (TokenBudgetHistory): the history to compact
+        summarize (function): summarize(previous_summary, messages) -> summary text, or None on failure
+        high_water (float): fraction of history.max_tokens that triggers a compaction
+        block_fraction (float): fraction of history.max_tokens that is summarized in one go
+        keep_recent (int): number of newest messages that are never summarized
+        on_compacted (function): called with (block, summary_message) after a successful swap
+        submit (function): submit(job) runs job in the background and returns a Future, e.g. on the turn scheduler
+                           so a summary is never generated at the same time as an answer. Defaults to a new thread
+        """
+        self.history = history
+        self.summarize = summarize
+        self.high_water = high_water
+        self.block_fraction = block_fraction
+        self.keep_recent = keep_recent
+        self.on_compacted = on_compacted
+        self.submit = submit or self._start_thread
+        self.job = None
+        self.compactions = 0
+
+    def maybe_compact(self):
+        """Start a background compaction if the history passed the high-water mark. Returns True if one was started"""
+        if self.history.total_tokens <= self.history.max_tokens * self.high_water:
+            return False
+        if self.job is not None and not self.job.done():
+            return False
+        try:
+            self.job = self.submit(self._compact)
+        except Exception as e:
+            print(f"Couldn't start a compaction, will try again after the next turn: {e}")
+            return False
+        return True
+
+    @staticmethod
+    def _start_thread(job):
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(job())
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def _compact(self):
+        block = self.history.oldest_block(self.history.max_tokens * self.block_fraction, self.keep_recent)
+        if not block:
+            return
+        previous = self.history.summary[0]["content"][len(self.SUMMARY_PREFIX):] if self.history.summary else ""
+        try:
+            summary_text = self.summarize(previous, block)
+        except Exception as e:
+            print(f"Error compacting conversation: {e}")
+            return
+        if not summary_text:
+            return
+        summary_message = {"role": "system", "content": self.SUMMARY_PREFIX + summary_text}
+        if self.history.replace_with_summary(block, summary_message):
+            self.compactions += 1
+            if self.on_compacted:
+                self.on_compacted(block, summary_message)
+            print(f"[cyan]Compacted {len(block)} old messages into a summary. New token length: {self.history.total_tokens}")
+        else:
+            print("[cyan]History changed during compaction, will try again later")
@@ -2,19 +2,25 @@ import time
 from pynput import keyboard
 from pydub import AudioSegment
 from rich import print
-from flask import Flask, request, jsonify, send_from_directory, render_template, send_file
+from flask import Flask, Response, request, jsonify, send_from_directory, render_template, send_file, stream_with_context
 from threading import Lock
-from whisper_speech_to_text import SpeechToTextManager
+from whisper_speech_to_text import SpeechToTextManager, WHISPER_LANGUAGE
+from stt_worker_pool import STTWorkerPool, STTBusyError, STTUnavailableError
 from openai_chat import LocalAiManager
 from eleven_labs import ElevenLabsManager
 from obs_websockets import OBSWebsocketsManager
 from audio_player import AudioManager
+from speech_pipeline import SpeechPipeline
+from filler_clips import FillerLibrary
+from audio_store import AudioArtifactStore, ArtifactExistsError
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from turn_scheduler import TurnScheduler, SchedulerBusyError, RateLimitedError, TurnTimeoutError
+from question_batcher import QuestionBatcher, is_viewer_question, build_batch_prompt, split_batch_sentences, batch_replies
 from emoji import demojize
 import sys
 import os
 import PyPDF2
 import threading
-import glob
 import uuid
 import socket
 import datetime
@@ -28,21 +34,47 @@ app.filtered_messages_lock = Lock()
 app.filtered_messages_global = []
 
 # Initialize Managers
+# Whisper runs in worker processes. The pool comes first, the workers are forked before any other thread is running.
+# Without fork (Windows) Whisper runs in this process like before
+try:
+    stt_pool = STTWorkerPool(language=WHISPER_LANGUAGE)
+except STTUnavailableError as e:
+    print(f"[yellow]{e}, Whisper runs in the main process")
+    stt_pool = None
 elevenlabs_manager = ElevenLabsManager()
 obswebsockets_manager = OBSWebsocketsManager()
-speechtotext_manager = SpeechToTextManager()
-openai_manager = LocalAiManager()
+speechtotext_manager = SpeechToTextManager(worker_pool=stt_pool)
+# Every change to the conversation goes through this single worker, background summaries included
+turn_scheduler = TurnScheduler()
+openai_manager = LocalAiManager(submit_background=lambda job: turn_scheduler.submit("background", job))
+openai_manager.warm_up_in_background()  # Load the model now instead of on the first question
 audio_manager = AudioManager()
+# "Hmm, let me think..." clips that cover the wait for the answer, re-rendered when the voice changes
+filler_library = FillerLibrary(elevenlabs_manager)
+filler_library.prepare_in_background()
+elevenlabs_manager.add_voice_listener(filler_library.prepare_in_background)
+speech_pipeline = SpeechPipeline(elevenlabs_manager, audio_manager, obswebsockets_manager, filler_library=filler_library)
+# Response audio for the browser, streamed while it's being synthesized and kept in memory for a while
+audio_store = AudioArtifactStore()
 
 chat_messages = []
 nickname = 'InFernal_ger'
 channel = '#iti_research'
 
 
+# Viewer questions ('_' prefix/suffix) are always stored. With TWITCH_ANSWER_QUESTIONS they are also collected
+# and answered aloud and in chat, many at once in one LLM turn
+TWITCH_ANSWER_QUESTIONS = os.getenv("TWITCH_ANSWER_QUESTIONS", "false").lower() == "true"
+TWITCH_BATCH_WINDOW = 8  # seconds to collect questions after the first one
+TWITCH_BATCH_MAX_SIZE = 10  # answer early when this many questions are waiting
+
 last_voice_change_time = 0
 voice_cooldown = 300  # 5 minutes in seconds
 voice_lock = Lock()
 
+WEB_TURN_TIMEOUT = 300  # seconds a web request waits for its turn (queue + generation) before giving up with a 503
+AUDIO_STREAM_REGISTER_TIMEOUT = 30  # seconds /audio_stream waits for the request that registers the stream id
+
 def connect_to_twitch(token, nickname, channel):
     try:
         print(f"Attempting to connect to Twitch IRC as {nickname}...")
@@ -149,6 +181,8 @@ def listen_to_twitch(sock):
                 username, message = process_twitch_message(line)
                 if message and username and should_process_message(message, username):
                     store_twitch_message(username, message)
+                    if TWITCH_ANSWER_QUESTIONS and is_viewer_question(message):
+                        question_batcher.add(username, demojize(message))
                     
         except Exception as e:
             print(f"Error in Twitch listener: {e}")
@@ -159,6 +193,34 @@ def listen_to_twitch(sock):
     collected_twitch_messages = []
     return jsonify({"status": "success"})
 
+def run_batch_turn(questions):
+    """
+    Answer a batch of (username, question) pairs with one streamed LLM turn.
+    Every answer is spoken sentence by sentence while the model writes it, the replies go to chat at the end
+    """
+    answers = {}
+    sentences = openai_manager.chat_with_history_stream({
+        "prompt": build_batch_prompt(questions),
+        "source": "twitch",
+        "route": openai_manager.router.classify_batch(questions)
+    })
+    speech_pipeline.speak(split_batch_sentences(sentences, questions, answers))
+    replies = batch_replies(answers, questions)
+    if not replies:
+        print("[red]Couldn't split the batch answer, no tagged answers found")
+        return []
+    for username, text in replies:
+        send_twitch_message(f"@{username} {text}"[:450])
+    return replies
+
+def answer_twitch_questions(questions):
+    try:
+        turn_scheduler.submit("twitch", run_batch_turn, questions)
+    except (SchedulerBusyError, RateLimitedError) as e:
+        print(f"Dropping {len(questions)} Twitch questions: {e}")
+
+question_batcher = QuestionBatcher(answer_twitch_questions, TWITCH_BATCH_WINDOW, TWITCH_BATCH_MAX_SIZE)
+
 @app.route('/twitch_messages')
 def get_twitch_messages():
     try:
@@ -269,36 +331,12 @@ def get_filtered_twitch_messages():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-def load_voices_from_file():
-    """Load available voices from Voices.txt"""
-    voices = {}
-    try:
-        with open("Voices.txt", "r") as f:
-            for line in f:
-                line = line.strip()
-                if line and '-' in line:
-                    name, desc = line.split('-', 1)
-                    voices[name.strip()] = desc.strip()
-        return voices
-    except FileNotFoundError:
-        print("Voices.txt not found, using default voices")
-        return {
-            "James": "Husky & Engaging",
-            "Hope": "soothing narrator",
-            "David": "British Documentary",
-            "Matthew Schmitz": "Old Timer Mountain Man",
-            "Emma": "Adorable and Upbeat",
-            "Emily": "Whisper",
-            "David": "Epic Movie Trailer "
-        }
-
-    
 def handle_voice_command(username, message):
     global last_voice_change_time
     
     try:
         parts = message.split()
-        available_voices = list(elevenlabs_manager.available_voices.keys())
+        available_voices = elevenlabs_manager.voice_catalog.names
         
         # Show current voice if no argument
         if len(parts) == 1:
@@ -334,12 +372,8 @@ def handle_voice_command(username, message):
                 send_twitch_message(f"Please choose 1-{len(available_voices)}")
                 return
         else:
-            # Find best matching voice name (case insensitive)
-            new_voice = None
-            for voice in available_voices:
-                if voice.lower() == voice_arg.lower():
-                    new_voice = voice
-                    break
+            # Case insensitive lookup
+            new_voice = elevenlabs_manager.voice_catalog.lookup(voice_arg)
             
             if not new_voice:
                 send_twitch_message(f"Unknown voice. Options: {', '.join(f'{i+1}. {v}' for i, v in enumerate(available_voices))}")
@@ -373,10 +407,38 @@ def send_twitch_message(message):
         twitch_sock.send(f"PRIVMSG {channel} :{message}\n".encode('utf-8'))
     except Exception as e:
         print(f"Error sending Twitch message: {e}")
-# Preload voices
-TWITCH_VOICES = load_voices_from_file()
 ###############################################
 
+def run_turn(payload, voice=None, play_locally=True, output_path=None, turn_start=None, audio_stream=None):
+    """
+    One conversation turn: stream the LLM answer into TTS (and play it).
+    Only call this through turn_scheduler, it's the only place the chat history gets changed.
+    Returns the spoken answer and the speech pipeline metrics
+    """
+    # The audio artifact is kept at least until the turn finished writing it and everything played locally
+    on_playback = None
+    if audio_stream is not None:
+        audio_store.acquire(audio_stream)
+        audio_stream.start()
+
+        def on_playback(playback):
+            audio_store.acquire(audio_stream)
+            playback.add_done_callback(lambda _: audio_store.release(audio_stream))
+    try:
+        response = speech_pipeline.speak(
+            openai_manager.chat_with_history_stream(payload),
+            voice=voice,
+            play_locally=play_locally,
+            output_path=output_path,
+            turn_start=turn_start,
+            audio_stream=audio_stream,
+            on_playback=on_playback
+        )
+    finally:
+        if audio_stream is not None:
+            audio_store.release(audio_stream)
+    return response, dict(speech_pipeline.last_metrics)
+
 # --- Flask Routes ---
 
 @app.route('/')
@@ -446,16 +508,119 @@ def update_system_message():
     if not system_message:
         return jsonify({"error": f"Failed to read system message file: {selected_file}"}), 400
 
-    # Update the chat history with the new system message
-    openai_manager.chat_history = [system_message]  # Replace the entire chat history
+    # Update the chat history with the new system message, replaces the entire chat history.
+    # Runs on the turn scheduler so it can't happen in the middle of a turn
+    try:
+        turn_scheduler.run("web", setattr, openai_manager, "chat_history", [system_message], timeout=WEB_TURN_TIMEOUT)
+    except (SchedulerBusyError, RateLimitedError) as e:
+        return jsonify({"error": str(e)}), 429
+    except TurnTimeoutError as e:
+        return jsonify({"error": str(e)}), 503
     
     print(f"System message updated successfully with: {selected_file}")
 
     return jsonify({"message": "System message updated successfully"}), 200
 
-@app.route('/audio/<filename>')
-def serve_audio(filename):
-    return send_from_directory("/tmp", filename, mimetype="audio/mpeg") 
+def open_audio_stream(stream_id=None):
+    """
+    Registers the audio artifact of a turn. The browser may pass its own id and start listening
+    before the turn runs, /audio_stream only serves ids that were registered here.
+    Raises ArtifactExistsError if the id was used before
+    """
+    if not stream_id or len(stream_id) > 64 or not all(c.isalnum() or c == '-' for c in stream_id):
+        stream_id = str(uuid.uuid4())
+    return audio_store.create(stream_id)
+
+@app.route('/audio_stream/<stream_id>')
+def stream_audio(stream_id):
+    """Chunked mp3 of a turn, every sentence is sent as soon as it's synthesized"""
+    audio_stream = audio_store.wait_for(stream_id, AUDIO_STREAM_REGISTER_TIMEOUT)
+    if audio_stream is None:
+        return jsonify({"error": "Unknown audio stream"}), 404
+    return Response(stream_with_context(audio_store.iter_chunks(audio_stream)), mimetype=audio_stream.mimetype,
+                    headers={"Cache-Control": "no-store"})
+
+@app.route('/audio/<artifact_id>')
+def serve_audio(artifact_id):
+    """A turn's audio from the artifact store, finished audio supports Range requests (seeking)"""
+    artifact = audio_store.get(artifact_id)
+    if artifact is None:
+        return jsonify({"error": "Audio not found or expired"}), 404
+    if not artifact.closed:
+        return stream_audio(artifact_id)
+
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": "no-store"}
+    range_header = request.headers.get('Range', '')
+    if not range_header.startswith('bytes=') or artifact.size == 0:
+        return Response(audio_store.iter_chunks(artifact), mimetype=artifact.mimetype,
+                        headers={**headers, "Content-Length": str(artifact.size)})
+    try:
+        start, end = range_header[len('bytes='):].split(',')[0].split('-')
+        if start:
+            start, end = int(start), min(int(end), artifact.size - 1) if end else artifact.size - 1
+        else:
+            # Suffix range: the last n bytes
+            start, end = max(artifact.size - int(end), 0), artifact.size - 1
+    except ValueError:
+        return Response(status=416, headers={"Content-Range": f"bytes */{artifact.size}"})
+    if start > end or start >= artifact.size:
+        return Response(status=416, headers={"Content-Range": f"bytes */{artifact.size}"})
+    headers["Content-Range"] = f"bytes {start}-{end}/{artifact.size}"
+    return Response(audio_store.read_range(artifact, start, end), status=206, mimetype=artifact.mimetype, headers=headers)
+
+@app.route('/audio_store', methods=['GET'])
+def get_audio_store_stats():
+    return jsonify(audio_store.stats())
+
+@app.route('/scheduler', methods=['GET'])
+def get_scheduler_stats():
+    return jsonify(turn_scheduler.stats())
+
+@app.route('/question_batches', methods=['GET'])
+def get_question_batch_stats():
+    return jsonify(question_batcher.stats())
+
+@app.route('/model_router', methods=['GET'])
+def get_model_router_stats():
+    return jsonify(openai_manager.router.stats())
+
+@app.route('/tts_cache', methods=['GET'])
+def get_tts_cache_stats():
+    return jsonify(elevenlabs_manager.tts_cache.stats())
+
+@app.route('/stt_workers', methods=['GET'])
+def get_stt_worker_stats():
+    if stt_pool is None:
+        return jsonify({"workers": 0, "available": False})
+    return jsonify(stt_pool.stats())
+
+@app.route('/voice_catalog', methods=['GET'])
+def get_voice_catalog_stats():
+    return jsonify(elevenlabs_manager.voice_catalog.stats())
+
+@app.route('/playback', methods=['GET'])
+def get_playback_status():
+    return jsonify(audio_manager.status())
+
+@app.route('/playback/skip', methods=['POST'])
+def skip_playback():
+    return jsonify({"skipped": audio_manager.skip()})
+
+@app.route('/playback/clear', methods=['POST'])
+def clear_playback():
+    return jsonify({"cancelled": audio_manager.clear()})
+
+@app.route('/fillers', methods=['GET'])
+def get_filler_stats():
+    return jsonify(filler_library.stats())
+
+@app.route('/tts_backends', methods=['GET'])
+def get_tts_backend_stats():
+    return jsonify(elevenlabs_manager.backend_stats())
+
+@app.route('/response_cache', methods=['GET'])
+def get_response_cache_stats():
+    return jsonify(openai_manager.response_cache.stats())
 
 @app.route('/chat_history', methods=['GET'])
 def get_chat_history():
@@ -466,6 +631,7 @@ def get_chat_history():
 
 @app.route('/process_input', methods=['POST'])
 def process_input():
+    turn_start = time.time()
     try:
         # Handle both JSON (old) and FormData (new) requests
         if request.content_type == 'application/json':
@@ -474,10 +640,12 @@ def process_input():
             image_data = None
             use_browser_audio = data.get('use_browser_audio', False)
             voice = data.get('voice')
+            stream_id = data.get('stream_id')
         else:
             user_prompt = request.form.get('prompt', '').strip()
             use_browser_audio = request.form.get('use_browser_audio', 'false').lower() == 'true'
             voice = request.form.get('voice')
+            stream_id = request.form.get('stream_id')
             
             # Handle image upload if present
             image_data = None
@@ -504,42 +672,50 @@ def process_input():
         ollama_payload = {
             "prompt": user_prompt,
             "context": context,
-            "image": image_data  
+            "image": image_data,
+            "source": "web"
         }
 
-        # Get the AI response from Ollama
-        ollama_response = openai_manager.chat_with_history(ollama_payload)
-        
-        # Rest of your audio processing remains the same
-        audio_file_path_from_tts = elevenlabs_manager.text_to_audio(ollama_response, voice=voice, save_as_wave=False)
-        audio_filename = f"response_{uuid.uuid4()}.mp3"
-        audio_path = os.path.join("/tmp", audio_filename)
-        
-        with open(audio_file_path_from_tts, "rb") as src, open(audio_path, "wb") as dst:
-            dst.write(src.read())
-        
-        with open(BACKUP_FILE, "w") as file:
-            file.write(str(openai_manager.chat_history))
-            
-        # OBS visibility handling
-        obswebsockets_manager.set_source_visibility("*** Mid Monitor", "Madeira Flag", True)
-        if not use_browser_audio:
-            audio_manager.play_audio(audio_path, True, True, True)
-        obswebsockets_manager.set_source_visibility("*** Mid Monitor", "Madeira Flag", False)
+        # Stream the AI response from Ollama straight into TTS, sentence by sentence, and on to the browser
+        audio_stream = open_audio_stream(stream_id)
+        try:
+            ollama_response, metrics = turn_scheduler.run(
+                "web", run_turn, ollama_payload,
+                voice=voice,
+                play_locally=not use_browser_audio,
+                turn_start=turn_start,
+                audio_stream=audio_stream,
+                timeout=WEB_TURN_TIMEOUT
+            )
+        finally:
+            audio_stream.close()
         
         return jsonify({
             "response": ollama_response,
-            "audio_url": f"/audio/{audio_filename}",
+            "audio_url": f"/audio/{audio_stream.stream_id}",
             "context_message_count": len(context_messages),
-            "voice_used": elevenlabs_manager.default_voice if voice is None else voice
+            "voice_used": elevenlabs_manager.default_voice if voice is None else voice,
+            "time_to_first_audio": metrics.get("time_to_first_audio")
         })
 
+    except ArtifactExistsError as e:
+        return jsonify({"error": str(e)}), 409
+    except (SchedulerBusyError, RateLimitedError) as e:
+        return jsonify({"error": str(e)}), 429
+    except TurnTimeoutError as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
 
 @app.route('/process_audio', methods=['POST'])
 def process_audio():
+    turn_start = time.time()
+    # Closed whatever happens, so a browser that's already listening doesn't wait for audio that never comes
+    try:
+        audio_stream = open_audio_stream(request.form.get('stream_id'))
+    except ArtifactExistsError as e:
+        return jsonify({"error": str(e)}), 409
     try:
         # Check if an audio file was uploaded
         if 'audio' not in request.files:
@@ -564,8 +740,15 @@ def process_audio():
             print(f"Error converting audio: {e}")
             return jsonify({"error": f"Failed to convert audio: {e}"}), 400
 
-        # Now process the audio file (transcription)
-        transcription = speechtotext_manager.speechtotext_from_file(wav_path)
+        # Now process the audio file (transcription), Whisper runs in an STT worker process
+        try:
+            transcription = speechtotext_manager.speechtotext_from_file(wav_path)
+        except STTBusyError as e:
+            return jsonify({"error": str(e)}), 429
+        except FutureTimeoutError:
+            return jsonify({"error": "Transcription took too long"}), 503
+        except STTUnavailableError as e:
+            return jsonify({"error": str(e)}), 503
         
         if not transcription:
             print("Transcription failed.")
@@ -583,50 +766,33 @@ def process_audio():
             for msg in context_messages[-10:]
         ) if context_messages else None
 
-        # Enhance the transcription with context if available
-        enhanced_transcription = transcription
         if context:
-            enhanced_transcription = f"{transcription}\n\nChat Context:\n{context}"
-            print(f"Enhanced transcription with {len(context_messages)} context messages")
+            print(f"Adding {len(context_messages)} context messages to the transcription")
 
-        # Process the transcribed text (with optional context)
-        openai_result = openai_manager.chat_with_history(enhanced_transcription)
-        ai_response = openai_result  # The text response from the LLM
-
-        # Generate a unique filename for the response audio
-        audio_filename = f"response_{uuid.uuid4()}.mp3"
-        response_audio_path = os.path.join("/tmp", audio_filename)
-
-        # Convert the LLM response to speech
-        audio_file_path_from_tts = elevenlabs_manager.text_to_audio(ai_response, ELEVENLABS_VOICE, False)
+        # Stream the LLM response into TTS, playback (local or in the browser) starts with the first sentence
+        try:
+            ai_response, metrics = turn_scheduler.run(
+                "web", run_turn, {"prompt": transcription, "context": context, "source": "web"},
+                play_locally=not use_browser_audio,
+                turn_start=turn_start,
+                audio_stream=audio_stream,
+                timeout=WEB_TURN_TIMEOUT
+            )
+        except (SchedulerBusyError, RateLimitedError) as e:
+            return jsonify({"error": str(e)}), 429
+        except TurnTimeoutError as e:
+            return jsonify({"error": str(e)}), 503
 
-        if not audio_file_path_from_tts:
+        if not ai_response:
             return jsonify({"error": "Failed to generate speech audio"}), 500
 
-        # Copy the generated file to /tmp so that it can be served to the browser
-        with open(audio_file_path_from_tts, "rb") as src, open(response_audio_path, "wb") as dst:
-            dst.write(src.read())
-
-        with open(BACKUP_FILE, "w") as backup_file:
-            backup_file.write(str(openai_manager.chat_history))
-
-        # Update OBS visibility
-        obswebsockets_manager.set_source_visibility("*** Mid Monitor", "Madeira Flag", True)
-
-        if not use_browser_audio:
-            print("Playing audio locally...")
-            # Local playback
-            audio_manager.play_audio(response_audio_path, True, True, True)
-        
-        # Reset OBS visibility
-        obswebsockets_manager.set_source_visibility("*** Mid Monitor", "Madeira Flag", False)
-
         # Return the response including the audio URL
         response_data = {
             "transcribed_text": transcription,
             "response": ai_response,
-            "audio_url": f"/audio/{audio_filename}",
-            "context_message_count": len(context_messages) if context_messages else 0
+            "audio_url": f"/audio/{audio_stream.stream_id}",
+            "context_message_count": len(context_messages) if context_messages else 0,
+            "time_to_first_audio": metrics.get("time_to_first_audio")
         }
 
         # Clean up temporary input files
@@ -638,6 +804,8 @@ def process_audio():
     except Exception as e:
         print(f"Error in processing audio: {e}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        audio_stream.close()
 
 #TEST PLAYING AUDIO
 @app.route('/play_audio', methods=['GET'])
@@ -658,9 +826,10 @@ def play_audio():
 def list_voices():
     """Endpoint to list all available (non-standard) voices"""
     try:
-        voices = elevenlabs_manager.available_voices
+        catalog = elevenlabs_manager.voice_catalog
         return jsonify({
-            "voices": sorted(voices.keys()),
+            "voices": sorted(catalog.names),
+            "descriptions": {name: catalog.describe(name) for name in catalog.names},
             "current_voice": elevenlabs_manager.default_voice
         })
     except Exception as e:
@@ -669,29 +838,20 @@ def list_voices():
 @app.route('/set_voice/<voice_name>', methods=['POST'])
 def set_voice(voice_name):
     try:
-        # Get filtered available voices
-        available_voices = elevenlabs_manager.available_voices
-        
-        # Find matching voice (case-insensitive)
-        voice_match = None
-        for name in available_voices:
-            if name.lower() == voice_name.lower():
-                voice_match = name
-                break
-        
-        if not voice_match:
+        available_voices = elevenlabs_manager.voice_catalog.names
+        try:
+            voice_match = elevenlabs_manager.set_voice(voice_name)
+        except ValueError:
             return jsonify({
                 "status": "error",
                 "message": f"Voice '{voice_name}' not found or is a standard voice",
-                "available_voices": list(available_voices.keys())
+                "available_voices": available_voices
             }), 400
         
-        # Set the voice
-        elevenlabs_manager.default_voice = voice_match
         return jsonify({
             "status": "success",
             "voice": voice_match,
-            "available_voices": list(available_voices.keys())
+            "available_voices": available_voices
         })
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -704,8 +864,6 @@ def run_flask_app():
 def main():
     global elevenlabs_manager, obswebsockets_manager, speechtotext_manager, openai_manager, audio_manager
 
-BACKUP_FILE = "ChatHistoryBackup.txt"
-
 # Function to read txt or PDF
 def read_system_message(txt_file_path, pdf_file_path):
     # Try reading from the text file first
@@ -751,14 +909,18 @@ def read_system_message_from_pdf(file_path):
         return None
 
 
-# Initialize the chat history with the default system message
+# Initialize the chat history with the default system message.
+# The conversation of the last run is continued from the journal if RESTORE_CONVERSATION=true is set,
+# or if there is no system message file. Otherwise it starts over
+RESTORE_CONVERSATION = os.getenv("RESTORE_CONVERSATION", "false").lower() == "true"
 FIRST_SYSTEM_MESSAGE = read_system_message("system_message.txt", "system_message.pdf")
-if FIRST_SYSTEM_MESSAGE:
-    openai_manager.chat_history = [FIRST_SYSTEM_MESSAGE]
+if RESTORE_CONVERSATION and turn_scheduler.run("keyboard", openai_manager.restore_from_journal):
+    print("[yellow]Continuing the conversation of the last run.")
+elif FIRST_SYSTEM_MESSAGE:
+    turn_scheduler.run("keyboard", setattr, openai_manager, "chat_history", [FIRST_SYSTEM_MESSAGE])
 else:
-    print("Error: Could not load system message. Using History change character for new conversation.")
-    FIRST_SYSTEM_MESSAGE = read_system_message_from_txt("ChatHistoryBackup.txt")
-    openai_manager.chat_history = [FIRST_SYSTEM_MESSAGE]
+    print("Error: Could not load system message. Continuing the conversation from the journal.")
+    turn_scheduler.run("keyboard", openai_manager.restore_from_journal)
 
 # Global flags
 listening_mode = None
@@ -791,18 +953,19 @@ def handle_listening_mode():
     global stop_recording
     print("[green]Listening for input... Press 'p' to stop recording.")
     while True:  # Keep listening until 'p' is pressed
+        # speak() returns before the answer finished playing, the mic would record the bot's own voice
+        audio_manager.wait_until_idle()
         mic_result = speechtotext_manager.speechtotext_from_mic_continuous()
         if mic_result:
             print(f"[green]Received mic input: {mic_result}")
-            openai_result = openai_manager.chat_with_history(mic_result)
-            with open(BACKUP_FILE, "w") as file:
-                file.write(str(openai_manager.chat_history))
-            # Play the audio and other actions
-            elevenlabs_output = elevenlabs_manager.text_to_audio(openai_result, ELEVENLABS_VOICE, False)
-            obswebsockets_manager.set_source_visibility("*** Mid Monitor", "Madeira Flag", True)
-            audio_manager.play_audio(elevenlabs_output, True, True, True)
-            obswebsockets_manager.set_source_visibility("*** Mid Monitor", "Madeira Flag", False)
-            print("[green]Finished processing dialogue. Listening for next input.")
+            # Stream the answer into TTS and play it sentence by sentence
+            try:
+                turn_scheduler.run("mic", run_turn, {"prompt": mic_result, "source": "mic"})
+                print("[green]Finished processing dialogue. Listening for next input.")
+            except (SchedulerBusyError, RateLimitedError) as e:
+                print(f"[red]Couldn't start the turn: {e}")
+            except Exception as e:
+                print(f"[red]Error in the turn: {e}")
 
         if stop_recording:
             stop_recording = True  # Reset the flag
@@ -820,15 +983,14 @@ def handle_writing_mode():
                 print("[red]Exiting program...")
                 sys.exit(0)  # Exit the program gracefully
             print(f"[blue]Received typed input: {typed_input}")
-            openai_result = openai_manager.chat_with_history(typed_input)
-            with open(BACKUP_FILE, "w") as file:
-                file.write(str(openai_manager.chat_history))
-            # Play the audio and other actions
-            elevenlabs_output = elevenlabs_manager.text_to_audio(openai_result, ELEVENLABS_VOICE, False)
-            obswebsockets_manager.set_source_visibility("*** Mid Monitor", "Madeira Flag", True)
-            audio_manager.play_audio(elevenlabs_output, True, True, True)
-            obswebsockets_manager.set_source_visibility("*** Mid Monitor", "Madeira Flag", False)
-            print("[green]Finished processing dialogue. Ready for next input.")
+            # Stream the answer into TTS and play it sentence by sentence
+            try:
+                turn_scheduler.run("keyboard", run_turn, {"prompt": typed_input, "source": "keyboard"})
+                print("[green]Finished processing dialogue. Ready for next input.")
+            except (SchedulerBusyError, RateLimitedError) as e:
+                print(f"[red]Couldn't start the turn: {e}")
+            except Exception as e:
+                print(f"[red]Error in the turn: {e}")
 
 
 # Start the Flask app in a separate thread
@@ -845,19 +1007,8 @@ try:
 except Exception as e:
         print(f"Failed to start Twitch listener: {e}")
 
-# Function to clean up old audio files
-def cleanup_old_audio_files(directory="/tmp", max_age_seconds=3600):
-    """Delete audio files older than `max_age_seconds`."""
-    current_time = time.time()
-    for filepath in glob.glob(os.path.join(directory, "*.mp3")):
-        file_age = current_time - os.path.getmtime(filepath)
-        if file_age > max_age_seconds:
-            os.remove(filepath)
-            print(f"Deleted old audio file: {filepath}")
-
 if __name__ == "__main__":
     main()
-    cleanup_old_audio_files()
 
 
 
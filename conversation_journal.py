@@ -0,0 +1,147 @@
+import os
+import re
+import json
+import time
+import queue
+import threading
+from collections import deque
+from rich import print
+from chat_history import ConversationCompactor
+
+SEGMENT_NAME = re.compile(r"^journal_(\d{6})\.jsonl$")
+
+
+class ConversationJournal:
+    """
+    Append-only JSON Lines journal of the conversation.
+    Events are handed to a writer thread, which writes them in batches and flushes/fsyncs once per batch,
+    so a turn only costs a queue put. Segments are rotated once they pass segment_max_bytes.
+
+    Event types:
+    reset   {"messages": [...]}           the history was replaced (new system message)
+    append  {"message": {...}}            a message was added to the history
+    evict   {"count": n}                  the n oldest messages were dropped (token limit)
+    summary {"message": {...}, "count": n} the n oldest messages were replaced by a summary
+    note    {"role": ..., "content": ...} anything else worth keeping (full answers with thinking, errors)
+    """
+
+    def __init__(self, directory="conversation_journal", segment_max_bytes=5 * 1024 * 1024, flush_interval=1.0, fsync=True):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.queue = queue.Queue()
+        os.makedirs(directory, exist_ok=True)
+        segments = self.segments()
+        self.segment_number = int(SEGMENT_NAME.match(os.path.basename(segments[-1])).group(1)) if segments else 1
+        self.file = open(self._segment_path(self.segment_number), "a", encoding="utf-8")
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"journal_{number:06d}.jsonl")
+
+    def segments(self):
+        """All segment files, oldest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted(name for name in os.listdir(self.directory) if SEGMENT_NAME.match(name))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def append(self, event_type, **fields):
+        """Queue an event, returns immediately"""
+        fields["type"] = event_type
+        fields["ts"] = time.time()
+        self.queue.put(fields)
+
+    def _rotate(self):
+        self.file.close()
+        self.segment_number += 1
+        self.file = open(self._segment_path(self.segment_number), "a", encoding="utf-8")
+
+    def _run(self):
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            # Collect everything that arrives within the flush interval into one write
+            deadline = time.time() + self.flush_interval
+            while batch[-1] is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                running = False
+                batch.pop()
+            try:
+                if batch:
+                    self.file.write("".join(json.dumps(event, ensure_ascii=False) + "\n" for event in batch))
+                    self.file.flush()
+                    if self.fsync:
+                        os.fsync(self.file.fileno())
+                if self.file.tell() >= self.segment_max_bytes:
+                    self._rotate()
+            except Exception as e:
+                print(f"Error writing conversation journal: {e}")
+        self.file.close()
+
+    def close(self):
+        """Write everything that is still queued and stop the writer thread"""
+        self.queue.put(None)
+        self.thread.join()
+
+    def load_history(self):
+        """
+        Rebuild the chat history from the journal.
+        Segments are read newest first and only back to the last reset, so startup doesn't replay the whole journal.
+        Returns a list of messages (empty if there is nothing to restore)
+        """
+        events = deque()
+        found_reset = False
+        for segment in reversed(self.segments()):
+            with open(segment, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+            for line in reversed(lines):
+                if not line.strip():
+                    continue
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partly written line from a crash
+                # Notes are most of the journal and never needed here
+                if event.get("type") == "note":
+                    continue
+                events.appendleft(event)
+                if event["type"] == "reset":
+                    found_reset = True
+                    break
+            if found_reset:
+                break
+
+        pinned = []
+        summary = []
+        turns = deque()
+        for event in events:
+            if event["type"] == "reset":
+                messages = event["messages"]
+                pinned = messages[:1] if messages and messages[0].get("role") == "system" else []
+                rest = messages[len(pinned):]
+                # A summary right after the system message goes back into the summary slot, it isn't a turn
+                if pinned and rest and str(rest[0].get("content", "")).startswith(ConversationCompactor.SUMMARY_PREFIX):
+                    summary, rest = rest[:1], rest[1:]
+                else:
+                    summary = []
+                turns = deque(rest)
+            elif event["type"] == "append":
+                turns.append(event["message"])
+            elif event["type"] == "evict":
+                for _ in range(min(event["count"], len(turns))):
+                    turns.popleft()
+            elif event["type"] == "summary":
+                for _ in range(min(event["count"], len(turns))):
+                    turns.popleft()
+                summary = [event["message"]]
+        return pinned + summary + list(turns)
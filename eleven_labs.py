@@ -1,95 +1,195 @@
-from elevenlabs.client import ElevenLabs
-from elevenlabs import stream, voices, play, save
+from elevenlabs import stream, play
 import time
-import os
-import re
+from concurrent.futures import ThreadPoolExecutor
+from text_stream import SentenceSplitter, strip_thinking
+from tts_cache import TTSCache
+from tts_backends import ElevenLabsBackend, LocalTTSBackend, STANDARD_VOICES
+from model_router import LatencyTracker
+from voice_catalog import VoiceCatalog
 
-try:
-    client = ElevenLabs(
-        api_key=""  # Your API key here
-    )
-except TypeError:
-    exit("You forgot to set ELEVENLABS_API_KEY in your environment!")
+
+def join_audio_files(file_paths, output_path):
+    """Join audio clips into one mp3 file. Mp3 frames can simply be appended, anything else is re-encoded with pydub"""
+    if all(path.lower().endswith(".mp3") for path in file_paths):
+        with open(output_path, "wb") as dst:
+            for file_path in file_paths:
+                with open(file_path, "rb") as src:
+                    dst.write(src.read())
+    else:
+        from pydub import AudioSegment
+        combined = AudioSegment.empty()
+        for file_path in file_paths:
+            combined += AudioSegment.from_file(file_path)
+        combined.export(output_path, format="mp3")
+    return output_path
 
 class ElevenLabsManager:
+    """
+    Text to speech with pluggable backends (see tts_backends.py).
+    ElevenLabs is used by default, the offline local engine is used for voices mapped to it,
+    when ElevenLabs isn't configured, and as a fallback when the cloud fails or gets slow.
+    """
+
+    STANDARD_VOICES = STANDARD_VOICES
+    # Every Nth request still goes to a slow backend, so we notice when it's fast again
+    SLOW_BACKEND_PROBE_INTERVAL = 10
 
-    STANDARD_VOICES = {
-        "Aria", "Roger", "Sarah", "Laura", "Charlie", "George", "Callum",
-        "River", "Liam", "Charlotte", "Alice", "Matilda", "Will", "Jessica",
-        "Eric", "Chris", "Brian", "Daniel", "Lily", "Bill"
-    }
-    def __init__(self, default_voice="David - Epic Movie Trailer "):
-        self.client = client
+    def __init__(self, default_voice="David - Epic Movie Trailer ", tts_cache=None, backends=None, voice_backends=None,
+                 fallback_backend="local", slow_seconds=8.0, voice_catalog=None):
+        """
+        Parameters:
+        default_voice (str): voice used when none is given
+        tts_cache (TTSCache): where rendered clips are kept
+        backends (dict): backend name -> TTSBackend, defaults to ElevenLabs and the local engine
+        voice_backends (dict): voice name -> backend name, voices not listed use the backend that offers them
+        fallback_backend (str): used when the chosen backend fails or averages slower than slow_seconds
+        voice_catalog (VoiceCatalog): defaults to a catalog of the backends' voices, refreshed in the background
+        """
+        backends = backends or {"elevenlabs": ElevenLabsBackend(), "local": LocalTTSBackend()}
+        self.backends = {name: backend for name, backend in backends.items() if backend.is_available()}
+        if not self.backends:
+            print("Warning: no TTS backend available! Set ELEVENLABS_API_KEY or install pyttsx3.")
+        self.voice_backends = voice_backends or {}
+        self.fallback_backend = fallback_backend if fallback_backend in self.backends else None
+        self.slow_seconds = slow_seconds
+        self.latency = LatencyTracker()
+        self.requests = 0
         self.default_voice = default_voice
-        self.available_voices = self._get_filtered_voices()
-        
-    def _get_filtered_voices(self):
-        """Fetch available voices and exclude standard ones"""
-        all_voices = self.client.voices.get_all().voices
-        return {
-            v.name: v for v in all_voices 
-            if v.name not in self.STANDARD_VOICES
-        }
-    
+        # Rendered clips are reused, repeated phrases cost no API call
+        self.tts_cache = tts_cache or TTSCache()
+        # Starts from the cached snapshot, the backends are only asked in the background
+        self.voice_catalog = voice_catalog or VoiceCatalog(self.backends)
+        self.voice_catalog.start()
+        self.voice_listeners = []
+
+    def add_voice_listener(self, callback):
+        """callback(voice) is called whenever the default voice changes"""
+        self.voice_listeners.append(callback)
+
+    @property
+    def available_voices(self):
+        """Voice name -> backend name (the ElevenLabs standard voices are excluded)"""
+        return self.voice_catalog.voices
+
+    def _backend_for(self, voice):
+        """
+        Selection policy: the backend the voice is mapped to, otherwise the backend that offers the voice.
+        A backend that's averaging slower than slow_seconds is swapped for the fallback backend.
+        """
+        if not self.backends:
+            raise RuntimeError("No TTS backend available, set ELEVENLABS_API_KEY or install pyttsx3")
+        name = self.voice_backends.get(voice) or self.available_voices.get(voice) or next(iter(self.backends))
+        self.requests += 1
+        estimate = self.latency.estimate(name)
+        if (self.fallback_backend and name != self.fallback_backend and estimate and estimate > self.slow_seconds
+                and self.requests % self.SLOW_BACKEND_PROBE_INTERVAL):
+            print(f"{name} TTS is slow ({estimate:.1f}s), using {self.fallback_backend}")
+            return self.fallback_backend
+        return name
+
+    def backend_stats(self):
+        return {"backends": list(self.backends), "fallback": self.fallback_backend, "latency": self.latency.stats()}
+
     @staticmethod
     def clean_text(text):
         """Clean text by removing <think> tags and asterisks."""
-        text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
-        text = re.sub(r'\*', '', text)
-        return text.strip()
+        return strip_thinking(text, drop_asterisks=True)
 
     def set_voice(self, voice_name):
-        """Change the default voice at runtime"""
-        if voice_name in self.available_voices:
-            self.default_voice = voice_name
-            print(f"Voice changed to: {voice_name}")
-        else:
-            raise ValueError(f"Voice '{voice_name}' not available. Choices are: {list(self.available_voices.keys())}")
+        """Change the default voice at runtime, any capitalization of the name works. Returns the exact voice name"""
+        voice = self.voice_catalog.lookup(voice_name)
+        if voice is None:
+            raise ValueError(f"Voice '{voice_name}' not available. Choices are: {self.voice_catalog.names}")
+        self.default_voice = voice
+        print(f"Voice changed to: {voice}")
+        for callback in self.voice_listeners:
+            callback(voice)
+        return voice
 
     def _validate_voice(self, voice):
         """Ensure the voice exists or use default"""
         if voice is None:
             return self.default_voice
-        if voice not in self.available_voices:
+        match = self.voice_catalog.lookup(voice)
+        if match is None:
             print(f"Warning: Voice '{voice}' not found. Using default '{self.default_voice}'")
             return self.default_voice
-        return voice
+        return match
 
-    def text_to_audio(self, input_text, voice=None, save_as_wave=False, subdirectory=""):
+    def text_to_audio(self, input_text, voice=None, save_as_wave=False, pin=False):
+        """
+        Returns the path of the rendered audio file. The file lives in the TTS cache,
+        so callers must not delete it. With pin it isn't evicted until release_audio(path) is called,
+        use that for clips that are about to be played.
+        """
         voice = self._validate_voice(voice)
         cleaned_text = self.clean_text(input_text)
-        
-        audio = self.client.generate(
-            text=cleaned_text,
-            voice=voice,
-            model="eleven_turbo_v2"
-        )
-        
-        ext = ".wav" if save_as_wave else ".mp3"
-        file_name = f"Msg_{hash(cleaned_text)}_{voice}{ext}"
-        file_path = os.path.join(os.path.abspath(os.curdir), subdirectory, file_name)
-        save(audio, file_path)
-        return file_path
+        backend_name = self._backend_for(voice)
+        try:
+            return self._render(backend_name, cleaned_text, voice, save_as_wave, pin)
+        except Exception as e:
+            if not self.fallback_backend or backend_name == self.fallback_backend:
+                raise
+            print(f"{backend_name} TTS failed ({e}), falling back to {self.fallback_backend}")
+            return self._render(self.fallback_backend, cleaned_text, voice, save_as_wave, pin)
+
+    def release_audio(self, file_path):
+        """Let the TTS cache evict a clip from text_to_audio(pin=True) again"""
+        self.tts_cache.release(file_path)
+
+    def read_audio(self, file_path):
+        """Bytes of a clip from text_to_audio, hot clips come from the cache's memory tier"""
+        return self.tts_cache.read(file_path)
+
+    def _render(self, backend_name, text, voice, save_as_wave=False, pin=False):
+        """Render text on one backend, or take it from the TTS cache"""
+        backend = self.backends[backend_name]
+        ext = ".wav" if save_as_wave else backend.audio_format
+        cache_key = TTSCache.make_key(text, voice, f"{backend.name}:{backend.model}", ext)
+        cached_path = self.tts_cache.get_path(cache_key, pin)
+        if cached_path:
+            return cached_path
+
+        start = time.time()
+        try:
+            audio = backend.synthesize(text, voice)
+        except Exception:
+            self.latency.record_failure(backend_name)
+            raise
+        self.latency.record(backend_name, time.time() - start)
+        return self.tts_cache.put(cache_key, audio, ext, pin)
+
+    def text_to_audio_with_retry(self, input_text, voice=None, save_as_wave=False, retries=2, backoff=0.5, pin=False):
+        """text_to_audio, retried with a growing pause if the request fails"""
+        for attempt in range(retries + 1):
+            try:
+                return self.text_to_audio(input_text, voice=voice, save_as_wave=save_as_wave, pin=pin)
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                print(f"TTS request failed ({e}), retrying...")
+                time.sleep(backoff * (attempt + 1))
+
+    def text_to_audio_parallel(self, input_text, voice=None, output_path=None, max_workers=4, retries=2):
+        """
+        Split the text into sentences and synthesize them concurrently.
+        Returns the audio file paths in sentence order, or output_path with all of them joined if it's set.
+        """
+        splitter = SentenceSplitter()
+        sentences = splitter.feed(self.clean_text(input_text)) + splitter.flush()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # map keeps the results in the order of the sentences
+            file_paths = list(executor.map(lambda sentence: self.text_to_audio_with_retry(sentence, voice, retries=retries), sentences))
+        if output_path is None:
+            return file_paths
+        return join_audio_files(file_paths, output_path)
 
     def text_to_audio_played(self, input_text, voice=None):
-        voice = self._validate_voice(voice)
-        cleaned_text = self.clean_text(input_text)
-        
-        audio = self.client.generate(
-            text=cleaned_text,
-            voice=voice,
-            model="eleven_turbo_v2"
-        )
-        play(audio)
+        play(self.read_audio(self.text_to_audio(input_text, voice)))
 
     def text_to_audio_streamed(self, input_text, voice=None):
         voice = self._validate_voice(voice)
         cleaned_text = self.clean_text(input_text)
         
-        audio_stream = self.client.generate(
-            text=cleaned_text,
-            voice=voice,
-            model="eleven_turbo_v2",
-            stream=True
-        )
+        audio_stream = self.backends[self._backend_for(voice)].stream(cleaned_text, voice)
         stream(audio_stream)
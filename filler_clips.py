@@ -0,0 +1,86 @@
+import random
+import threading
+from rich import print
+
+FILLER_PHRASES = [
+    "Hmm, let me think.",
+    "Okay, one moment.",
+    "Good question, let me see.",
+    "Hmm, give me a second.",
+    "Alright, let me think about that.",
+    "Oh, interesting.",
+]
+
+
+class FillerLibrary:
+    """
+    Short clips ("hmm, let me think...") that are played while the answer is still being generated.
+    The clips are rendered for the current voice at startup and again whenever the voice changes,
+    they come from the TTS cache so this only costs API calls the first time.
+    Also keeps track of how much waiting time the fillers covered.
+    """
+
+    def __init__(self, elevenlabs_manager, phrases=None):
+        self.elevenlabs_manager = elevenlabs_manager
+        self.phrases = phrases or FILLER_PHRASES
+        self.clips = {}  # voice -> [file paths]
+        self.preparing = set()
+        self.lock = threading.Lock()
+        self.last_clip = None
+        self.turns = 0
+        self.played = 0
+        self.covered_seconds = 0.0
+
+    def prepare(self, voice=None):
+        """Render the filler clips of a voice (None = the default voice)"""
+        voice = voice or self.elevenlabs_manager.default_voice
+        with self.lock:
+            if voice in self.clips or voice in self.preparing:
+                return
+            self.preparing.add(voice)
+        clips = []
+        try:
+            for phrase in self.phrases:
+                try:
+                    # Pinned, the clips are played again and again and must not be evicted from the TTS cache
+                    clips.append(self.elevenlabs_manager.text_to_audio(phrase, voice, pin=True))
+                except Exception as e:
+                    print(f"Couldn't render the filler '{phrase}': {e}")
+        finally:
+            with self.lock:
+                self.preparing.discard(voice)
+                if clips:
+                    self.clips[voice] = clips
+        print(f"[magenta]{len(clips)} filler clips ready for {voice}")
+
+    def prepare_in_background(self, voice=None):
+        threading.Thread(target=self.prepare, args=(voice,), daemon=True).start()
+
+    def pick(self, voice=None):
+        """A random filler clip of the voice (never the same one twice in a row), None if they aren't rendered yet"""
+        voice = voice or self.elevenlabs_manager.default_voice
+        with self.lock:
+            clips = self.clips.get(voice)
+            self.turns += 1
+        if not clips:
+            self.prepare_in_background(voice)
+            return None
+        choices = [clip for clip in clips if clip != self.last_clip] or clips
+        self.last_clip = random.choice(choices)
+        return self.last_clip
+
+    def record(self, covered_seconds):
+        """A filler was played and covered this much of the wait for the answer"""
+        with self.lock:
+            self.played += 1
+            self.covered_seconds += covered_seconds
+
+    def stats(self):
+        with self.lock:
+            return {
+                "voices": {voice: len(clips) for voice, clips in self.clips.items()},
+                "turns": self.turns,
+                "played": self.played,
+                "covered_seconds": round(self.covered_seconds, 2),
+                "avg_covered_seconds": round(self.covered_seconds / self.played, 2) if self.played else 0.0
+            }
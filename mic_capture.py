@@ -0,0 +1,151 @@
+import time
+import threading
+import numpy as np
+import pyaudio
+from rich import print
+
+
+class RingBuffer:
+    """
+    Fixed size float32 ring buffer for one writer (the audio callback) and one reader.
+    Positions are absolute sample counts. The writer copies the samples in first and publishes
+    the new write position afterwards, so the reader never sees half written data and no lock is needed.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=np.float32)
+        self.written = 0  # samples written since the start
+
+    def write(self, samples):
+        count = len(samples)
+        if count >= self.capacity:
+            samples = samples[-self.capacity:]
+            self.written += count - self.capacity
+            count = self.capacity
+        start = self.written % self.capacity
+        first = min(count, self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[:count - first] = samples[first:]
+        self.written += count
+
+    def oldest(self):
+        """Position of the oldest sample that's still in the buffer"""
+        return max(self.written - self.capacity, 0)
+
+    def read(self, position, count):
+        """Copy of the samples position..position+count, they must still be in the buffer"""
+        start = position % self.capacity
+        first = min(count, self.capacity - start)
+        if first == count:
+            return self.buffer[start:start + count].copy()
+        return np.concatenate((self.buffer[start:], self.buffer[:count - first]))
+
+
+class MicCapture:
+    """
+    One long-lived microphone stream that fills a ring buffer of float32 samples (-1..1) in the background.
+    Readers take consecutive chunks straight from memory, so nothing is lost between chunks
+    and there are no temp files or device reopens.
+    """
+
+    def __init__(self, rate=16000, channels=1, chunk_size=1024, buffer_seconds=60, device_index=None):
+        """
+        Parameters:
+        rate (int): sample rate, 16000 is what Whisper expects
+        channels (int): input channels, they are mixed down to mono
+        chunk_size (int): frames per PortAudio callback
+        buffer_seconds (float): how much audio is kept, a reader that falls further behind loses audio
+        device_index (int): PyAudio input device, None for the default microphone
+        """
+        self.rate = rate
+        self.channels = channels
+        self.chunk_size = chunk_size
+        self.device_index = device_index
+        self.ring = RingBuffer(int(rate * buffer_seconds))
+        self.read_position = 0
+        self.data_ready = threading.Event()
+        self.pyaudio = None
+        self.stream = None
+        self.overruns = 0
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        samples = np.frombuffer(in_data, dtype=np.int16).astype(np.float32) / 32768.0
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1)
+        self.ring.write(samples)
+        self.data_ready.set()
+        return None, pyaudio.paContinue
+
+    def start(self):
+        """Open the microphone (once), later calls do nothing"""
+        if self.stream is not None:
+            return
+        self.pyaudio = pyaudio.PyAudio()
+        self.stream = self.pyaudio.open(format=pyaudio.paInt16,
+                                        channels=self.channels,
+                                        rate=self.rate,
+                                        input=True,
+                                        input_device_index=self.device_index,
+                                        frames_per_buffer=self.chunk_size,
+                                        stream_callback=self._callback)
+        self.stream.start_stream()
+        self.read_position = self.ring.written
+        print("[green]Microphone capture started")
+
+    def stop(self):
+        if self.stream is None:
+            return
+        self.stream.stop_stream()
+        self.stream.close()
+        self.pyaudio.terminate()
+        self.stream = None
+        self.pyaudio = None
+
+    def skip_to_now(self):
+        """Drop everything that was recorded so far, the next read starts with new audio"""
+        self.read_position = self.ring.written
+
+    def available(self):
+        """Seconds of audio that are recorded but weren't read yet"""
+        return (self.ring.written - self.read_position) / self.rate
+
+    def read(self, seconds, timeout=None):
+        """
+        The next `seconds` of audio as a float32 array, following right after the previous read.
+        Waits until it's recorded. Returns what's there (maybe less) if timeout runs out first
+        """
+        self.start()
+        count = int(seconds * self.rate)
+        deadline = time.time() + timeout if timeout is not None else None
+        while self.ring.written - self.read_position < count:
+            remaining = deadline - time.time() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                break
+            self.data_ready.clear()
+            if self.ring.written - self.read_position >= count:
+                break
+            self.data_ready.wait(0.1 if remaining is None else min(remaining, 0.1))
+        oldest = self.ring.oldest()
+        if self.read_position < oldest:
+            # The reader fell behind further than the buffer reaches back
+            self.overruns += 1
+            print(f"Microphone buffer overrun, lost {(oldest - self.read_position) / self.rate:.1f}s of audio")
+            self.read_position = oldest
+        count = min(count, self.ring.written - self.read_position)
+        samples = self.ring.read(self.read_position, count)
+        self.read_position += count
+        return samples
+
+    def latest(self, seconds):
+        """The most recent `seconds` of audio, without moving the read position"""
+        count = min(int(seconds * self.rate), self.ring.written - self.ring.oldest())
+        return self.ring.read(self.ring.written - count, count)
+
+    def stats(self):
+        return {
+            "running": self.stream is not None,
+            "recorded_seconds": round(self.ring.written / self.rate, 1),
+            "unread_seconds": round(self.available(), 2),
+            "overruns": self.overruns
+        }
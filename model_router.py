@@ -0,0 +1,126 @@
+import os
+import re
+import threading
+
+FAST_MODEL = os.getenv("OLLAMA_FAST_MODEL", "qwen2.5:3b")
+
+# Words that usually mean the input needs real reasoning ("how are you" doesn't, "how does" does)
+REASONING_KEYWORDS = re.compile(
+    r"\b(why|how (do|does|did|can|could|would|should|to|many|much|come)|explain|calculate|compare|difference|prove|solve|code|program|plan|analy[sz]e|summari[sz]e|translate|step)\b",
+    re.IGNORECASE
+)
+# Chatter that a small model answers just as well
+CHATTER_KEYWORDS = re.compile(
+    r"^\W*(hi|hello|hey|yo|sup|hallo|moin|gg|lol|lmao|thanks|thank you|bye|good (morning|evening|night)|what'?s up|how are (you|u)|how'?s it going)\b",
+    re.IGNORECASE
+)
+
+
+class LatencyTracker:
+    """Exponentially weighted average of the response time (time to the first spoken sentence) per model"""
+
+    def __init__(self, smoothing=0.3):
+        self.smoothing = smoothing
+        self.averages = {}
+        self.counts = {}
+        self.failures = {}
+        self.lock = threading.Lock()
+
+    def record(self, model, seconds):
+        with self.lock:
+            previous = self.averages.get(model)
+            self.averages[model] = seconds if previous is None else previous + self.smoothing * (seconds - previous)
+            self.counts[model] = self.counts.get(model, 0) + 1
+
+    def record_failure(self, model):
+        with self.lock:
+            self.failures[model] = self.failures.get(model, 0) + 1
+
+    def estimate(self, model):
+        """Average response time in seconds, None if the model wasn't used yet"""
+        return self.averages.get(model)
+
+    def stats(self):
+        with self.lock:
+            return {
+                model: {"avg_seconds": round(self.averages[model], 2), "requests": self.counts[model],
+                        "failures": self.failures.get(model, 0)}
+                for model in self.averages
+            }
+
+
+class ModelRouter:
+    """
+    Picks a model for every input: trivial chatter goes to a small fast model,
+    real questions to the big reasoning model.
+    A route can have a latency budget for the time to the first spoken sentence. If a route's model is
+    averaging over its budget and its fallback route is within budget, the fallback is used instead.
+    Every Nth of those inputs still goes to the slow route, so its average recovers once it's fast again.
+    The reasoning route has no budget by default: its first sentence comes after the whole thinking part,
+    so being slow is normal there and real questions shouldn't end up on the small model because of it.
+    """
+
+    OVER_BUDGET_PROBE_INTERVAL = 10
+
+    def __init__(self, reasoning_model="qwq:32b", fast_model=FAST_MODEL, fast_budget=5.0, reasoning_budget=None,
+                 max_fast_words=12):
+        self.routes = {
+            "fast": {"model": fast_model, "budget": fast_budget, "fallback": "reasoning"},
+            "reasoning": {"model": reasoning_model, "budget": reasoning_budget, "fallback": "fast"},
+        }
+        self.max_fast_words = max_fast_words
+        self.latency = LatencyTracker()
+        self.route_counts = {name: 0 for name in self.routes}
+        self.diverted = {name: 0 for name in self.routes}  # inputs sent to the fallback because the route was slow
+        self.lock = threading.Lock()
+
+    def classify(self, prompt, source=None, has_image=False):
+        """Cheap guess of how hard an input is, returns a route name"""
+        if has_image:
+            return "reasoning"
+        prompt = (prompt or "").strip()
+        words = len(prompt.split())
+        if REASONING_KEYWORDS.search(prompt) or words > 3 * self.max_fast_words:
+            return "reasoning"
+        if CHATTER_KEYWORDS.search(prompt) or words <= 3:
+            return "fast"
+        # Short Twitch messages are mostly chatter, the streamer's own questions get the big model
+        if source == "twitch" and words <= self.max_fast_words:
+            return "fast"
+        return "reasoning"
+
+    def classify_batch(self, questions, source="twitch"):
+        """Route for a batch of (username, question) pairs, the hardest question decides"""
+        routes = {self.classify(question, source) for _, question in questions}
+        return "reasoning" if "reasoning" in routes else "fast"
+
+    def _within_budget(self, route_name):
+        route = self.routes[route_name]
+        estimate = self.latency.estimate(route["model"])
+        return route["budget"] is None or estimate is None or estimate <= route["budget"]
+
+    def choose(self, payload):
+        """Returns (route name, model) for a chat payload. payload["route"] forces a route"""
+        route_name = payload.get("route") or self.classify(payload.get("prompt"), payload.get("source"), bool(payload.get("image")))
+        fallback = self.routes[route_name]["fallback"]
+        with self.lock:
+            if not self._within_budget(route_name) and fallback and self._within_budget(fallback) and not payload.get("image"):
+                self.diverted[route_name] += 1
+                if self.diverted[route_name] % self.OVER_BUDGET_PROBE_INTERVAL:
+                    route_name = fallback
+            self.route_counts[route_name] += 1
+        return route_name, self.routes[route_name]["model"]
+
+    def fallback_model(self, route_name):
+        """Model of the fallback route, used when a request fails"""
+        fallback = self.routes[route_name]["fallback"]
+        return self.routes[fallback]["model"] if fallback else None
+
+    def models(self):
+        return sorted({route["model"] for route in self.routes.values()})
+
+    def stats(self):
+        with self.lock:
+            routes = dict(self.route_counts)
+            diverted = dict(self.diverted)
+        return {"routes": routes, "diverted": diverted, "latency": self.latency.stats()}
@@ -1,60 +1,129 @@
 import ollama
-import tiktoken
-import re
 import os
-import datetime
+import threading
+import time
 from pathlib import Path
 from rich import print
+from text_stream import SentenceSplitter, ThinkBlockFilter, strip_thinking
+from chat_history import TokenBudgetHistory, ConversationCompactor, make_tokenizer
+from response_cache import ResponseCache
+from conversation_journal import ConversationJournal
+from model_router import ModelRouter, FAST_MODEL
 
+# Ollama settings, can be overridden with environment variables
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwq:32b")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # How long Ollama keeps the model loaded after a request
 
-def num_tokens_from_messages(messages, model='ollama'):
-    """Returns the number of tokens used by a list of messages."""
-    try:
-        if model == 'ollama':
-            # Handle the 'ollama' case separately (provide a fallback tokenizer or logic here)
-            num_tokens = sum(len(message["content"].split()) for message in messages)  # Just a fallback example
-        else:
-            # Default to tiktoken for models that are supported
-            encoding = tiktoken.encoding_for_model(model)
-            num_tokens = 0
-            for message in messages:
-                num_tokens += 4  # every message follows <im_start>{role/name}\n{content}<im_end>\n
-                for key, value in message.items():
-                    num_tokens += len(encoding.encode(value))
-                    if key == "name":
-                        num_tokens += -1  # role is always required and always 1 token
-            num_tokens += 2  # every reply is primed with <im_start>
-        return num_tokens
-    except Exception as e:
-        print(f"Error: {str(e)}")
-        raise NotImplementedError(f"num_tokens_from_messages() is not presently implemented for model {model}.")
 
 def remove_thinking_part(text):
-    # This pattern matches any section that starts with <think> and ends with <end_think>, or any other relevant format
-    trimmed_text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)  # Removing <think> tags and content between
-    trimmed_text = trimmed_text.strip()  # Clean up leading/trailing whitespace
-    return trimmed_text
+    # Removes <think> tags and the content between, same filter as the streaming path
+    return strip_thinking(text)
 
     
 
 class LocalAiManager:
-    def __init__(self):
-        self.chat_history = []  # Stores the entire conversation
-        self.backup_file = "conversation_backup.txt"  # Permanent backup file
-        self._initialize_backup()
-    
-    def _initialize_backup(self):
-        """Create backup file if it doesn't exist"""
-        if not os.path.exists(self.backup_file):
-            with open(self.backup_file, 'w') as f:
-                f.write("=== Conversation Backup ===\n")
+    def __init__(self, max_tokens=8000, tokenizer="approx", model=OLLAMA_MODEL, host=OLLAMA_HOST,
+                 options=None, keep_alive=OLLAMA_KEEP_ALIVE, timeout=600, cache_ttl=3600, cache_similarity=None,
+                 journal_directory="conversation_journal", fast_model=FAST_MODEL, submit_background=None):
+        # One client per manager, so the HTTP connection to Ollama is reused between requests
+        self.model = model
+        self.options = options or {}  # Ollama model options, e.g. {"num_ctx": 8192, "temperature": 0.7}
+        self.keep_alive = keep_alive
+        self.client = ollama.Client(host=host, timeout=timeout)
+        # Sends chatter to the small model and real questions to the reasoning model
+        self.router = ModelRouter(reasoning_model=model, fast_model=fast_model)
+        # Stores the conversation, token counts are computed once per message
+        self.history = TokenBudgetHistory(max_tokens=max_tokens, tokenizer=make_tokenizer(tokenizer))
+        # Summarizes old turns in the background before the hard token limit is reached.
+        # submit_background(job) decides where that runs (e.g. on the turn scheduler), a new thread by default
+        self.compactor = ConversationCompactor(self.history, self._summarize, on_compacted=self._journal_summary,
+                                               submit=submit_background)
+        # Answers to repeated questions (greetings, "what's the frog's name?") are served from here
+        self.response_cache = ResponseCache(ttl=cache_ttl, similarity=cache_similarity)
+        # Append-only record of the conversation, written by a background thread
+        self.journal = ConversationJournal(journal_directory)
     
+    @property
+    def chat_history(self):
+        """The conversation as a plain list of messages"""
+        return self.history.messages()
+
+    @chat_history.setter
+    def chat_history(self, messages):
+        self.history.reset(messages)
+        self.journal.append("reset", messages=[self._journal_message(msg) for msg in self.history.messages()])
+
+    def restore_from_journal(self):
+        """Rebuild the chat history from the journal (e.g. at startup). Returns the number of restored messages"""
+        messages = self.journal.load_history()
+        if messages:
+            self.history.reset(messages)
+            print(f"[yellow]Restored {len(messages)} messages from the conversation journal")
+        return len(messages)
+
+    def _update_context(self, context):
+        """
+        Put the chat context into the history's context slot, repeated lines are only kept once.
+        The slot replaces the previous turn's context, so it always holds the complete current context,
+        even if nothing changed since then. Returns the new context text (or None)
+        """
+        lines = []
+        for line in (context or "").splitlines():
+            line = line.strip()
+            if line and line not in lines:
+                lines.append(line)
+
+        content = "Chat context:\n" + "\n".join(lines) if lines else None
+        self.history.set_context(content)
+        return content
+
+    def _chat_request(self, messages, stream=False, model=None):
+        """Send a chat request to Ollama with the configured options and keep-alive. model defaults to the reasoning model"""
+        return self.client.chat(
+            model=model or self.model,
+            messages=messages,
+            stream=stream,
+            options=self.options,
+            keep_alive=self.keep_alive
+        )
+
+    def warm_up(self):
+        """Load every routed model into memory so the first real request doesn't pay for it. Returns the load time in seconds"""
+        start = time.time()
+        for model in self.router.models():
+            print(f"[yellow]Warming up {model}...")
+            try:
+                # An empty prompt makes Ollama load the model without generating anything
+                self.client.generate(model=model, prompt="", keep_alive=self.keep_alive)
+            except Exception as e:
+                print(f"Error warming up Ollama: {e}")
+                return None
+            print(f"[yellow]{model} is loaded ({time.time() - start:.1f}s)")
+        return time.time() - start
+
+    def warm_up_in_background(self):
+        """Start warm_up in a daemon thread, so startup isn't blocked"""
+        thread = threading.Thread(target=self.warm_up, daemon=True)
+        thread.start()
+        return thread
+
+    @staticmethod
+    def _journal_message(message):
+        """The message as it's stored in the journal, images are left out"""
+        return {key: value for key, value in message.items() if key != "images"}
+
     def _save_to_backup(self, role, content):
-        """Append a message to the backup file with timestamp"""
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with open(self.backup_file, 'a', encoding='utf-8') as f:
-            f.write(f"\n[{timestamp}] {role}:\n{content}\n")
-            f.write("-" * 40 + "\n")  # Separator line
+        """Write a note (anything that isn't part of the chat history itself) to the journal"""
+        self.journal.append("note", role=role, content=content)
+
+    def _append_message(self, message):
+        """Add a message to the chat history and the journal"""
+        self.history.append(message)
+        self.journal.append("append", message=self._journal_message(message))
+
+    def _journal_summary(self, block, summary_message):
+        self.journal.append("summary", message=summary_message, count=len(block))
 
     def _ask_local_model(self, prompt):
         """Send a request to the local Ollama model."""
@@ -63,11 +132,7 @@ class LocalAiManager:
             self._save_to_backup("USER", prompt)
             
             # Send the prompt to the Ollama model
-            response = ollama.chat(
-                model="qwq:32b",
-                messages=[{"role": "user", "content": prompt}],
-                stream=False
-            )
+            response = self._chat_request([{"role": "user", "content": prompt}])
             full_response = response["message"]["content"]
             
             # Save the full response (including thinking parts) to backup
@@ -78,14 +143,48 @@ class LocalAiManager:
             print(f"Error interacting with Ollama: {e}")
             return None
 
+    def _candidate_models(self, payload):
+        """The routed model for this payload, followed by its fallback"""
+        route, model = self.router.choose(payload)
+        fallback = self.router.fallback_model(route)
+        print(f"[yellow]Routing to {route} model {model}")
+        return [model] + ([fallback] if fallback and fallback != model else [])
+
+    def _routed_request(self, payload):
+        """Non-streaming chat request on the routed model, tries the fallback model if it fails"""
+        error = None
+        for model in self._candidate_models(payload):
+            try:
+                # No latency is recorded here, the router compares the streaming path's time to the first sentence
+                return self._chat_request(self.chat_history, model=model)
+            except Exception as e:
+                print(f"Error interacting with Ollama ({model}): {e}")
+                self.router.latency.record_failure(model)
+                error = e
+        raise error
+
+    def _summarize(self, previous_summary, messages):
+        """Ask the model to fold a block of old messages into the running conversation summary"""
+        transcript = "\n".join(f"{msg['role']}: {msg.get('content', '')}" for msg in messages)
+        prompt = (
+            "Summarize the following conversation so it can replace the original messages. "
+            "Keep names, facts, decisions and open questions. Answer with the summary only.\n\n"
+        )
+        if previous_summary:
+            prompt += f"Summary so far:\n{previous_summary}\n\n"
+        prompt += f"New messages:\n{transcript}"
+
+        # Summaries run in the background, the small model is plenty for them
+        response = self._chat_request([{"role": "user", "content": prompt}], model=self.router.routes["fast"]["model"])
+        return remove_thinking_part(response["message"]["content"])
+
     def chat(self, prompt=""):
         if not prompt:
             print("Didn't receive input!")
             return
 
         # Check token limit
-        chat_question = [{"role": "user", "content": prompt}]
-        if num_tokens_from_messages(chat_question) > 8000:
+        if self.history.count_message({"role": "user", "content": prompt}) > self.history.max_tokens:
             print("The length of this chat question is too large for the model")
             return
 
@@ -99,23 +198,19 @@ class LocalAiManager:
             self._save_to_backup("ASSISTANT (CLEAN)", clean_answer)
             return clean_answer
 
-    def chat_with_history(self, payload):
+    def _prepare_turn(self, payload):
+        """Add the user message (and context) to the chat history and trim it to the token limit"""
         if not payload.get('prompt') and not payload.get('image'):
             print("Didn't receive input!")
-            return None
+            return False
 
-        # Prepare and save user message
+        # Prepare user message
         user_message_content = payload.get('prompt', '')
-        self._save_to_backup("USER", user_message_content)
     
-        # Add context if available
-        if payload.get('context'):
-            context_message = {
-                "role": "system", 
-                "content": f"Chat context:\n{payload['context']}"
-            }
-            self.chat_history.append(context_message)
-            self._save_to_backup("SYSTEM", context_message["content"])
+        # Chat context goes into a single slot before the new user message instead of piling up in the history
+        context_content = self._update_context(payload.get('context'))
+        if context_content:
+            self._save_to_backup("SYSTEM", context_content)
 
         # Build the user message
         user_message = {
@@ -127,45 +222,127 @@ class LocalAiManager:
             user_message["images"] = [payload['image']]
 
         # Add to chat history
-        self.chat_history.append(user_message)
+        self._append_message(user_message)
 
         # Clean images from previous messages
-        for msg in self.chat_history:
+        for msg in self.history:
             if "images" in msg and msg is not user_message:
                 del msg["images"]
 
-        # Check token limit
-        while num_tokens_from_messages([{"content": str(msg.get('content', ''))} for msg in self.chat_history]) > 8000:
-            removed = self.chat_history.pop(1)
-            print(f"Popped a message! New token length: {num_tokens_from_messages(self.chat_history)}")
-            self._save_to_backup("SYSTEM", f"Removed message due to token limit: {removed['content']}")
+        # Hard token limit, only hit if the background compaction couldn't keep up.
+        # The token counts are already known so this is cheap
+        removed = self.history.trim()
+        if removed:
+            print(f"Popped {len(removed)} messages! New token length: {self.history.total_tokens}")
+            self.journal.append("evict", count=len(removed))
+        return True
+
+    def _system_message(self):
+        """Content of the active system message, part of the response cache key"""
+        return self.history.pinned[0]["content"] if self.history.pinned else ""
+
+    def _cached_answer(self, payload):
+        """Look the prompt up in the response cache. Image prompts are never cached"""
+        if payload.get('image') or not payload.get('prompt'):
+            return None
+        entry = self.response_cache.get(payload['prompt'], self._system_message())
+        if entry:
+            print(f"[yellow]Answering from the response cache {self.response_cache.stats()}")
+        return entry
+
+    def _cache_answer(self, payload, clean_answer, sentences=None):
+        if payload.get('image') or not payload.get('prompt'):
+            return
+        self.response_cache.put(payload['prompt'], self._system_message(), clean_answer, sentences)
+
+    def _finish_turn(self, full_response, clean_answer, cached=False):
+        """Add the cleaned answer to the chat history, the full answer (with thinking) is only kept in the journal"""
+        if cached:
+            self._save_to_backup("ASSISTANT (CACHED)", clean_answer)
+        else:
+            self._save_to_backup("ASSISTANT (FULL)", full_response)
+        self._append_message({"role": "assistant", "content": clean_answer})
+        self.compactor.maybe_compact()
+
+    def chat_with_history(self, payload):
+        if not self._prepare_turn(payload):
+            return None
+
+        cached = self._cached_answer(payload)
+        if cached:
+            self._finish_turn(cached["answer"], cached["answer"], cached=True)
+            return cached["answer"]
 
         # Call Ollama
         print("[yellow]\nAsking Local Model a question...")
         try:
-            response = ollama.chat(
-                model="qwq:32b",
-                messages=self.chat_history,
-                stream=False
-            )
+            response = self._routed_request(payload)
             full_response = response["message"]["content"]
             clean_answer = remove_thinking_part(full_response)
-            
-            # Save both versions to backup
-            self._save_to_backup("ASSISTANT (FULL)", full_response)
-            self._save_to_backup("ASSISTANT (CLEAN)", clean_answer)
-            
-            # Add cleaned version to chat history
-            self.chat_history.append({"role": "assistant", "content": clean_answer})
-            
+            self._finish_turn(full_response, clean_answer)
+            self._cache_answer(payload, clean_answer)
             return clean_answer
         except Exception as e:
             print(f"Error interacting with Ollama: {e}")
             self._save_to_backup("SYSTEM", f"Error: {str(e)}")
         return None
 
+    def chat_with_history_stream(self, payload):
+        """
+        Same as chat_with_history, but streams the answer from Ollama.
+        This is a generator: it yields every complete sentence of the cleaned answer
+        (thinking part removed) as soon as the model has written it, so TTS can start early.
+        The full answer is added to the chat history once the stream is finished.
+        """
+        if not self._prepare_turn(payload):
+            return
+
+        cached = self._cached_answer(payload)
+        if cached:
+            yield from cached["sentences"]
+            self._finish_turn(cached["answer"], cached["answer"], cached=True)
+            return
+
+        print("[yellow]\nAsking Local Model a question (streaming)...")
+        candidates = self._candidate_models(payload)
+        for attempt, model in enumerate(candidates):
+            # Asterisks are dropped too, the sentences go straight to TTS
+            think_filter = ThinkBlockFilter(drop_asterisks=True)
+            splitter = SentenceSplitter()
+            full_parts = []
+            sentences = []
+            start = time.time()
+            try:
+                for chunk in self._chat_request(self.chat_history, stream=True, model=model):
+                    token = chunk["message"]["content"]
+                    full_parts.append(token)
+                    for sentence in splitter.feed(think_filter.feed(token)):
+                        if not sentences:
+                            # The router's latency is the wait for the first spoken sentence, not the whole answer
+                            self.router.latency.record(model, time.time() - start)
+                        sentences.append(sentence)
+                        yield sentence
+                for sentence in splitter.feed(think_filter.flush()) + splitter.flush():
+                    if not sentences:
+                        self.router.latency.record(model, time.time() - start)
+                    sentences.append(sentence)
+                    yield sentence
+                break
+            except Exception as e:
+                print(f"Error interacting with Ollama ({model}): {e}")
+                self.router.latency.record_failure(model)
+                self._save_to_backup("SYSTEM", f"Error: {str(e)}")
+                # Only fall back if nothing was spoken yet
+                if sentences or attempt == len(candidates) - 1:
+                    return
+
+        clean_answer = " ".join(sentences)
+        self._finish_turn("".join(full_parts), clean_answer)
+        self._cache_answer(payload, clean_answer, sentences)
+
 if __name__ == '__main__':
     local_ai_manager = LocalAiManager()
+    local_ai_manager.warm_up()
 
     # CHAT TEST
     #chat_without_history = local_ai_manager.chat("Hey, what is 2 + 2? But tell it to me as Yoda")
@@ -173,8 +350,7 @@ if __name__ == '__main__':
     # CHAT WITH HISTORY TEST
     FIRST_SYSTEM_MESSAGE = {"role": "system", "content": "Act like you are Captain Jack Sparrow from the Pirates of the Caribbean movie series!"}
     FIRST_USER_MESSAGE = {"role": "user", "content": "Ahoy there! Who are you, and what are you doing in these parts? Please give me a 1 sentence background on how you got here."}
-    local_ai_manager.chat_history.append(FIRST_SYSTEM_MESSAGE)
-    local_ai_manager.chat_history.append(FIRST_USER_MESSAGE)
+    local_ai_manager.chat_history = [FIRST_SYSTEM_MESSAGE, FIRST_USER_MESSAGE]
 
     while True:
         new_prompt = input("\nType out your next question Jack Sparrow, then hit enter: \n\n")
@@ -0,0 +1,127 @@
+import re
+import time
+import threading
+from rich import print
+
+ANSWER_TAG = re.compile(r"\[A(\d+)\]")
+
+
+def is_viewer_question(message):
+    """Viewers prompt the LLM with a '_' at the beginning or end of their message"""
+    message = message.strip()
+    return len(message) > 1 and (message.startswith('_') or message.endswith('_'))
+
+
+def build_batch_prompt(questions):
+    """One prompt for a list of (username, question) pairs, every question is tagged so the answer can be split"""
+    lines = [
+        "Several viewers asked questions at the same time. Answer every question in one or two sentences.",
+        "Start each answer with its tag, e.g. [A1] for [Q1], and address the viewer by name.",
+        ""
+    ]
+    for i, (username, question) in enumerate(questions, start=1):
+        lines.append(f"[Q{i}] {username}: {question}")
+    return "\n".join(lines)
+
+
+def split_batch_sentences(sentences, questions, answers):
+    """
+    Turns the sentences of a streamed batch answer into sentences to speak: every [An] tag is replaced
+    by the name of the viewer who asked. Text before the first tag or under an unknown tag is dropped.
+    While the stream is read, every answer's sentences are collected in answers (question index -> list)
+    """
+    current = None
+    name = None  # said before the first words of an answer
+    for sentence in sentences:
+        spoken = []
+        position = 0
+        for match in list(ANSWER_TAG.finditer(sentence)) + [None]:
+            text = sentence[position:match.start() if match else len(sentence)].strip()
+            if text and current is not None:
+                answers[current].append(text)
+                spoken.append(f"{name}, {text}" if name else text)
+                name = None
+            if match is None:
+                break
+            index = int(match.group(1)) - 1
+            current = index if 0 <= index < len(questions) and index not in answers else None
+            if current is not None:
+                answers[current] = []
+                name = questions[current][0]
+            position = match.end()
+        if spoken:
+            yield " ".join(spoken)
+
+
+def batch_replies(answers, questions):
+    """(username, answer) pairs of the collected answers, questions without an answer are skipped"""
+    return [(questions[i][0], " ".join(answers[i])) for i in sorted(answers) if answers[i]]
+
+
+class QuestionBatcher:
+    """
+    Collects viewer questions and hands them over in batches, so many questions
+    can be answered with a single LLM turn.
+    A batch is sent once window_seconds have passed since its first question, or as soon as it has max_batch_size questions.
+    """
+
+    def __init__(self, answer_batch, window_seconds=8, max_batch_size=10):
+        """
+        Parameters:
+        answer_batch (function): called with a list of (username, question) pairs from the batcher thread
+        window_seconds (float): how long to collect questions after the first one arrived
+        max_batch_size (int): send the batch early when it has this many questions
+        """
+        self.answer_batch = answer_batch
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.pending = []
+        self.condition = threading.Condition()
+        self.batches_sent = 0
+        self.questions_sent = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def add(self, username, question):
+        question = question.strip().strip('_').strip()
+        if not question:
+            return
+        with self.condition:
+            self.pending.append((username, question))
+            self.condition.notify()
+
+    def _next_batch(self):
+        """Wait for the first question, then collect until the window closes or the batch is full"""
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+            deadline = time.time() + self.window_seconds
+            while len(self.pending) < self.max_batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            batch = self.pending[:self.max_batch_size]
+            del self.pending[:self.max_batch_size]
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            print(f"[cyan]Answering {len(batch)} viewer questions in one turn")
+            self.batches_sent += 1
+            self.questions_sent += len(batch)
+            try:
+                self.answer_batch(batch)
+            except Exception as e:
+                print(f"Error answering question batch: {e}")
+
+    def stats(self):
+        with self.condition:
+            pending = len(self.pending)
+        return {
+            "pending": pending,
+            "batches_sent": self.batches_sent,
+            "questions_sent": self.questions_sent,
+            "questions_per_batch": self.questions_sent / self.batches_sent if self.batches_sent else 0.0
+        }
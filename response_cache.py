@@ -0,0 +1,102 @@
+import re
+import time
+import hashlib
+import difflib
+import threading
+from collections import OrderedDict
+
+
+def normalize_prompt(text):
+    """Lowercase, drop punctuation and the Twitch '_' prefix, collapse whitespace"""
+    text = re.sub(r"[^\w\s]|_", " ", text.lower())
+    return " ".join(text.split())
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of LLM answers, keyed on the normalized prompt and the active system message.
+    With a similarity threshold, near-duplicate prompts (e.g. "whats the frogs name" vs
+    "what is the frog's name?") are matched as well.
+    """
+
+    def __init__(self, max_entries=128, ttl=3600, similarity=None):
+        """
+        Parameters:
+        max_entries (int): least recently used answers are evicted above this
+        ttl (float): seconds an answer stays valid
+        similarity (float): 0-1, if set prompts that are at least this similar count as a hit
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.entries = OrderedDict()  # (system key, normalized prompt) -> entry
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _system_key(system_message):
+        return hashlib.sha1((system_message or "").encode("utf-8")).hexdigest()
+
+    def _expired(self, entry, now):
+        return now - entry["created"] > self.ttl
+
+    def get(self, prompt, system_message=None):
+        """Return the cached entry ({"answer", "sentences", "created"}) for this prompt, or None"""
+        system_key = self._system_key(system_message)
+        normalized = normalize_prompt(prompt)
+        now = time.time()
+        with self.lock:
+            key = (system_key, normalized)
+            entry = self.entries.get(key)
+            if entry is None and self.similarity and normalized:
+                # Near-duplicate lookup, the cache is small so a linear scan is fine
+                best_ratio = self.similarity
+                for (other_system, other_prompt), candidate in self.entries.items():
+                    if other_system != system_key or self._expired(candidate, now):
+                        continue
+                    ratio = difflib.SequenceMatcher(None, normalized, other_prompt).ratio()
+                    if ratio >= best_ratio:
+                        best_ratio = ratio
+                        key, entry = (other_system, other_prompt), candidate
+            if entry is not None and self._expired(entry, now):
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, prompt, system_message, answer, sentences=None):
+        """Store an answer. sentences are the sentences it was spoken as, a cache hit replays them for TTS"""
+        normalized = normalize_prompt(prompt)
+        if not normalized or not answer:
+            return None
+        entry = {
+            "answer": answer,
+            "sentences": sentences or [answer],
+            "created": time.time()
+        }
+        with self.lock:
+            key = (self._system_key(system_message), normalized)
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
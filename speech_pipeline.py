@@ -0,0 +1,230 @@
+import io
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from rich import print
+from eleven_labs import join_audio_files
+
+OBS_SCENE = "*** Mid Monitor"
+OBS_SOURCE = "Madeira Flag"
+
+
+class SpeechPipeline:
+    """
+    Speaks a stream of sentences: every sentence is sent to TTS as soon as it arrives
+    and the audio is queued for playback, so the first sentence plays while the LLM is still writing.
+    Several sentences are synthesized at the same time, which overlaps the TTS round-trips.
+    With a FillerLibrary, a filler clip covers the silence until the first sentence is ready.
+    """
+
+    def __init__(self, elevenlabs_manager, audio_manager, obswebsockets_manager=None, max_workers=4, retries=2,
+                 filler_library=None, crossfade_ms=400):
+        self.elevenlabs_manager = elevenlabs_manager
+        self.audio_manager = audio_manager
+        self.obswebsockets_manager = obswebsockets_manager
+        self.filler_library = filler_library
+        self.crossfade_ms = crossfade_ms
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts")
+        self.retries = retries
+        self.last_metrics = {}
+
+    def _set_obs_visibility(self, visible):
+        if self.obswebsockets_manager:
+            self.obswebsockets_manager.set_source_visibility(OBS_SCENE, OBS_SOURCE, visible)
+
+    def _start_filler(self, voice):
+        """Play a filler clip while the answer is generated, returns (channel, start time, length) or None"""
+        if self.filler_library is None:
+            return None
+        clip = self.filler_library.pick(voice)
+        if clip is None:
+            return None
+        try:
+            channel, length = self.audio_manager.play_sound(clip)
+        except Exception as e:
+            print(f"Couldn't play the filler clip: {e}")
+            return None
+        return channel, time.time(), length
+
+    def _end_filler(self, filler, metrics):
+        """Fade the filler out while the answer starts (crossfade) and record how much of the wait it covered"""
+        channel, started, length = filler
+        covered = min(time.time() - started, length)
+        if channel:
+            channel.fadeout(self.crossfade_ms)
+        metrics["filler_covered_seconds"] = covered
+        self.filler_library.record(covered)
+
+    def _playback_worker(self, audio_queue, metrics, turn_start, voice=None, playbacks=None, on_playback=None):
+        """
+        Hands the queued TTS results to the AudioManager's playback engine in order until it receives None.
+        Doesn't wait for the playback, the OBS source is hidden once the last sentence finished playing.
+        The playback future of every TTS future is put into playbacks and passed to on_playback
+        """
+        # A filler would talk over the answer that's still playing
+        filler = None if self.audio_manager.is_busy() else self._start_filler(voice)
+        shown = filler is not None
+        if shown:
+            self._set_obs_visibility(True)
+
+        def started(_):
+            nonlocal filler, shown
+            if metrics["time_to_first_playback"] is None:
+                metrics["time_to_first_playback"] = time.time() - turn_start
+            if filler:
+                self._end_filler(filler, metrics)
+                filler = None
+            if not shown:
+                self._set_obs_visibility(True)
+                shown = True
+
+        def finished(_):
+            nonlocal filler
+            if filler:
+                self._end_filler(filler, metrics)
+                filler = None
+            # The next turn's audio may already be waiting, it keeps the source visible
+            if shown and not self.audio_manager.is_busy():
+                self._set_obs_visibility(False)
+
+        last_playback = None
+        while True:
+            future = audio_queue.get()
+            if future is None:
+                break
+            try:
+                file_path = future.result()
+            except Exception as e:
+                print(f"Skipping a sentence, TTS failed: {e}")
+                continue
+            try:
+                # Decoded here, so the sentences play back to back without a gap. Hot clips come from memory
+                last_playback = self.audio_manager.enqueue_decoded(
+                    file_path, on_start=started, data=self.elevenlabs_manager.read_audio(file_path))
+            except Exception as e:
+                print(f"Couldn't decode {file_path} ({e}), playing the file instead")
+                last_playback = self.audio_manager.enqueue(file_path, on_start=started)
+            playbacks[future] = last_playback
+            if on_playback:
+                on_playback(last_playback)
+        if last_playback:
+            last_playback.add_done_callback(finished)
+        else:
+            finished(None)
+
+    def _read_mp3(self, file_path):
+        """Bytes of a clip as mp3, so the clips of a turn can be streamed back to back"""
+        if file_path.lower().endswith(".mp3"):
+            return self.elevenlabs_manager.read_audio(file_path)
+        from pydub import AudioSegment
+        buffer = io.BytesIO()
+        AudioSegment.from_file(file_path).export(buffer, format="mp3")
+        return buffer.getvalue()
+
+    def _stream_worker(self, stream_queue, audio_stream):
+        """Writes the queued TTS results to an AudioStream in order until it receives None"""
+        try:
+            while True:
+                future = stream_queue.get()
+                if future is None:
+                    break
+                try:
+                    audio_stream.write(self._read_mp3(future.result()))
+                except Exception as e:
+                    print(f"Skipping a sentence in the audio stream, TTS failed: {e}")
+        finally:
+            audio_stream.close()
+
+    def _release_clips(self, futures, playbacks):
+        """Unpin the turn's clips in the TTS cache, the ones that are played locally once they finished playing"""
+        for future in futures:
+            try:
+                file_path = future.result()
+            except Exception:
+                continue
+            playback = playbacks.get(future)
+            if playback is None:
+                self.elevenlabs_manager.release_audio(file_path)
+            else:
+                playback.add_done_callback(lambda _, file_path=file_path: self.elevenlabs_manager.release_audio(file_path))
+
+    def speak(self, sentences, voice=None, play_locally=True, output_path=None, turn_start=None, audio_stream=None,
+              on_playback=None):
+        """
+        Parameters:
+        sentences (iterable): the sentences to speak, e.g. the generator from LocalAiManager.chat_with_history_stream
+        voice (str): elevenlabs voice, None uses the default voice
+        play_locally (bool): queue the audio on the AudioManager's playback engine while it is being generated,
+            speak returns once everything is queued, not when it finished playing
+        output_path (str): if set, all sentence audio is joined into this mp3 file (e.g. for the browser)
+        turn_start (float): time.time() when the turn started, used for the time-to-first-audio measurement
+        audio_stream (AudioStream): if set, every sentence's mp3 is written to it as soon as it's ready (e.g. for the browser)
+        on_playback (function): called with the playback future of every sentence that's queued locally
+
+        Sentences are synthesized concurrently on the worker pool, playback and the joined file keep their order.
+        Returns the full spoken text (str)
+        """
+        turn_start = turn_start or time.time()
+        metrics = {"sentences": 0, "time_to_first_audio": None, "time_to_first_playback": None,
+                   "filler_covered_seconds": 0.0}
+        spoken_text = []
+        futures = []
+
+        def first_audio_ready(_):
+            if metrics["time_to_first_audio"] is None:
+                metrics["time_to_first_audio"] = time.time() - turn_start
+                print(f"[magenta]Time to first audio: {metrics['time_to_first_audio']:.2f}s")
+
+        audio_queue = queue.Queue()
+        playbacks = {}  # TTS future -> playback future
+        player = None
+        if play_locally:
+            player = threading.Thread(target=self._playback_worker,
+                                      args=(audio_queue, metrics, turn_start, voice, playbacks, on_playback), daemon=True)
+            player.start()
+        stream_queue = queue.Queue()
+        streamer = None
+        if audio_stream is not None:
+            streamer = threading.Thread(target=self._stream_worker, args=(stream_queue, audio_stream), daemon=True)
+            streamer.start()
+
+        try:
+            try:
+                for sentence in sentences:
+                    if not sentence:
+                        continue
+                    # Repeated sentences come straight from the TTS cache. The clips are pinned there until they're played
+                    future = self.executor.submit(self.elevenlabs_manager.text_to_audio_with_retry, sentence, voice, False,
+                                                  self.retries, pin=True)
+                    if not futures:
+                        future.add_done_callback(first_audio_ready)
+                    metrics["sentences"] += 1
+                    spoken_text.append(sentence)
+                    futures.append(future)
+                    audio_queue.put(future)
+                    stream_queue.put(future)
+            finally:
+                audio_queue.put(None)
+                stream_queue.put(None)
+                if player:
+                    player.join()
+                if streamer:
+                    streamer.join()
+
+            if output_path and futures:
+                audio_files = []
+                for future in futures:
+                    try:
+                        audio_files.append(future.result())
+                    except Exception as e:
+                        print(f"Skipping a sentence, TTS failed: {e}")
+                if audio_files:
+                    join_audio_files(audio_files, output_path)
+        finally:
+            self._release_clips(futures, playbacks)
+
+        metrics["total_time"] = time.time() - turn_start
+        self.last_metrics = metrics
+        print(f"[magenta]Speech pipeline finished: {metrics}")
+        return " ".join(spoken_text)
@@ -182,6 +182,11 @@ function startRecording() {
                 const formData = new FormData();
                 formData.append('audio', audioBlob, 'recording.webm');
                 formData.append('use_browser_audio', 'true');
+
+                // Open the audio stream right away, the answer starts playing with its first sentence
+                const streamId = newStreamId();
+                formData.append('stream_id', streamId);
+                playAudioInBrowser(`/audio_stream/${streamId}`).catch(() => {});
                 
                 // Add recording status to chat history
                 chatHistory.innerHTML += `<p><strong>You:</strong> [Audio recording]</p>`;
@@ -203,11 +208,6 @@ function startRecording() {
                     chatHistory.innerHTML += `<p><em>Transcribed:</em> ${data.transcribed_text}</p>`;
                     chatHistory.innerHTML += `<p><strong>LLM:</strong> ${data.response}</p>`;
                     
-                    // Play the audio response if available
-                    if (data.audio_url) {
-                        playAudioInBrowser(data.audio_url);
-                    }
-                    
                 } catch (error) {
                     console.error('Error processing audio:', error);
                     chatHistory.innerHTML += `<p><strong>Error:</strong> Failed to process audio recording.</p>`;
@@ -225,55 +225,31 @@ function startRecording() {
         });
 }
 
+// Id of a response audio stream, crypto.randomUUID only exists on https/localhost
+function newStreamId() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + Math.random().toString(36).slice(2);
+}
+
 async function playAudioInBrowser(audioUrl) {
     try {
         console.log("Attempting to play audio from URL:", audioUrl);
         
-        // Fetch the audio file as a Blob
-        const audioResponse = await fetch(audioUrl);
-        if (!audioResponse.ok) {
-            throw new Error(`Failed to fetch audio file: ${audioResponse.status} ${audioResponse.statusText}`);
-        }
-        
-        const audioBlob = await audioResponse.blob();
-        const audioObjectURL = URL.createObjectURL(audioBlob);
+        // The browser plays the chunked response while it's still downloading
+        const audio = new Audio(audioUrl);
         
-        // Create and configure audio element
-        const audio = new Audio(audioObjectURL);
-        
-        // Set up promise to track when audio starts playing
-        const playPromise = new Promise((resolve, reject) => {
-            audio.oncanplaythrough = () => {
-                console.log("Audio can play through, starting playback");
-                const playAttempt = audio.play();
-                if (playAttempt !== undefined) {
-                    playAttempt
-                        .then(() => {
-                            console.log("Audio playback started successfully");
-                            resolve();
-                        })
-                        .catch(error => {
-                            console.error("Audio playback failed:", error);
-                            reject(error);
-                        });
-                } else {
-                    resolve(); // For browsers that don't return a promise from play()
-                }
-            };
-            
-            audio.onerror = (e) => {
-                console.error("Error loading audio:", e);
-                reject(new Error("Failed to load audio"));
-            };
-        });
-        
-        // Clean up the object URL when done to avoid memory leaks
         audio.onended = () => {
             console.log("Audio playback completed");
-            URL.revokeObjectURL(audioObjectURL);
+        };
+        audio.onerror = (e) => {
+            console.error("Error loading audio:", e);
         };
         
-        return playPromise;
+        await audio.play();
+        console.log("Audio playback started successfully");
+        return audio;
     } catch (error) {
         console.error("Error in playAudioInBrowser:", error);
         throw error;
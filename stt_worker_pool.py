@@ -0,0 +1,255 @@
+import os
+import time
+import queue
+import atexit
+import itertools
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory, connection, resource_tracker
+from concurrent.futures import Future
+import numpy as np
+from rich import print
+
+
+class STTBusyError(Exception):
+    """Raised when too many transcriptions are waiting"""
+
+
+class STTUnavailableError(RuntimeError):
+    """Raised when the pool can't run (no fork on this platform) or has no workers that could answer"""
+
+
+def _worker_main(jobs, results, current_jobs, slot, model_name, torch_threads, profile, language):
+    """
+    Runs in a worker process: loads the model once and transcribes jobs until it receives None.
+    current_jobs[slot] is the job it's working on (-1 when idle), so a job isn't lost if the worker dies
+    """
+    import torch
+    torch.set_num_threads(torch_threads)
+    from whisper_speech_to_text import SpeechToTextManager
+    manager = SpeechToTextManager(model_name, vad="energy", profile=profile, language=language)
+    results.put(("ready", os.getpid(), None))
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, shm_name, length, job_profile = job
+        current_jobs[slot] = job_id
+        shm = shared_memory.SharedMemory(name=shm_name)
+        # Attaching registers the block with the (shared) resource tracker a second time, the parent unlinks it
+        resource_tracker.unregister(shm._name, "shared_memory")
+        try:
+            # Copied out of the shared block, so it can be closed no matter what torch keeps a reference to
+            audio_data = np.ndarray((length,), dtype=np.float32, buffer=shm.buf).copy()
+            results.put((job_id, manager.transcribe_audio(audio_data, job_profile), None))
+        except Exception as e:
+            results.put((job_id, None, repr(e)))
+        finally:
+            shm.close()
+            current_jobs[slot] = -1
+
+
+def _supervisor_main(workers, jobs, results, current_jobs, stopping, worker_args):
+    """
+    Runs in a helper process that's forked while the parent is still single threaded: it forks the workers
+    and replaces dead ones, so nothing is ever forked from a process with running threads.
+    Reports ("started", pid, None) and ("died", pid, (exit code, job id it was working on or -1)).
+    Stops when stopping is set or the parent process is gone
+    """
+    context = mp.get_context("fork")
+    parent = mp.parent_process()
+
+    def start(slot):
+        current_jobs[slot] = -1
+        process = context.Process(target=_worker_main, args=(jobs, results, current_jobs, slot, *worker_args),
+                                  daemon=True)
+        process.start()
+        results.put(("started", process.pid, None))
+        return process
+
+    processes = [start(slot) for slot in range(workers)]
+    while not stopping.is_set():
+        if parent.sentinel in connection.wait([parent.sentinel] + [process.sentinel for process in processes], timeout=1):
+            break
+        for slot, process in enumerate(processes):
+            if not process.is_alive() and not stopping.is_set():
+                process.join()
+                results.put(("died", process.pid, (process.exitcode, current_jobs[slot])))
+                # A worker that can't start (e.g. the model doesn't load) isn't restarted in a tight loop
+                time.sleep(1)
+                processes[slot] = start(slot)
+    for _ in processes:
+        jobs.put(None)
+    for process in processes:
+        process.join(timeout=5)
+
+
+class STTWorkerPool:
+    """
+    Whisper in separate worker processes, so inference doesn't compete for the GIL with Flask,
+    the Twitch listener and playback. Every worker keeps its model loaded. Sample arrays are handed
+    over in shared memory instead of being pickled through the job queue.
+    At most max_backlog transcriptions can be waiting, submit raises STTBusyError above that.
+    A job whose worker dies fails, the worker is replaced. Once the supervisor is gone, or the workers keep
+    dying before they're ready, waiting and new jobs fail with STTUnavailableError right away.
+    Create the pool before other threads are started: the workers are forked (by a supervisor process
+    forked here), because spawning would re-run chatgpt_character's module level code in every worker.
+    Platforms without fork (Windows) raise STTUnavailableError, Whisper has to run in-process there.
+    """
+
+    MAX_FAILED_STARTS = 3  # per worker, workers dying before they're ready this often means the pool is broken
+
+    def __init__(self, model_name="base", workers=2, torch_threads=None, max_backlog=8, profile="balanced",
+                 language=None):
+        """
+        Parameters:
+        model_name (str): Whisper model every worker loads
+        workers (int): number of processes
+        torch_threads (int): torch intra-op threads per worker, defaults to an even share of the CPU cores
+        max_backlog (int): transcriptions that may be queued or running at the same time
+        profile (str): default decode profile (see DECODE_PROFILES)
+        language (str): pinned language, None to detect it once per worker
+        """
+        self.model_name = model_name
+        self.workers = workers
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // workers)
+        self.profile = profile
+        self.language = language
+        self.max_backlog = max_backlog
+        if "fork" not in mp.get_all_start_methods():
+            raise STTUnavailableError("STT worker processes need the fork start method, which this platform doesn't have")
+        self.context = mp.get_context("fork")
+        self.jobs = self.context.Queue()
+        self.results = self.context.Queue()
+        self.current_jobs = self.context.Array("q", [-1] * workers, lock=False)
+        self.stopping = self.context.Event()
+        self.supervisor = self.context.Process(
+            target=_supervisor_main,
+            args=(workers, self.jobs, self.results, self.current_jobs, self.stopping,
+                  (self.model_name, self.torch_threads, self.profile, self.language)),
+            daemon=False  # daemonic processes can't start the workers
+        )
+        self.supervisor.start()
+        atexit.register(self.close)
+        self.pending = {}  # job id -> (Future, SharedMemory)
+        self.lock = threading.Lock()
+        self.counter = itertools.count()
+        self.alive = set()  # worker pids
+        self.ready = set()
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.restarted = 0
+        self.failed_starts = 0  # workers that died before they were ready, since the last one was
+        self.collector = threading.Thread(target=self._collect_results, daemon=True)
+        self.collector.start()
+
+    def _unavailable(self):
+        """Why no job can be answered right now, None if the pool works"""
+        if not self.supervisor.is_alive():
+            return "the STT supervisor process isn't running"
+        if not self.ready and self.failed_starts >= self.MAX_FAILED_STARTS * self.workers:
+            return f"the STT workers died {self.failed_starts} times before they were ready"
+        return None
+
+    def _fail_pending(self, reason):
+        """Fail every waiting job, nothing is going to answer them"""
+        with self.lock:
+            pending = list(self.pending.values())
+            self.pending.clear()
+            self.failed += len(pending)
+        for future, shm in pending:
+            shm.close()
+            shm.unlink()
+            future.set_exception(STTUnavailableError(f"Transcription failed: {reason}"))
+
+    def _collect_results(self):
+        while True:
+            try:
+                job_id, text, error = self.results.get(timeout=1)
+            except queue.Empty:
+                reason = self._unavailable() if self.pending else None
+                if reason:
+                    self._fail_pending(reason)
+                continue
+            if job_id == "started":
+                self.alive.add(text)
+                continue
+            if job_id == "ready":
+                self.ready.add(text)
+                self.failed_starts = 0
+                print(f"[green]STT worker {text} ready")
+                continue
+            if job_id == "died":
+                exitcode, job_id = error
+                print(f"STT worker {text} died (exit code {exitcode}), starting a new one")
+                if text not in self.ready:
+                    self.failed_starts += 1
+                self.alive.discard(text)
+                self.ready.discard(text)
+                self.restarted += 1
+                reason = self._unavailable()
+                if reason:
+                    self._fail_pending(reason)
+                    continue
+                if job_id < 0:
+                    continue
+                error = f"the STT worker died (exit code {exitcode})"
+            with self.lock:
+                future, shm = self.pending.pop(job_id, (None, None))
+                if future is not None:
+                    if error is None:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            if future is None:
+                continue
+            if error is None:
+                future.set_result(text)
+            else:
+                future.set_exception(RuntimeError(f"Transcription failed in the STT worker: {error}"))
+
+    def submit(self, audio_data, profile=None):
+        """Queue float32 16 kHz samples for transcription, returns a Future with the text"""
+        audio_data = np.ascontiguousarray(audio_data, dtype=np.float32)
+        reason = self._unavailable()
+        if reason:
+            raise STTUnavailableError(f"Can't transcribe: {reason}")
+        with self.lock:
+            if len(self.pending) >= self.max_backlog:
+                self.rejected += 1
+                raise STTBusyError(f"{len(self.pending)} transcriptions are already waiting")
+            job_id = next(self.counter)
+            shm = shared_memory.SharedMemory(create=True, size=max(audio_data.nbytes, 1))
+            np.ndarray(audio_data.shape, dtype=np.float32, buffer=shm.buf)[:] = audio_data
+            future = Future()
+            self.pending[job_id] = (future, shm)
+        self.jobs.put((job_id, shm.name, len(audio_data), profile))
+        return future
+
+    def transcribe(self, audio_data, profile=None, timeout=300):
+        """Blocking transcription of up to 30 s of audio in a worker"""
+        return self.submit(audio_data, profile).result(timeout)
+
+    def close(self):
+        self.stopping.set()
+        self.supervisor.join(timeout=10)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "alive": len(self.alive),
+                "ready": len(self.ready),
+                "restarted": self.restarted,
+                "available": self._unavailable() is None,
+                "torch_threads": self.torch_threads,
+                "backlog": len(self.pending),
+                "max_backlog": self.max_backlog,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected
+            }
@@ -0,0 +1,80 @@
+import os
+import time
+import wave
+
+import numpy as np
+import pytest
+
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+pytest.importorskip("pygame")
+
+from audio_player import AudioManager
+
+
+@pytest.fixture(scope="module")
+def audio_manager():
+    return AudioManager()
+
+
+def test_pcm_chunks_play_back_to_back(audio_manager):
+    starts = []
+    futures = [audio_manager.enqueue_pcm(np.zeros(4800, dtype=np.int16), 48000,
+                                         on_start=lambda item: starts.append(time.time()))
+               for _ in range(3)]
+
+    assert [future.result(5) for future in futures] == [True, True, True]
+    # Every chunk is announced when it starts, 100 ms after the one before
+    gaps = np.diff(starts)
+    assert len(starts) == 3 and np.all(gaps > 0.07) and np.all(gaps < 0.2)
+    audio_manager.wait_until_idle()
+
+
+def test_samples_are_converted_to_the_mixer_format(audio_manager):
+    frequency, _, channels = audio_manager._mixer_format()
+    sound, length = audio_manager._make_sound(np.zeros(8000, dtype=np.float32), sample_rate=16000)
+
+    assert length == pytest.approx(0.5, abs=0.01)
+    assert sound.get_raw() and len(sound.get_raw()) == int(0.5 * frequency) * channels * 2
+
+
+def test_status_while_pcm_plays(audio_manager):
+    futures = [audio_manager.enqueue_pcm(np.zeros(24000, dtype=np.int16), 48000) for _ in range(2)]
+    deadline = time.time() + 2
+    while not audio_manager.pcm_playing and time.time() < deadline:
+        time.sleep(0.01)
+    status = audio_manager.status()
+
+    assert status["now_playing"] == "pcm"
+    assert status["pcm_buffered_seconds"] > 0
+    assert audio_manager.is_busy()
+    for future in futures:
+        future.result(5)
+    audio_manager.wait_until_idle()
+
+
+def test_skip_resolves_the_chunks_as_skipped(audio_manager):
+    futures = [audio_manager.enqueue_pcm(np.zeros(48000, dtype=np.int16), 48000) for _ in range(2)]
+    deadline = time.time() + 2
+    while not audio_manager.pcm_playing and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert audio_manager.skip()
+    assert futures[0].result(5) is False
+    audio_manager.wait_until_idle()
+
+
+def test_decoded_file_length_comes_from_the_samples(audio_manager, tmp_path):
+    path = str(tmp_path / "clip.wav")
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(48000)
+        wav_file.writeframes(b"\0\0" * 12000)
+
+    future = audio_manager.enqueue_decoded(path)
+    deadline = time.time() + 2
+    while not audio_manager.pcm_playing and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert audio_manager.status()["length"] == pytest.approx(0.25, abs=0.01)
+    assert future.result(5) is True
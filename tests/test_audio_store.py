@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from audio_store import AudioArtifactStore, ArtifactExistsError
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AudioArtifactStore(str(tmp_path / "artifacts"), max_bytes=100, ttl=600, spill_bytes=8)
+
+
+def finished(store, artifact_id, *chunks):
+    artifact = store.create(artifact_id)
+    for chunk in chunks:
+        artifact.write(chunk)
+    artifact.close()
+    return artifact
+
+
+def test_reused_id_is_rejected(store):
+    store.create("a")
+    with pytest.raises(ArtifactExistsError):
+        store.create("a")
+
+
+def test_reader_gets_chunks_written_after_it_started(store):
+    artifact = store.create("a")
+    artifact.start()
+    received = []
+    reader = threading.Thread(target=lambda: received.extend(store.iter_chunks(artifact)))
+    reader.start()
+    artifact.write(b"one")
+    artifact.write(b"two")
+    artifact.close()
+    reader.join(5)
+
+    assert b"".join(received) == b"onetwo"
+    assert artifact.refs == 0
+
+
+def test_wait_for_returns_an_artifact_registered_later(store):
+    threading.Timer(0.1, store.create, ["late"]).start()
+
+    assert store.wait_for("late", 5).stream_id == "late"
+    assert store.wait_for("never", 0.05) is None
+
+
+def test_referenced_artifacts_are_not_evicted(store):
+    held = finished(store, "held", b"x" * 60)
+    store.acquire(held)
+    finished(store, "other", b"y" * 60)
+
+    # Over budget: only the unreferenced artifact can go
+    assert store.get("held") is held
+    assert store.get("other") is None
+    store.release(held)
+
+
+def test_big_finished_artifacts_are_spilled_and_still_readable(store):
+    artifact = finished(store, "big", b"0123", b"456789")
+
+    assert artifact.path is not None
+    assert store.read_range(artifact, 2, 6) == b"23456"
+    assert store.stats()["disk_bytes"] == 10
+
+
+def test_range_of_an_artifact_in_memory(store):
+    artifact = finished(store, "small", b"012", b"34")
+
+    assert artifact.path is None
+    assert store.read_range(artifact, 1, 3) == b"123"
@@ -0,0 +1,86 @@
+from chat_history import TokenBudgetHistory, ConversationCompactor, WordCountTokenizer
+
+SYSTEM = {"role": "system", "content": "You are a pirate"}
+
+
+def make_history(max_tokens=100):
+    history = TokenBudgetHistory(max_tokens=max_tokens, tokenizer=WordCountTokenizer(), tokens_per_message=0)
+    history.reset([SYSTEM])
+    return history
+
+
+def contents(history):
+    return [message["content"] for message in history.messages()]
+
+
+def test_total_tokens_follow_appends_and_evictions():
+    history = make_history()
+    history.append({"role": "user", "content": "one two three"})
+    history.append({"role": "assistant", "content": "four five"})
+
+    assert history.total_tokens == 4 + 3 + 2
+    assert history.evict_oldest()["content"] == "one two three"
+    assert history.total_tokens == 4 + 2
+
+
+def test_trim_keeps_the_pinned_system_message_and_the_newest_turn():
+    history = make_history(max_tokens=10)
+    for i in range(5):
+        history.append({"role": "user", "content": f"message number {i}"})
+
+    removed = history.trim()
+
+    assert [message["content"] for message in removed] == ["message number 0", "message number 1", "message number 2"]
+    assert contents(history) == [SYSTEM["content"], "message number 3", "message number 4"]
+    assert history.total_tokens == 10
+
+
+def test_context_stays_in_front_of_its_user_message():
+    history = make_history()
+    history.set_context("chat says hi")
+    history.append({"role": "user", "content": "question"})
+    history.append({"role": "assistant", "content": "answer"})
+
+    assert contents(history) == [SYSTEM["content"], "chat says hi", "question", "answer"]
+
+    # The next turn's context replaces it and moves to the next question
+    history.set_context("chat says bye")
+    history.append({"role": "user", "content": "second question"})
+    assert contents(history) == [SYSTEM["content"], "question", "answer", "chat says bye", "second question"]
+
+
+def test_replace_with_summary_swaps_the_oldest_block():
+    history = make_history()
+    turns = [{"role": "user", "content": f"turn {i}"} for i in range(4)]
+    for turn in turns:
+        history.append(turn)
+    summary = {"role": "system", "content": ConversationCompactor.SUMMARY_PREFIX + "they talked"}
+
+    assert history.replace_with_summary(turns[:2], summary)
+    assert contents(history) == [SYSTEM["content"], summary["content"], "turn 2", "turn 3"]
+    # The block isn't at the front anymore, nothing changes
+    assert not history.replace_with_summary(turns[:2], summary)
+
+
+def test_reset_puts_a_restored_summary_back_into_its_slot():
+    history = make_history()
+    summary = {"role": "system", "content": ConversationCompactor.SUMMARY_PREFIX + "earlier"}
+    history.reset([SYSTEM, summary, {"role": "user", "content": "hi"}])
+
+    assert history.summary[0] is summary
+    assert len(history.turns) == 1
+
+
+def test_compactor_summarizes_above_the_high_water_mark():
+    history = make_history(max_tokens=20)
+    for i in range(6):
+        history.append({"role": "user", "content": f"w{i} w w"})
+    compacted = []
+    compactor = ConversationCompactor(history, lambda previous, block: f"{len(block)} messages",
+                                      high_water=0.5, block_fraction=0.5, keep_recent=2,
+                                      on_compacted=lambda block, message: compacted.append(len(block)),
+                                      submit=lambda job: job())
+
+    assert compactor.maybe_compact() is True
+    assert compacted and history.summary[0]["content"].endswith(f"{compacted[0]} messages")
+    assert len(history.turns) == 6 - compacted[0]
@@ -0,0 +1,68 @@
+import json
+
+from chat_history import ConversationCompactor
+from conversation_journal import ConversationJournal
+
+SYSTEM = {"role": "system", "content": "You are a pirate"}
+
+
+def message(role, content):
+    return {"role": role, "content": content}
+
+
+def summary(text):
+    return message("system", ConversationCompactor.SUMMARY_PREFIX + text)
+
+
+def test_replay_rebuilds_the_history(tmp_path):
+    journal = ConversationJournal(str(tmp_path), flush_interval=0)
+    journal.append("reset", messages=[SYSTEM])
+    for i in range(4):
+        journal.append("append", message=message("user", f"turn {i}"))
+    journal.append("note", role="SYSTEM", content="not part of the history")
+    journal.append("evict", count=1)
+    journal.append("summary", message=summary("turn 1"), count=1)
+    journal.close()
+
+    assert journal.load_history() == [SYSTEM, summary("turn 1"), message("user", "turn 2"), message("user", "turn 3")]
+
+
+def test_replay_starts_at_the_last_reset(tmp_path):
+    journal = ConversationJournal(str(tmp_path), flush_interval=0)
+    journal.append("append", message=message("user", "before"))
+    journal.append("reset", messages=[SYSTEM, message("user", "after")])
+    journal.close()
+
+    assert journal.load_history() == [SYSTEM, message("user", "after")]
+
+
+def test_summary_of_a_reset_goes_into_the_summary_slot(tmp_path):
+    journal = ConversationJournal(str(tmp_path), flush_interval=0)
+    journal.append("reset", messages=[SYSTEM, summary("old"), message("user", "u1"), message("assistant", "a1")])
+    journal.append("append", message=message("user", "u2"))
+    journal.append("summary", message=summary("new"), count=2)
+    journal.close()
+
+    assert journal.load_history() == [SYSTEM, summary("new"), message("user", "u2")]
+
+
+def test_partly_written_line_is_skipped(tmp_path):
+    journal = ConversationJournal(str(tmp_path), flush_interval=0)
+    journal.append("reset", messages=[SYSTEM])
+    journal.append("append", message=message("user", "hi"))
+    journal.close()
+    with open(journal.segments()[-1], "a", encoding="utf-8") as f:
+        f.write(json.dumps({"type": "append", "message": message("user", "cut")})[:20])
+
+    assert journal.load_history() == [SYSTEM, message("user", "hi")]
+
+
+def test_segments_rotate_and_replay_across_them(tmp_path):
+    journal = ConversationJournal(str(tmp_path), segment_max_bytes=200, flush_interval=0)
+    journal.append("reset", messages=[SYSTEM])
+    for i in range(10):
+        journal.append("append", message=message("user", f"turn number {i}"))
+    journal.close()
+
+    assert len(journal.segments()) > 1
+    assert journal.load_history() == [SYSTEM] + [message("user", f"turn number {i}") for i in range(10)]
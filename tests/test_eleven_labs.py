@@ -0,0 +1,119 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from eleven_labs import ElevenLabsManager
+from tts_backends import ElevenLabsBackend
+from tts_cache import TTSCache
+from voice_catalog import VoiceCatalog
+
+VOICES = {"David - Epic Movie Trailer ": "aaaaaaaaaaaaaaaaaaaa", "Hope - soothing narrator": "bbbbbbbbbbbbbbbbbbbb"}
+CHUNK_SIZE = 1024  # the SDK hands streamed audio out in blocks of this size
+
+
+class TTSStandIn(BaseHTTPRequestHandler):
+    """Serves the ElevenLabs voice list and text-to-speech endpoints, the audio is sent in chunks"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        self.server.requests.append(("GET", self.path.split("?")[0]))
+        body = json.dumps({"voices": [{"voice_id": voice_id, "name": name} for name, voice_id in VOICES.items()]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        server.connections.add(self.client_address)
+        text = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["text"]
+        server.requests.append(("POST", self.path.split("?")[0]))
+        with server.lock:
+            fail = server.failures.get(text, 0)
+            if fail:
+                server.failures[text] = fail - 1
+        if fail:
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, chunk in enumerate(server.audio_for(text)):
+            if i == len(server.audio_for(text)) - 1:
+                server.release_last_chunk.wait(5)
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+@pytest.fixture
+def tts_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TTSStandIn)
+    server.connections = set()
+    server.requests = []
+    server.failures = {}
+    server.lock = threading.Lock()
+    server.release_last_chunk = threading.Event()
+    server.release_last_chunk.set()
+    server.audio_for = lambda text: [(text[:1] or "-").encode() * CHUNK_SIZE, b"\x01" * CHUNK_SIZE, b"\x02" * CHUNK_SIZE]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.release_last_chunk.set()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def backend(tts_server):
+    return ElevenLabsBackend(api_key="test", base_url=f"http://127.0.0.1:{tts_server.server_port}")
+
+
+def test_requests_reuse_one_keep_alive_connection(backend, tts_server):
+    for text in ["One.", "Two.", "Three."]:
+        assert backend.synthesize(text, "Hope - soothing narrator") == b"".join(tts_server.audio_for(text))
+
+    assert len(tts_server.connections) == 1
+    # The voice id is looked up once, not before every request
+    assert tts_server.requests == [("GET", "/v1/voices")] + [("POST", "/v1/text-to-speech/bbbbbbbbbbbbbbbbbbbb")] * 3
+
+
+def test_stream_yields_chunks_as_they_arrive(backend, tts_server):
+    tts_server.release_last_chunk.clear()
+    chunks = backend.stream("Hello there.", "Hope - soothing narrator")
+
+    # The first chunks are there while the server still holds back the last one
+    assert next(chunks) == b"H" * CHUNK_SIZE
+    assert next(chunks) == b"\x01" * CHUNK_SIZE
+    tts_server.release_last_chunk.set()
+    assert list(chunks) == [b"\x02" * CHUNK_SIZE]
+    assert tts_server.requests[-1] == ("POST", "/v1/text-to-speech/bbbbbbbbbbbbbbbbbbbb/stream")
+
+
+def test_parallel_sentences_are_retried_and_joined_in_order(backend, tts_server, tmp_path):
+    catalog = VoiceCatalog({"elevenlabs": backend}, snapshot_path=str(tmp_path / "voices.json"),
+                           voices_file=str(tmp_path / "missing.txt"))
+    catalog.refresh()
+    manager = ElevenLabsManager(default_voice="Hope - soothing narrator", backends={"elevenlabs": backend},
+                                tts_cache=TTSCache(str(tmp_path / "cache")), voice_catalog=catalog)
+    tts_server.failures["Second sentence here."] = 1
+    text = "First sentence here. Second sentence here. <think>not spoken</think>Third sentence here."
+
+    output_path = manager.text_to_audio_parallel(text, output_path=str(tmp_path / "answer.mp3"), retries=1)
+
+    with open(output_path, "rb") as f:
+        assert f.read() == b"".join(b"".join(tts_server.audio_for(sentence))
+                                    for sentence in ["First", "Second", "Third"])
+    posts = [path for method, path in tts_server.requests if method == "POST"]
+    assert len(posts) == 4  # three sentences, one of them retried
+    assert len(tts_server.connections) <= 4  # one per worker thread at most
@@ -0,0 +1,46 @@
+from model_router import ModelRouter
+
+
+def make_router():
+    return ModelRouter(reasoning_model="big", fast_model="small", fast_budget=5.0)
+
+
+def test_chatter_goes_to_the_fast_model_and_questions_to_the_reasoning_model():
+    router = make_router()
+
+    assert router.classify("hey there") == "fast"
+    assert router.classify("how are you doing today my friend") == "fast"
+    assert router.classify("why is the sky blue") == "reasoning"
+    assert router.classify("how does a rocket engine work") == "reasoning"
+    assert router.classify("lol", has_image=True) == "reasoning"
+
+
+def test_short_twitch_messages_are_chatter():
+    router = make_router()
+
+    assert router.classify("that frog looks really funny today", source="twitch") == "fast"
+    assert router.classify("that frog looks really funny today", source="web") == "reasoning"
+
+
+def test_slow_reasoning_route_is_never_diverted():
+    router = make_router()
+    router.latency.record("big", 120.0)
+
+    assert {router.choose({"prompt": "explain black holes"})[1] for _ in range(20)} == {"big"}
+    assert router.stats()["diverted"]["reasoning"] == 0
+
+
+def test_slow_fast_route_is_diverted_but_still_probed():
+    router = make_router()
+    router.latency.record("small", 20.0)
+    models = [router.choose({"prompt": "hi"})[1] for _ in range(20)]
+
+    assert models.count("small") == 20 // ModelRouter.OVER_BUDGET_PROBE_INTERVAL
+    assert router.stats()["diverted"]["fast"] == 20
+
+
+def test_forced_route_and_fallback_model():
+    router = make_router()
+
+    assert router.choose({"prompt": "hi", "route": "reasoning"}) == ("reasoning", "big")
+    assert router.fallback_model("reasoning") == "small"
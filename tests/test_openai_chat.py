@@ -0,0 +1,115 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from openai_chat import LocalAiManager
+
+
+class OllamaStandIn(BaseHTTPRequestHandler):
+    """Answers /api/chat and /api/generate like Ollama does, records every request and connection"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, chunks=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/x-ndjson" if chunks else "application/json")
+        if chunks is None:
+            data = json.dumps(body).encode()
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            data = (json.dumps(chunk) + "\n").encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        server.connections.add(self.client_address)
+        server.requests.append((self.path, request))
+        model = request["model"]
+        if model in server.failing:
+            self._send(500, {"error": f"{model} failed"})
+        elif self.path == "/api/generate":
+            self._send(200, {"model": model, "response": "", "done": True})
+        elif request.get("stream"):
+            tokens = server.tokens[model]
+            self._send(200, None, [
+                {"model": model, "message": {"role": "assistant", "content": token}, "done": False} for token in tokens
+            ] + [{"model": model, "message": {"role": "assistant", "content": ""}, "done": True}])
+        else:
+            answer = "".join(server.tokens[model])
+            self._send(200, {"model": model, "message": {"role": "assistant", "content": answer}, "done": True})
+
+
+@pytest.fixture
+def ollama_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OllamaStandIn)
+    server.connections = set()
+    server.requests = []
+    server.failing = set()
+    server.tokens = {
+        "big": ["<think>Let me ", "think.</thi", "nk>The sky is blue. ", "Light scatters", " in the air."],
+        "small": ["Hello there, friend!"],
+    }
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def manager(ollama_server, tmp_path):
+    manager = LocalAiManager(model="big", fast_model="small", host=f"http://127.0.0.1:{ollama_server.server_port}",
+                             keep_alive="45m", options={"temperature": 0.2}, journal_directory=str(tmp_path))
+    manager.chat_history = [{"role": "system", "content": "You are a frog."}]
+    yield manager
+    manager.journal.close()
+
+
+def test_requests_share_one_connection_and_pin_keep_alive(manager, ollama_server):
+    assert manager.warm_up() is not None
+    assert manager.chat_with_history({"prompt": "Explain why the sky is blue", "source": "web"}) == \
+        "The sky is blue. Light scatters in the air."
+    assert manager.chat_with_history({"prompt": "hi", "source": "twitch"}) == "Hello there, friend!"
+
+    assert len(ollama_server.connections) == 1
+    assert [path for path, _ in ollama_server.requests] == ["/api/generate"] * 2 + ["/api/chat"] * 2
+    assert {request["model"] for path, request in ollama_server.requests if path == "/api/generate"} == {"big", "small"}
+    for _, request in ollama_server.requests:
+        assert request["keep_alive"] == "45m"
+    assert ollama_server.requests[2][1]["options"] == {"temperature": 0.2}
+
+
+def test_failed_model_is_retried_on_the_fallback(manager, ollama_server):
+    ollama_server.failing.add("big")
+    assert manager.chat_with_history({"prompt": "Explain why the sky is blue", "source": "web"}) == "Hello there, friend!"
+    assert [request["model"] for _, request in ollama_server.requests] == ["big", "small"]
+    assert manager.router.latency.failures == {"big": 1}
+    assert manager.chat_history[-1] == {"role": "assistant", "content": "Hello there, friend!"}
+
+
+def test_stream_yields_clean_sentences(manager, ollama_server):
+    sentences = list(manager.chat_with_history_stream({"prompt": "Explain why the sky is blue", "source": "web"}))
+
+    assert sentences == ["The sky is blue.", "Light scatters in the air."]
+    assert ollama_server.requests[0][1]["stream"] is True
+    assert manager.chat_history[-1] == {"role": "assistant", "content": "The sky is blue. Light scatters in the air."}
+
+
+def test_stream_falls_back_before_anything_was_spoken(manager, ollama_server):
+    ollama_server.failing.add("big")
+    sentences = list(manager.chat_with_history_stream({"prompt": "Explain why the sky is blue", "source": "web"}))
+
+    assert sentences == ["Hello there, friend!"]
+    assert [request["model"] for _, request in ollama_server.requests] == ["big", "small"]
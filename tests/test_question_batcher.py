@@ -0,0 +1,55 @@
+import threading
+
+from question_batcher import (QuestionBatcher, is_viewer_question, build_batch_prompt, split_batch_sentences,
+                              batch_replies)
+
+QUESTIONS = [("alice", "what is your name"), ("bob", "where do you live")]
+
+
+def test_viewer_questions_start_or_end_with_an_underscore():
+    assert is_viewer_question("_how are you")
+    assert is_viewer_question("how are you_")
+    assert not is_viewer_question("how are you")
+    assert not is_viewer_question("_")
+
+
+def test_batch_prompt_tags_every_question():
+    prompt = build_batch_prompt(QUESTIONS)
+
+    assert "[Q1] alice: what is your name" in prompt
+    assert "[Q2] bob: where do you live" in prompt
+
+
+def test_batch_answer_is_split_by_tag_and_spoken_with_names():
+    sentences = ["Sure. [A1] I'm Jack.", "Nice to meet you.", "[A2] On a ship. [A7] Unknown tag."]
+    answers = {}
+
+    spoken = list(split_batch_sentences(sentences, QUESTIONS, answers))
+
+    assert spoken == ["alice, I'm Jack.", "Nice to meet you.", "bob, On a ship."]
+    assert batch_replies(answers, QUESTIONS) == [("alice", "I'm Jack. Nice to meet you."), ("bob", "On a ship.")]
+
+
+def test_repeated_tag_is_ignored():
+    answers = {}
+    spoken = list(split_batch_sentences(["[A1] First.", "[A1] Again."], QUESTIONS, answers))
+
+    assert spoken == ["alice, First."]
+    assert answers == {0: ["First."]}
+
+
+def test_batcher_sends_a_full_batch_right_away():
+    batches = []
+    done = threading.Event()
+
+    def answer_batch(batch):
+        batches.append(batch)
+        done.set()
+
+    batcher = QuestionBatcher(answer_batch, window_seconds=60, max_batch_size=2)
+    batcher.add("alice", "_first question")
+    batcher.add("bob", "second question_")
+
+    assert done.wait(5)
+    assert batches == [[("alice", "first question"), ("bob", "second question")]]
+    assert batcher.stats()["batches_sent"] == 1
@@ -0,0 +1,44 @@
+import time
+
+from response_cache import ResponseCache, normalize_prompt
+
+
+def test_normalize_prompt_drops_case_punctuation_and_the_twitch_prefix():
+    assert normalize_prompt("_What's   UP?") == "what s up"
+
+
+def test_answers_are_keyed_on_prompt_and_system_message():
+    cache = ResponseCache()
+    cache.put("Who are you?", "pirate", "A pirate.", ["A pirate."])
+
+    assert cache.get("who are you", "pirate")["answer"] == "A pirate."
+    assert cache.get("who are you", "robot") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_answer_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.put("one", None, "1")
+    cache.put("two", None, "2")
+    cache.get("one")
+    cache.put("three", None, "3")
+
+    assert cache.get("two") is None
+    assert cache.get("one")["answer"] == "1"
+
+
+def test_expired_answers_are_misses():
+    cache = ResponseCache(ttl=60)
+    entry = cache.put("old question", None, "old answer")
+    entry["created"] = time.time() - 61
+
+    assert cache.get("old question") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_similar_prompts_hit_with_a_similarity_threshold():
+    cache = ResponseCache(similarity=0.85)
+    cache.put("what is the frog's name?", None, "Fred")
+
+    assert cache.get("whats the frogs name")["answer"] == "Fred"
+    assert cache.get("what is the weather") is None
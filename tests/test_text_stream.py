@@ -0,0 +1,45 @@
+from text_stream import SentenceSplitter, ThinkBlockFilter, strip_thinking
+
+
+def feed_all(think_filter, chunks):
+    return "".join(think_filter.feed(chunk) for chunk in chunks) + think_filter.flush()
+
+
+def test_think_tags_split_across_chunks_are_dropped():
+    chunks = ["Hello <th", "ink>secret pl", "an</thi", "nk> world"]
+
+    assert feed_all(ThinkBlockFilter(), chunks) == "Hello  world"
+
+
+def test_half_tag_that_is_no_tag_is_passed_on():
+    assert feed_all(ThinkBlockFilter(), ["a <th", "is is text"]) == "a <this is text"
+
+
+def test_unclosed_think_block_is_dropped_unless_kept():
+    chunks = ["Answer <think>still ", "thinking"]
+
+    assert feed_all(ThinkBlockFilter(), chunks) == "Answer "
+    assert feed_all(ThinkBlockFilter(keep_unclosed=True), chunks) == "Answer still thinking"
+
+
+def test_asterisks_are_dropped_for_tts():
+    assert feed_all(ThinkBlockFilter(drop_asterisks=True), ["*waves* hi"]) == "waves hi"
+
+
+def test_strip_thinking_keeps_text_after_an_unclosed_tag():
+    assert strip_thinking("<think>plan</think>Done.") == "Done."
+    assert strip_thinking("Done. <think>more") == "Done. more"
+
+
+def test_sentence_splitter_returns_sentences_as_they_complete():
+    splitter = SentenceSplitter(min_length=5)
+
+    assert splitter.feed("The first sentence. The sec") == ["The first sentence."]
+    assert splitter.feed("ond one! And") == ["The second one!"]
+    assert splitter.flush() == ["And"]
+
+
+def test_sentence_splitter_glues_short_sentences_to_the_next():
+    splitter = SentenceSplitter(min_length=12)
+
+    assert splitter.feed("Hi. How are you today? ") == ["Hi. How are you today?"]
@@ -0,0 +1,63 @@
+import numpy as np
+
+from transcript_windows import SAMPLE_RATE, split_windows, merge_overlap
+
+
+def test_split_windows_overlap_and_cover_the_audio():
+    audio = np.arange(70 * SAMPLE_RATE, dtype=np.float32)
+    windows = split_windows(audio, window_seconds=30, overlap_seconds=5)
+
+    assert [start // SAMPLE_RATE for start, _ in windows] == [0, 25, 50]
+    assert [len(samples) // SAMPLE_RATE for _, samples in windows] == [30, 30, 20]
+    # Every window starts 5 s before the previous one ends, the last one ends with the audio
+    for (start, samples), (next_start, _) in zip(windows, windows[1:]):
+        assert start + len(samples) - next_start == 5 * SAMPLE_RATE
+    assert windows[-1][1][-1] == audio[-1]
+
+
+def test_split_windows_short_audio_is_one_window():
+    audio = np.zeros(10 * SAMPLE_RATE, dtype=np.float32)
+    windows = split_windows(audio)
+
+    assert len(windows) == 1
+    assert windows[0][0] == 0 and len(windows[0][1]) == len(audio)
+
+
+def test_merge_overlap_keeps_matched_words_once():
+    previous = "so the plan for today is to build a".split()
+    following = "today is to build a robot that talks".split()
+    keep, skip = merge_overlap(previous, following, 0.5, 0.5)
+
+    assert " ".join(previous[:keep] + following[skip:]) == "so the plan for today is to build a robot that talks"
+
+
+def test_merge_overlap_drops_the_cut_off_word_at_the_window_edge():
+    previous = "we went to the market and bou".split()
+    following = "the market and bought apples".split()
+    keep, skip = merge_overlap(previous, following, 0.5, 0.5)
+
+    assert " ".join(previous[:keep] + following[skip:]) == "we went to the market and bought apples"
+
+
+def test_merge_overlap_ignores_case_and_punctuation():
+    previous = "I said Hello, World".split()
+    following = "hello world. How are you".split()
+    keep, skip = merge_overlap(previous, following, 0.5, 0.5)
+
+    assert previous[:keep] + following[skip:] == ["I", "said", "Hello,", "World", "How", "are", "you"]
+
+
+def test_merge_overlap_without_a_match_cuts_at_the_middle_of_the_overlap():
+    previous = "one two three four five six seven eight".split()
+    following = "alpha beta gamma delta".split()
+    # A quarter of the previous window and half of the next one are overlap
+    keep, skip = merge_overlap(previous, following, 0.25, 0.5)
+
+    assert (keep, skip) == (7, 1)
+
+
+def test_merge_overlap_single_word_match_is_not_enough():
+    previous = "a b c the".split()
+    following = "the x y z".split()
+
+    assert merge_overlap(previous, following) == (4, 0)
@@ -0,0 +1,71 @@
+import os
+
+from tts_cache import TTSCache
+
+
+def make_cache(tmp_path, **kwargs):
+    kwargs.setdefault("index_save_delay", 0.01)
+    return TTSCache(str(tmp_path / "cache"), **kwargs)
+
+
+def test_make_key_depends_on_everything_that_changes_the_audio():
+    key = TTSCache.make_key("hi", "Hope", "model", "mp3")
+
+    assert key == TTSCache.make_key("hi", "Hope", "model", "mp3")
+    assert key != TTSCache.make_key("hi", "David", "model", "mp3")
+    assert key != TTSCache.make_key("hi", "Hope", "model", "wav")
+
+
+def test_put_then_get_and_read(tmp_path):
+    cache = make_cache(tmp_path)
+    path = cache.put("a", b"audio")
+
+    assert cache.get_path("a") == path
+    assert cache.read(path) == b"audio"
+    assert cache.get_path("missing") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    assert not [name for name in os.listdir(cache.directory) if name.endswith(".tmp")]
+
+
+def test_least_recently_used_clips_are_evicted_over_budget(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=10)
+    path_a = cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    cache.get_path("a")
+    cache.put("c", b"1234")
+
+    assert cache.get_path("b") is None
+    assert cache.get_path("a") == path_a
+    assert not os.path.exists(os.path.join(cache.directory, "b.mp3"))
+    assert cache.stats()["bytes"] == 8
+
+
+def test_pinned_clips_survive_eviction_until_released(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=10)
+    path = cache.put("a", b"1234", pin=True)
+    cache.put("b", b"1234")
+    cache.put("c", b"1234")
+
+    assert os.path.exists(path)
+    assert cache.get_path("b") is None
+    cache.release(path)
+    cache.put("d", b"1234")
+    assert not os.path.exists(path)
+
+
+def test_index_survives_a_restart(tmp_path):
+    cache = make_cache(tmp_path)
+    path = cache.put("a", b"audio")
+    cache.save_index()
+
+    restarted = make_cache(tmp_path)
+    assert restarted.get_path("a") == path
+    assert restarted.stats()["bytes"] == 5
+
+
+def test_small_clips_are_served_from_memory(tmp_path):
+    cache = make_cache(tmp_path, memory_max_clip_bytes=8)
+    path = cache.put("a", b"small")
+    os.remove(path)
+
+    assert cache.read(path) == b"small"
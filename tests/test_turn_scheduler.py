@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from turn_scheduler import TurnScheduler, SchedulerBusyError, RateLimitedError, TurnTimeoutError
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = TurnScheduler(max_queue_depth=8, rate_limits={})
+    yield scheduler
+    scheduler.stop()
+
+
+def block_worker(scheduler):
+    """Occupies the worker until the returned event is set"""
+    release = threading.Event()
+    started = threading.Event()
+
+    def turn():
+        started.set()
+        release.wait(5)
+
+    scheduler.submit("mic", turn)
+    started.wait(5)
+    return release
+
+
+def test_turns_are_served_by_priority_then_arrival(scheduler):
+    release = block_worker(scheduler)
+    order = []
+    futures = [scheduler.submit(source, order.append, name) for source, name in
+               [("background", "summary"), ("twitch", "chat 1"), ("web", "web"), ("twitch", "chat 2"), ("mic", "mic")]]
+    release.set()
+    for future in futures:
+        future.result(5)
+
+    assert order == ["mic", "web", "chat 1", "chat 2", "summary"]
+
+
+def test_run_returns_the_result_and_raises_the_turns_errors(scheduler):
+    assert scheduler.run("web", lambda a, b: a + b, 2, b=3) == 5
+    with pytest.raises(ValueError):
+        scheduler.run("web", int, "not a number")
+    assert scheduler.stats()["completed"] == 1 and scheduler.stats()["failed"] == 1
+
+
+def test_full_queue_raises_busy():
+    scheduler = TurnScheduler(max_queue_depth=2, rate_limits={})
+    release = block_worker(scheduler)
+    scheduler.submit("web", lambda: None)
+    scheduler.submit("web", lambda: None)
+    with pytest.raises(SchedulerBusyError):
+        scheduler.submit("web", lambda: None)
+    release.set()
+    scheduler.stop()
+
+
+def test_rate_limit_per_source():
+    scheduler = TurnScheduler(rate_limits={"twitch": (2, 60)})
+    scheduler.run("twitch", lambda: None)
+    scheduler.run("twitch", lambda: None)
+    with pytest.raises(RateLimitedError):
+        scheduler.submit("twitch", lambda: None)
+    # Other sources aren't limited
+    scheduler.run("mic", lambda: None)
+    scheduler.stop()
+
+
+def test_timed_out_turn_is_cancelled_while_queued(scheduler):
+    release = block_worker(scheduler)
+    ran = []
+    with pytest.raises(TurnTimeoutError):
+        scheduler.run("web", ran.append, "late", timeout=0.1)
+    release.set()
+    scheduler.run("web", lambda: None)
+
+    assert ran == []
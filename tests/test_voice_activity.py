@@ -0,0 +1,77 @@
+import numpy as np
+
+from voice_activity import EnergyVAD, UtteranceSegmenter, frame_features
+
+RATE = 16000
+FRAME = 480  # 30 ms
+
+
+def tone(seconds, amplitude=0.1, frequency=200):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * RATE), dtype=np.float32)
+
+
+def frames(samples):
+    return samples[:len(samples) // FRAME * FRAME].reshape(-1, FRAME)
+
+
+def test_frame_features():
+    energy, zcr = frame_features(frames(tone(0.09, amplitude=0.5)))
+
+    assert np.allclose(energy, 0.5 / np.sqrt(2), atol=0.01)
+    assert np.all(zcr < 0.05)
+
+
+def test_energy_vad_tells_tone_from_silence_and_hiss():
+    vad = EnergyVAD()
+    hiss = (np.random.default_rng(0).standard_normal(RATE) * 0.005).astype(np.float32)
+
+    assert vad.detect(frames(tone(0.3)), RATE).all()
+    assert not vad.detect(frames(silence(0.3)), RATE).any()
+    assert not vad.detect(frames(hiss), RATE).any()
+
+
+def test_steady_noise_stops_counting_as_speech():
+    vad = EnergyVAD()
+    noise = frames(tone(1.0, amplitude=0.05, frequency=300))
+    detected = [int(vad.detect(noise, RATE).sum()) for _ in range(15)]
+
+    assert detected[0] == len(noise)
+    assert detected[-1] == 0
+
+
+def test_speech_with_pauses_keeps_counting_as_speech():
+    vad = EnergyVAD()
+    # 210 ms of talking, 90 ms pause, for 15 seconds
+    speech = np.concatenate([np.concatenate([tone(0.21), silence(0.09)]) for _ in range(50)])
+    blocks = frames(speech).reshape(-1, 10, FRAME)  # 300 ms reads
+    detected = np.concatenate([vad.detect(block, RATE) for block in blocks])
+
+    # The last 3 seconds are still 70% speech
+    assert detected[-100:].sum() >= 65
+
+
+def test_segmenter_cuts_utterances_at_pauses():
+    segmenter = UtteranceSegmenter(EnergyVAD(), rate=RATE, end_silence_ms=300, pre_roll_ms=90)
+    audio = np.concatenate([silence(1.0), tone(0.6), silence(0.5), tone(0.9), silence(0.5)])
+
+    utterances = []
+    for start in range(0, len(audio), 1600):  # 100 ms reads like the mic loop
+        utterances.extend(segmenter.feed(audio[start:start + 1600]))
+
+    assert len(utterances) == 2
+    assert 0.6 <= len(utterances[0]) / RATE <= 1.0
+    assert 0.9 <= len(utterances[1]) / RATE <= 1.3
+    assert segmenter.heard_speech
+    assert segmenter.stats()["skipped_silence_seconds"] > 0.5
+
+
+def test_too_short_blips_are_no_utterance():
+    segmenter = UtteranceSegmenter(EnergyVAD(), rate=RATE, min_speech_ms=250, end_silence_ms=300)
+
+    assert segmenter.feed(np.concatenate([tone(0.09), silence(0.6)])) == []
+    assert segmenter.flush() is None
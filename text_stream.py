@@ -0,0 +1,115 @@
+import re
+
+# A sentence ends at . ! ? or … (optionally followed by closing quotes/brackets) and whitespace
+SENTENCE_END = re.compile(r'([.!?…]+["\')\]]*)\s+')
+
+
+class SentenceSplitter:
+    """
+    Cuts a stream of text chunks into complete sentences.
+    Feed it chunks as they arrive; every finished sentence is returned right away,
+    whatever is left over stays buffered until more text (or flush) arrives.
+    """
+
+    def __init__(self, min_length=12):
+        # Very short "sentences" (e.g. "Hi.") are glued to the next one so TTS doesn't get tiny requests
+        self.min_length = min_length
+        self.buffer = ""
+
+    def feed(self, chunk):
+        """Add a chunk of text, returns a list of sentences that are now complete"""
+        self.buffer += chunk
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            candidate = self.buffer[start:match.end(1)].strip()
+            if len(candidate) < self.min_length:
+                continue
+            sentences.append(candidate)
+            start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        """Return whatever is still buffered as the last sentence"""
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return [rest] if rest else []
+
+
+def _partial_tag_length(text, tag):
+    """Length of the longest end of text that could be the beginning of tag (a tag split across chunks)"""
+    for length in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:length]):
+            return length
+    return 0
+
+
+class ThinkBlockFilter:
+    """
+    Drops <think>...</think> sections (and optionally * markdown) from a stream of chunks.
+    Clean text is passed on as soon as it arrives. The reasoning trace itself is never buffered,
+    only a possible half tag at the end of a chunk is held back, so memory use stays constant.
+    With keep_unclosed the trace is buffered after all, so a <think> that's never closed can be given back by flush.
+    """
+
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self, drop_asterisks=False, keep_unclosed=False):
+        self.drop_asterisks = drop_asterisks
+        self.keep_unclosed = keep_unclosed
+        self.pending = ""  # Start of a tag that was cut off at the end of the last chunk
+        self.in_think = False
+        self.thinking = []  # Text of the open think block, only with keep_unclosed
+
+    def _clean(self, text):
+        return text.replace("*", "") if self.drop_asterisks else text
+
+    def feed(self, chunk):
+        """Add a chunk, returns the clean text that can be passed on"""
+        text = self.pending + chunk
+        self.pending = ""
+        output = []
+        while text:
+            tag = self.CLOSE_TAG if self.in_think else self.OPEN_TAG
+            position = text.find(tag)
+            if position == -1:
+                partial = _partial_tag_length(text, tag)
+                if not self.in_think:
+                    output.append(text[:len(text) - partial])
+                elif self.keep_unclosed:
+                    self.thinking.append(text[:len(text) - partial])
+                self.pending = text[len(text) - partial:] if partial else ""
+                break
+            if not self.in_think:
+                output.append(text[:position])
+            self.thinking = []
+            text = text[position + len(tag):]
+            self.in_think = not self.in_think
+        return self._clean("".join(output))
+
+    def flush(self):
+        """
+        Return what's left once the stream ended. An unclosed think block is dropped,
+        with keep_unclosed its text is returned (without the <think> tag)
+        """
+        if not self.in_think:
+            rest = self.pending
+        elif self.keep_unclosed:
+            rest = "".join(self.thinking) + self.pending
+        else:
+            rest = ""
+        self.pending = ""
+        self.in_think = False
+        self.thinking = []
+        return self._clean(rest)
+
+
+def strip_thinking(text, drop_asterisks=False):
+    """
+    Remove <think>...</think> sections (and optionally asterisks) from a complete text.
+    Text after a <think> that's never closed is kept, like the regex this replaced did
+    """
+    think_filter = ThinkBlockFilter(drop_asterisks, keep_unclosed=True)
+    return (think_filter.feed(text) + think_filter.flush()).strip()
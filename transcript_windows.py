@@ -0,0 +1,39 @@
+import re
+import difflib
+
+SAMPLE_RATE = 16000  # Whisper's input rate
+
+
+def split_windows(audio_data, window_seconds=30, overlap_seconds=5, sample_rate=SAMPLE_RATE):
+    """Cut audio into windows of at most window_seconds that overlap by overlap_seconds, returns (start sample, samples) pairs"""
+    window = int(window_seconds * sample_rate)
+    step = window - int(overlap_seconds * sample_rate)
+    windows = []
+    start = 0
+    while True:
+        windows.append((start, audio_data[start:start + window]))
+        if start + window >= len(audio_data):
+            return windows
+        start += step
+
+
+def _word_key(word):
+    return re.sub(r"[^\w]", "", word.lower())
+
+
+def merge_overlap(previous_words, next_words, previous_overlap=0.0, next_overlap=0.0, max_overlap_words=40,
+                  min_match_words=2):
+    """
+    Where two transcripts of overlapping windows join: the words both windows heard are matched up.
+    Returns (how many of previous_words to keep, where next_words continues).
+    The words after the match at the end of the previous window are dropped, they were cut off at its edge.
+    Without a match of min_match_words both sides are cut at the middle of the overlap instead, assuming evenly
+    spread words: previous_overlap / next_overlap are the parts (0..1) of each window that lie in the overlap
+    """
+    tail = [_word_key(word) for word in previous_words[-max_overlap_words:]]
+    head = [_word_key(word) for word in next_words[:max_overlap_words]]
+    match = difflib.SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(0, len(tail), 0, len(head))
+    if match.size < min_match_words:
+        return (len(previous_words) - round(len(previous_words) * previous_overlap / 2),
+                round(len(next_words) * next_overlap / 2))
+    return len(previous_words) - len(tail) + match.a + match.size, match.b + match.size
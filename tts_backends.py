@@ -0,0 +1,152 @@
+import os
+import uuid
+import tempfile
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY", "")
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL")  # e.g. a local stand-in server for testing
+
+STANDARD_VOICES = {
+    "Aria", "Roger", "Sarah", "Laura", "Charlie", "George", "Callum",
+    "River", "Liam", "Charlotte", "Alice", "Matilda", "Will", "Jessica",
+    "Eric", "Chris", "Brian", "Daniel", "Lily", "Bill"
+}
+
+
+class TTSBackend(ABC):
+    """
+    Interface of a text-to-speech engine.
+    name and model end up in the TTS cache key, audio_format is the file extension of the rendered audio.
+    """
+
+    name = "base"
+    model = ""
+    audio_format = ".mp3"
+
+    def is_available(self):
+        """False if the engine can't be used (missing API key, missing package)"""
+        return True
+
+    @abstractmethod
+    def synthesize(self, text, voice):
+        """Render text with voice, returns the audio bytes"""
+
+    def stream(self, text, voice):
+        """Render text with voice, yields audio chunks as they are produced"""
+        yield self.synthesize(text, voice)
+
+    @abstractmethod
+    def list_voices(self):
+        """Names of the voices this engine offers"""
+
+
+class ElevenLabsBackend(TTSBackend):
+    """ElevenLabs cloud TTS, the client is only created once it's needed"""
+
+    name = "elevenlabs"
+    audio_format = ".mp3"
+
+    def __init__(self, api_key=ELEVENLABS_API_KEY, model="eleven_turbo_v2", base_url=ELEVENLABS_BASE_URL):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        self._client = None
+        # Voice name -> id. Given a name, the SDK would fetch the whole voice list again before every request
+        self.voice_ids = {}
+
+    def is_available(self):
+        return bool(self.api_key)
+
+    @property
+    def client(self):
+        if self._client is None:
+            from elevenlabs.client import ElevenLabs
+            if self.base_url:
+                self._client = ElevenLabs(api_key=self.api_key, base_url=self.base_url)
+            else:
+                self._client = ElevenLabs(api_key=self.api_key)
+        return self._client
+
+    def _voice_id(self, voice):
+        if voice not in self.voice_ids:
+            self.list_voices()
+        return self.voice_ids.get(voice, voice)
+
+    def synthesize(self, text, voice):
+        return b"".join(self.client.generate(text=text, voice=self._voice_id(voice), model=self.model))
+
+    def stream(self, text, voice):
+        yield from self.client.generate(text=text, voice=self._voice_id(voice), model=self.model, stream=True)
+
+    def list_voices(self):
+        """All custom voices (the ElevenLabs standard voices are left out)"""
+        voices = self.client.voices.get_all().voices
+        self.voice_ids = {v.name: v.voice_id for v in voices}
+        return [v.name for v in voices if v.name not in STANDARD_VOICES]
+
+
+class LocalTTSBackend(TTSBackend):
+    """
+    Offline TTS on the CPU using pyttsx3 (espeak on Linux, SAPI5 on Windows, NSSpeech on macOS).
+    Rendering is deterministic, so it's also useful for benchmarking the rest of the pipeline.
+    The engine is created and used on one dedicated thread (SAPI5/COM objects must stay on the thread
+    that created them), the TTS pool threads hand their requests over to it.
+    """
+
+    name = "local"
+    model = "pyttsx3"
+    audio_format = ".wav"
+
+    def __init__(self, rate=175):
+        self.rate = rate
+        self._engine = None
+        # A single worker thread that owns the engine, it also runs the requests one at a time
+        self.engine_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyttsx3")
+
+    def is_available(self):
+        try:
+            import pyttsx3  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    @property
+    def engine(self):
+        """Only use this on the engine thread"""
+        if self._engine is None:
+            import pyttsx3
+            self._engine = pyttsx3.init()
+            self._engine.setProperty("rate", self.rate)
+        return self._engine
+
+    def _on_engine_thread(self, function, *args):
+        return self.engine_thread.submit(function, *args).result()
+
+    def _voice_id(self, voice):
+        for available in self.engine.getProperty("voices"):
+            if available.name == voice or available.id == voice:
+                return available.id
+        return None
+
+    def _synthesize(self, text, voice, file_path):
+        voice_id = self._voice_id(voice)
+        if voice_id:
+            self.engine.setProperty("voice", voice_id)
+        self.engine.save_to_file(text, file_path)
+        self.engine.runAndWait()
+
+    def synthesize(self, text, voice):
+        file_path = os.path.join(tempfile.gettempdir(), f"local_tts_{uuid.uuid4()}.wav")
+        self._on_engine_thread(self._synthesize, text, voice, file_path)
+        try:
+            with open(file_path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(file_path)
+
+    def _list_voices(self):
+        return [v.name for v in self.engine.getProperty("voices")]
+
+    def list_voices(self):
+        return self._on_engine_thread(self._list_voices)
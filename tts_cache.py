@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+from rich import print
+
+
+class TTSCache:
+    """
+    Content-addressed cache of rendered TTS audio.
+    Clips are keyed on a stable digest of (text, voice, model, format) and stored on disk,
+    with an index that survives restarts. The least recently used clips are evicted once the
+    cache is over its byte budget. Small hot clips are also kept in memory.
+    Clips that were handed out with pin=True are never evicted until they are released.
+    Index changes are written at most every index_save_delay seconds (and at exit).
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, directory="tts_cache", max_bytes=200 * 1024 * 1024, memory_max_bytes=8 * 1024 * 1024,
+                 memory_max_clip_bytes=512 * 1024, index_save_delay=2.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_max_bytes = memory_max_bytes
+        self.memory_max_clip_bytes = memory_max_clip_bytes
+        self.index_save_delay = index_save_delay
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.save_timer = None
+        self.index_dirty = False
+        self.pins = {}  # key -> number of holders
+        self.index = OrderedDict()  # key -> {"file", "size", "last_used"}, least recently used first
+        self.total_bytes = 0
+        self.memory = OrderedDict()  # key -> bytes
+        self.memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+        atexit.register(self.save_index)
+
+    @staticmethod
+    def make_key(text, voice, model, audio_format):
+        """Stable digest of everything that changes the rendered audio"""
+        data = json.dumps([text, voice, model, audio_format], ensure_ascii=False)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def _load_index(self):
+        index_path = os.path.join(self.directory, self.INDEX_FILE)
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            entries = {}
+        # Drop entries whose file is gone, oldest first so the LRU order survives the restart
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]["last_used"]):
+            if os.path.exists(os.path.join(self.directory, entry["file"])):
+                self.index[key] = entry
+                self.total_bytes += entry["size"]
+
+    def _index_changed(self):
+        """Schedule an index write, changes that come in meanwhile are written together (call with the lock held)"""
+        self.index_dirty = True
+        if self.save_timer is None:
+            self.save_timer = threading.Timer(self.index_save_delay, self.save_index)
+            self.save_timer.daemon = True
+            self.save_timer.start()
+
+    def save_index(self):
+        """Write the index now if it changed"""
+        with self.save_lock:
+            with self.lock:
+                self.save_timer = None
+                if not self.index_dirty:
+                    return
+                self.index_dirty = False
+                data = json.dumps(self.index)
+            index_path = os.path.join(self.directory, self.INDEX_FILE)
+            temp_path = index_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(temp_path, index_path)
+
+    def _key_of(self, path):
+        """Cache key of a clip path, None if the path isn't in the cache"""
+        if os.path.dirname(os.path.abspath(path)) != os.path.abspath(self.directory):
+            return None
+        key = os.path.splitext(os.path.basename(path))[0]
+        return key if key in self.index else None
+
+    def _pin(self, key):
+        self.pins[key] = self.pins.get(key, 0) + 1
+
+    def release(self, path):
+        """Give back a clip that was handed out with pin=True, it can be evicted again once nobody holds it"""
+        with self.lock:
+            key = os.path.splitext(os.path.basename(path))[0]
+            if key not in self.pins:
+                return
+            self.pins[key] -= 1
+            if self.pins[key] <= 0:
+                del self.pins[key]
+            self._evict()
+
+    def _remember(self, key, data):
+        """Keep a small clip in the memory tier"""
+        if len(data) > self.memory_max_clip_bytes:
+            return
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return
+        self.memory[key] = data
+        self.memory_bytes += len(data)
+        while self.memory_bytes > self.memory_max_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def get_path(self, key, pin=False):
+        """Path of the cached clip, or None. With pin the clip is kept until release(path)"""
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry["last_used"] = time.time()
+            self.index.move_to_end(key)
+            self.hits += 1
+            if pin:
+                self._pin(key)
+            self._index_changed()
+            return os.path.join(self.directory, entry["file"])
+
+    def read(self, path):
+        """Bytes of a clip path from get_path/put, hot clips come from the memory tier instead of the disk"""
+        with self.lock:
+            key = self._key_of(path)
+            data = self.memory.get(key) if key else None
+            if data is not None:
+                self.memory.move_to_end(key)
+                return data
+        with open(path, "rb") as f:
+            data = f.read()
+        if key:
+            with self.lock:
+                if key in self.index:
+                    self._remember(key, data)
+        return data
+
+    def put(self, key, data, extension=".mp3", pin=False):
+        """Store a clip, returns its path. With pin the clip is kept until release(path)"""
+        file_name = key + extension
+        path = os.path.join(self.directory, file_name)
+        # Written next to the clip and moved into place, so nobody reads a half written file
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        with self.lock:
+            # Under the lock, so an eviction of the previous version can't delete the new file
+            os.replace(temp_path, path)
+            if key in self.index:
+                self.total_bytes -= self.index[key]["size"]
+            self.index[key] = {"file": file_name, "size": len(data), "last_used": time.time()}
+            self.index.move_to_end(key)
+            self.total_bytes += len(data)
+            self._remember(key, data)
+            if pin:
+                self._pin(key)
+            self._evict()
+            self._index_changed()
+        return path
+
+    def _evict(self):
+        """Remove least recently used clips until the cache fits its byte budget (newest and pinned clips are kept)"""
+        if self.total_bytes <= self.max_bytes:
+            return
+        for key in list(self.index)[:-1]:
+            if self.total_bytes <= self.max_bytes:
+                break
+            if key in self.pins:
+                continue
+            entry = self.index.pop(key)
+            self._index_changed()
+            self.total_bytes -= entry["size"]
+            if key in self.memory:
+                self.memory_bytes -= len(self.memory.pop(key))
+            try:
+                os.remove(os.path.join(self.directory, entry["file"]))
+            except OSError as e:
+                print(f"Error deleting cached clip: {e}")
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "clips": len(self.index),
+                "bytes": self.total_bytes,
+                "memory_clips": len(self.memory),
+                "memory_bytes": self.memory_bytes,
+                "pinned": len(self.pins),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
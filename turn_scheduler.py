@@ -0,0 +1,130 @@
+import time
+import queue
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from rich import print
+
+# Lower number = served first
+SOURCE_PRIORITIES = {
+    "mic": 0,         # Streamer talking into the microphone (F4)
+    "keyboard": 0,    # Streamer typing in the console (F9)
+    "web": 1,         # Web UI (/process_input, /process_audio, system message changes)
+    "twitch": 2,      # Twitch chat questions
+    "background": 3,  # Conversation summaries, they run between turns
+}
+
+# source -> (max turns, per seconds)
+DEFAULT_RATE_LIMITS = {
+    "web": (30, 60),
+    "twitch": (6, 60),
+}
+
+
+class SchedulerBusyError(Exception):
+    """Raised when the turn queue is full"""
+
+
+class RateLimitedError(Exception):
+    """Raised when a source submits more turns than its rate limit allows"""
+
+
+class TurnTimeoutError(Exception):
+    """Raised by run when the turn didn't finish in time"""
+
+
+class TurnScheduler:
+    """
+    Runs conversation turns one at a time on a single worker thread.
+    The worker is the only thing that touches the conversation state, so turns from Flask,
+    the F4/F9 loops and Twitch can't interleave, and the model never runs two generations at once.
+    Turns are served by source priority (mic > web UI > Twitch chat > background summaries), then in arrival order.
+    """
+
+    def __init__(self, max_queue_depth=16, rate_limits=None):
+        self.queue = queue.PriorityQueue(maxsize=max_queue_depth)
+        self.rate_limits = DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits
+        self.recent_turns = {}  # source -> deque of submit times
+        self.counter = itertools.count()  # keeps equal priorities in arrival order
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.current_source = None
+        self.running = True
+        self.worker = threading.Thread(target=self._worker, daemon=True)
+        self.worker.start()
+
+    def _check_rate_limit(self, source, now):
+        if source not in self.rate_limits:
+            return
+        max_turns, per_seconds = self.rate_limits[source]
+        with self.lock:
+            recent = self.recent_turns.setdefault(source, deque())
+            while recent and now - recent[0] > per_seconds:
+                recent.popleft()
+            if len(recent) >= max_turns:
+                raise RateLimitedError(f"Too many turns from {source}, limit is {max_turns} per {per_seconds}s")
+            recent.append(now)
+
+    def submit(self, source, function, *args, **kwargs):
+        """
+        Queue function(*args, **kwargs) as a turn from source ("mic", "keyboard", "web" or "twitch").
+        Returns a Future with the function's result.
+        Raises SchedulerBusyError if the queue is full or RateLimitedError if the source is over its limit.
+        """
+        priority = SOURCE_PRIORITIES.get(source, max(SOURCE_PRIORITIES.values()) + 1)
+        self._check_rate_limit(source, time.time())
+        future = Future()
+        try:
+            self.queue.put_nowait((priority, next(self.counter), source, future, function, args, kwargs))
+        except queue.Full:
+            raise SchedulerBusyError(f"Turn queue is full ({self.queue.maxsize} waiting), try again later")
+        return future
+
+    def run(self, source, function, *args, timeout=None, **kwargs):
+        """
+        Submit a turn and wait for its result, the turn's own exceptions are raised here.
+        Raises TurnTimeoutError after timeout seconds, a turn that's still queued by then is cancelled
+        """
+        future = self.submit(source, function, *args, **kwargs)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TurnTimeoutError(f"{source} turn didn't finish within {timeout}s")
+
+    def _worker(self):
+        while self.running:
+            _, _, source, future, function, args, kwargs = self.queue.get()
+            if function is None or not future.set_running_or_notify_cancel():
+                continue
+            self.current_source = source
+            try:
+                future.set_result(function(*args, **kwargs))
+                self.completed += 1
+            except Exception as e:
+                print(f"Error in {source} turn: {e}")
+                future.set_exception(e)
+                self.failed += 1
+            finally:
+                self.current_source = None
+
+    def stop(self):
+        """Stop the worker after the current turn"""
+        self.running = False
+        # Wake the worker up, sorts after every real turn. A full queue doesn't need it (and would block here),
+        # the worker isn't waiting then and sees running after the current turn
+        try:
+            self.queue.put_nowait((float("inf"), next(self.counter), None, Future(), None, (), {}))
+        except queue.Full:
+            pass
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "max_queue_depth": self.queue.maxsize,
+            "current_source": self.current_source,
+            "completed": self.completed,
+            "failed": self.failed
+        }
@@ -0,0 +1,154 @@
+import numpy as np
+from collections import deque
+
+
+def frame_features(frames):
+    """RMS energy and zero-crossing rate of every frame (rows of a 2D float32 array), computed in one go"""
+    energy = np.sqrt(np.mean(frames * frames, axis=1))
+    signs = np.signbit(frames)
+    zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+    return energy, zcr
+
+
+class EnergyVAD:
+    """
+    Speech detection from frame energy and zero-crossing rate against an adaptive noise floor.
+    Quiet frames with many zero crossings are hiss/fan noise, loud ones are fricatives and count as speech.
+    During speech the floor creeps towards the quietest speech frames (speech_adaptation per frame),
+    so a noise that starts loud and never stops stops counting as speech after a few seconds,
+    while real speech pauses often enough to pull the floor back down.
+    """
+
+    def __init__(self, threshold_ratio=3.0, min_energy=0.01, max_zcr=0.3, noise_adaptation=0.05,
+                 speech_adaptation=0.002):
+        self.threshold_ratio = threshold_ratio
+        self.min_energy = min_energy
+        self.max_zcr = max_zcr
+        self.noise_adaptation = noise_adaptation
+        self.speech_adaptation = speech_adaptation
+        self.noise_floor = min_energy / threshold_ratio
+
+    def detect(self, frames, rate):
+        """Boolean speech flag per frame"""
+        energy, zcr = frame_features(frames)
+        threshold = max(self.min_energy, self.noise_floor * self.threshold_ratio)
+        speech = (energy > threshold) & ((zcr < self.max_zcr) | (energy > 2 * threshold))
+        if not speech.all():
+            # Follow the background noise level on the frames without speech
+            self.noise_floor += self.noise_adaptation * (float(np.mean(energy[~speech])) - self.noise_floor)
+        if speech.any():
+            rate = 1.0 - (1.0 - self.speech_adaptation) ** int(speech.sum())
+            self.noise_floor += rate * (float(np.min(energy[speech])) - self.noise_floor)
+        return speech
+
+
+class WebRTCVAD:
+    """The WebRTC voice activity model (pip install webrtcvad), frames must be 10, 20 or 30 ms"""
+
+    def __init__(self, aggressiveness=2):
+        import webrtcvad
+        self.vad = webrtcvad.Vad(aggressiveness)
+
+    def detect(self, frames, rate):
+        pcm = (np.clip(frames, -1.0, 1.0) * 32767).astype(np.int16)
+        return np.array([self.vad.is_speech(frame.tobytes(), rate) for frame in pcm], dtype=bool)
+
+
+def make_vad(kind="auto"):
+    """"energy", "webrtc" / "webrtc:<0-3>", or "auto" (WebRTC if it's installed, energy otherwise)"""
+    name, _, option = kind.partition(":")
+    if name in ("webrtc", "auto"):
+        try:
+            return WebRTCVAD(int(option) if option else 2)
+        except ImportError:
+            if name == "webrtc":
+                raise
+    return EnergyVAD()
+
+
+class UtteranceSegmenter:
+    """
+    Cuts a stream of samples into utterances at natural pauses.
+    Silent frames are dropped (apart from a short pre-roll so the first syllable isn't clipped),
+    an utterance ends after end_silence_ms without speech or once it's max_utterance_seconds long.
+    """
+
+    def __init__(self, vad=None, rate=16000, frame_ms=30, min_speech_ms=250, end_silence_ms=600, pre_roll_ms=300,
+                 max_utterance_seconds=30):
+        self.vad = vad or make_vad()
+        self.rate = rate
+        self.frame_length = int(rate * frame_ms / 1000)
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.end_silence_frames = max(1, end_silence_ms // frame_ms)
+        self.max_utterance_frames = int(max_utterance_seconds * 1000 / frame_ms)
+        self.pre_roll = deque(maxlen=max(1, pre_roll_ms // frame_ms))
+        self.leftover = np.zeros(0, dtype=np.float32)
+        self.utterance = []
+        self.speech_frames = 0
+        self.trailing_silence = 0
+        self.silent_frames = 0  # since the last speech frame, also outside utterances
+        self.heard_speech = False
+        self.total_frames = 0
+        self.skipped_frames = 0
+
+    def _finish(self):
+        """The current utterance without most of its trailing silence, None if it was too short to be speech"""
+        frames = self.utterance[:len(self.utterance) - max(self.trailing_silence - self.pre_roll.maxlen, 0)]
+        enough = self.speech_frames >= self.min_speech_frames
+        if not enough:
+            self.skipped_frames += len(self.utterance)
+        self.utterance = []
+        self.speech_frames = 0
+        self.trailing_silence = 0
+        return np.concatenate(frames) if enough and frames else None
+
+    def feed(self, samples):
+        """Add float32 samples, returns the list of utterances (float32 arrays) that ended"""
+        samples = np.concatenate((self.leftover, np.asarray(samples, dtype=np.float32)))
+        count = len(samples) // self.frame_length
+        self.leftover = samples[count * self.frame_length:]
+        if count == 0:
+            return []
+        frames = samples[:count * self.frame_length].reshape(count, self.frame_length)
+        speech = self.vad.detect(frames, self.rate)
+        self.total_frames += count
+
+        utterances = []
+        for frame, is_speech in zip(frames, speech):
+            self.silent_frames = 0 if is_speech else self.silent_frames + 1
+            if not self.utterance:
+                if not is_speech:
+                    if len(self.pre_roll) == self.pre_roll.maxlen:
+                        self.skipped_frames += 1
+                    self.pre_roll.append(frame)
+                    continue
+                self.utterance = list(self.pre_roll)
+                self.pre_roll.clear()
+            self.utterance.append(frame)
+            if is_speech:
+                self.heard_speech = True
+                self.speech_frames += 1
+                self.trailing_silence = 0
+            else:
+                self.trailing_silence += 1
+            if self.trailing_silence >= self.end_silence_frames or len(self.utterance) >= self.max_utterance_frames:
+                utterance = self._finish()
+                if utterance is not None:
+                    utterances.append(utterance)
+        return utterances
+
+    def flush(self):
+        """The utterance that's still open (if it's long enough), e.g. when the recording is stopped"""
+        if not self.utterance:
+            return None
+        return self._finish()
+
+    def silence_seconds(self):
+        """How long nobody has spoken"""
+        return self.silent_frames * self.frame_length / self.rate
+
+    def stats(self):
+        return {
+            "seconds": round(self.total_frames * self.frame_length / self.rate, 1),
+            "skipped_silence_seconds": round(self.skipped_frames * self.frame_length / self.rate, 1)
+        }
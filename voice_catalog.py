@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import threading
+from rich import print
+
+
+# Used when there's no Voices.txt, (name, description) like its lines
+DEFAULT_VOICES = [
+    ("James", "Husky & Engaging"),
+    ("Hope", "soothing narrator"),
+    ("David", "British Documentary"),
+    ("Matthew Schmitz", "Old Timer Mountain Man"),
+    ("Emma", "Adorable and Upbeat"),
+    ("Emily", "Whisper"),
+    ("David", "Epic Movie Trailer ")
+]
+
+
+def load_voice_descriptions(file_path="Voices.txt"):
+    """
+    Voices.txt lines look like 'Name - description', returns {name: description}.
+    The whole line is the voice's exact ElevenLabs name, trailing spaces included ('David - Epic Movie Trailer ')
+    """
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            lines = [line.rstrip("\r\n") for line in f]
+    except FileNotFoundError:
+        print(f"{file_path} not found, using default voices")
+        lines = [f"{name} - {description}" for name, description in DEFAULT_VOICES]
+    descriptions = {}
+    for line in lines:
+        if line.strip() and '-' in line:
+            name, description = line.split('-', 1)
+            descriptions[line] = description.strip()
+            descriptions.setdefault(name.strip(), description.strip())
+    return descriptions
+
+
+class VoiceCatalog:
+    """
+    All voices of the TTS backends, available right at startup.
+    The catalog is loaded from the snapshot of the last run and refreshed from the backends in the
+    background once the snapshot is older than ttl seconds. Voices.txt adds descriptions,
+    and its voice names are always part of the catalog, also the ones the backends don't list.
+    Lookups are case and whitespace insensitive and O(1).
+    Voices of unlisted backends (the local engine has about a hundred) can be looked up by name,
+    but they are left out of names, so the !voice list and its numbers stay the same.
+    """
+
+    def __init__(self, backends, snapshot_path="voice_catalog.json", voices_file="Voices.txt", ttl=3600,
+                 unlisted_backends=("local",)):
+        """
+        Parameters:
+        backends (dict): backend name -> TTSBackend
+        snapshot_path (str): json file the catalog is cached in between runs
+        voices_file (str): Voices.txt with 'Name - description' lines
+        ttl (float): seconds until the catalog is refreshed from the backends
+        unlisted_backends (tuple): backends whose voices are not in names
+        """
+        self.backends = backends
+        self.snapshot_path = snapshot_path
+        self.voices_file = voices_file
+        self.ttl = ttl
+        self.unlisted_backends = set(unlisted_backends)
+        self.lock = threading.Lock()
+        self.voices = {}  # voice name -> backend name (None if only known from Voices.txt)
+        self.index = {}  # normalized name -> voice name
+        self.names = []
+        self.descriptions = load_voice_descriptions(voices_file)
+        self.refreshed = 0
+        self.refresh_thread = None
+        self._load_snapshot()
+
+    @staticmethod
+    def _normalize(name):
+        return " ".join(name.split()).lower()
+
+    def _set_voices(self, voices, refreshed):
+        index = {self._normalize(name): name for name in voices}
+        with self.lock:
+            # Replace everything at once, readers never see a half built catalog
+            self.voices = voices
+            self.index = index
+            self.names = [name for name, backend in voices.items() if backend not in self.unlisted_backends]
+            self.refreshed = refreshed
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self._set_voices(snapshot["voices"], snapshot["refreshed"])
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            # First start: the Voices.txt names, the backends are asked in the background
+            self._set_voices(self._with_file_voices({}), 0)
+
+    def _with_file_voices(self, voices):
+        """voices plus the Voices.txt names it doesn't have yet (in any spelling), those have no known backend"""
+        known = {self._normalize(name) for name in voices}
+        merged = dict(voices)
+        for name in self.descriptions:
+            if " - " in name and self._normalize(name) not in known:
+                merged[name] = None
+        return merged
+
+    def _save_snapshot(self):
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"voices": self.voices, "refreshed": self.refreshed}, f)
+        os.replace(temp_path, self.snapshot_path)
+
+    def refresh(self):
+        """Ask every backend for its voices. Backends that fail keep their voices from before"""
+        with self.lock:
+            previous = dict(self.voices)
+        voices = {}
+        for backend_name, backend in self.backends.items():
+            try:
+                for voice in backend.list_voices():
+                    voices.setdefault(voice, backend_name)
+            except Exception as e:
+                print(f"Couldn't list the voices of the {backend_name} TTS backend: {e}")
+                voices.update({name: backend for name, backend in previous.items() if backend == backend_name})
+        if not voices:
+            return False
+        self._set_voices(self._with_file_voices(voices), time.time())
+        try:
+            self._save_snapshot()
+        except OSError as e:
+            print(f"Couldn't save the voice catalog: {e}")
+        return True
+
+    def _refresh_loop(self):
+        while True:
+            wait = self.refreshed + self.ttl - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            if not self.refresh():
+                # Nothing answered, try again a bit later instead of every loop
+                time.sleep(min(self.ttl, 60))
+
+    def start(self):
+        """Refresh in a background thread whenever the catalog is older than ttl"""
+        if self.refresh_thread is None:
+            self.refresh_thread = threading.Thread(target=self._refresh_loop, daemon=True)
+            self.refresh_thread.start()
+
+    def lookup(self, name):
+        """The voice's exact name for any spelling of it ('david - epic movie trailer'), or None"""
+        if not name:
+            return None
+        return self.index.get(self._normalize(name))
+
+    def backend_of(self, name):
+        return self.voices.get(name)
+
+    def describe(self, name):
+        return self.descriptions.get(name) or self.descriptions.get(name.strip(), "")
+
+    def stats(self):
+        return {
+            "voices": len(self.voices),
+            "refreshed": self.refreshed,
+            "age_seconds": round(time.time() - self.refreshed) if self.refreshed else None
+        }
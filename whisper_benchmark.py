@@ -0,0 +1,33 @@
+import sys
+import time
+import whisper
+from whisper.audio import SAMPLE_RATE
+from whisper_speech_to_text import SpeechToTextManager, DECODE_PROFILES
+
+# Real-time factor of every decode profile: seconds of compute per second of audio (lower is better)
+# Usage: python whisper_benchmark.py [model] [audio file] [runs]
+MODEL = sys.argv[1] if len(sys.argv) > 1 else "base"
+AUDIO_FILE = sys.argv[2] if len(sys.argv) > 2 else "TestAudio_Speech.wav"
+RUNS = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+
+def benchmark(manager, audio_data, profile, runs):
+    manager.reset_language()
+    manager.transcribe_audio(audio_data, profile)  # Warm-up, also detects a sticky language
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        text = manager.transcribe_audio(audio_data, profile)
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings), text
+
+
+if __name__ == '__main__':
+    manager = SpeechToTextManager(MODEL)
+    audio_data = whisper.load_audio(AUDIO_FILE)[:30 * SAMPLE_RATE]
+    duration = len(audio_data) / SAMPLE_RATE
+    print(f"{AUDIO_FILE}: {duration:.1f}s of audio, model {MODEL} on {manager.whisper_model.device}, {RUNS} runs\n")
+    print(f"{'profile':<10} {'best RTF':>9} {'mean RTF':>9} {'mean s':>8}  text")
+    for profile in DECODE_PROFILES:
+        best, mean, text = benchmark(manager, audio_data, profile, RUNS)
+        print(f"{profile:<10} {best / duration:>9.3f} {mean / duration:>9.3f} {mean:>8.2f}  {text[:60]}")
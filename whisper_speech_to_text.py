@@ -1,35 +1,69 @@
-import whisper
-import pyaudio
-import time
-import wave
-import uuid
 import os
+import time
+import torch
+import whisper
+import torch.nn.functional as F
+from whisper.audio import SAMPLE_RATE, N_FFT, HOP_LENGTH, N_SAMPLES, N_FRAMES, mel_filters
+from concurrent.futures import wait, FIRST_COMPLETED, TimeoutError as FutureTimeoutError
 from pynput import keyboard
+from mic_capture import MicCapture
+from voice_activity import UtteranceSegmenter, make_vad
+from stt_worker_pool import STTBusyError
+from transcript_windows import split_windows, merge_overlap
+
+# How transcribe_audio decodes:
+# sticky_language - reuse the detected language, it's only detected again while it's uncertain and every
+#                   LANGUAGE_RECHECK_CALLS calls (a pinned language skips detection entirely)
+# lean_mel - compute the spectrogram of the real audio only instead of the audio padded to 30 s
+# decoding - whisper.DecodingOptions
+DECODE_PROFILES = {
+    # The original behaviour: 30 s padding, language detection on every call, default options
+    "default": {"sticky_language": False, "lean_mel": False, "decoding": {}},
+    "accurate": {"sticky_language": True, "lean_mel": True, "decoding": {"beam_size": 5}},
+    "balanced": {"sticky_language": True, "lean_mel": True,
+                 "decoding": {"temperature": 0.0, "without_timestamps": True}},
+    # Greedy and short: chat messages rarely need more than ~100 tokens per chunk
+    "latency": {"sticky_language": True, "lean_mel": True,
+                "decoding": {"temperature": 0.0, "without_timestamps": True, "sample_len": 96}},
+}
+WHISPER_LANGUAGE = os.getenv("WHISPER_LANGUAGE")  # e.g. "de" to pin the language
+LANGUAGE_MIN_PROBABILITY = 0.8  # a sticky language detected with less confidence is detected again on the next call
+LANGUAGE_RECHECK_CALLS = 20  # and every this many calls anyway, someone else may be speaking by now
+# Value of the frames of 30 s zero padding when the audio itself is quieter: log10(1e-10) normalized like the rest
+PADDING_FLOOR = (-10.0 + 4.0) / 4.0
+
 
 class SpeechToTextManager:
     whisper_model = None
     stop_listening = False  # Flag to track stop condition
 
-    def __init__(self, model_name="base"):
-        # Load the Whisper model locally
-        self.whisper_model = whisper.load_model(model_name)
+    def __init__(self, model_name="base", vad="auto", profile="balanced", language=WHISPER_LANGUAGE, worker_pool=None):
+        self.profile = profile
+        self.pinned_language = language
+        self.language = language
+        self.language_probability = 1.0
+        self.calls_since_detection = 0
+        # With an STTWorkerPool, Whisper runs in the pool's processes and isn't loaded here
+        self.worker_pool = worker_pool
+        if worker_pool is None:
+            # Load the Whisper model locally
+            self.whisper_model = whisper.load_model(model_name)
+            # Reused for every spectrogram instead of being rebuilt per call
+            device = self.whisper_model.device
+            self.mel_filters = mel_filters(device, self.whisper_model.dims.n_mels)
+            self.window = torch.hann_window(N_FFT, device=device)
+        # The microphone is opened on first use and then stays open
+        self.mic = MicCapture()
+        self.vad = make_vad(vad)
 
     def speechtotext_from_mic(self):
         # Record audio from the microphone
         print("Recording from microphone...")
-        audio_file_path = self.record_audio_from_mic()
-
-        # Load audio file
-        audio_data = whisper.load_audio(audio_file_path)
-        audio_data = whisper.pad_or_trim(audio_data)
+        audio_data = self.record_audio_from_mic()
 
         # Transcribe audio
-        text_result = self.transcribe_audio(audio_data)
+        text_result = self._transcribe_utterance(audio_data)
         print(f"Recognized: {text_result}")
-    
-        # Clean up the temporary file
-        os.remove(audio_file_path)
-
         return text_result
 
 
@@ -37,110 +71,223 @@ class SpeechToTextManager:
         # Load audio file
         print(f"Processing file: {filename}")
         audio_data = whisper.load_audio(filename)
-        audio_data = whisper.pad_or_trim(audio_data)
 
-        # Transcribe audio
-        text_result = self.transcribe_audio(audio_data)
+        # Transcribe audio, longer files are transcribed in overlapping windows
+        text_result, _ = self.transcribe_long(audio_data)
         print(f"Recognized: {text_result}")
         return text_result
 
     def speechtotext_from_file_continuous(self, filename):
-        # Similar to the speechtotext_from_file, but handle continuous recognition
+        # Similar to the speechtotext_from_file, but prints every segment with its timestamps
         print("Continuous file recognition...")
         audio_data = whisper.load_audio(filename)
-        audio_data = whisper.pad_or_trim(audio_data)
 
-        # Transcribe audio continuously in chunks if necessary
-        final_result = self.transcribe_audio(audio_data)
+        final_result, segments = self.transcribe_long(audio_data)
+        for segment in segments:
+            print(f"[{segment['start']:7.1f}s - {segment['end']:7.1f}s] {segment['text']}")
         print(f"Recognized: {final_result}")
         return final_result
 
-    def speechtotext_from_mic_continuous(self, stop_key='p'):
-        print("Starting continuous speech-to-text from microphone... Press 'p' to stop.")
+    def speechtotext_from_mic_continuous(self, stop_key='p', end_silence=1.5, utterance_silence=0.6, max_seconds=120):
+        """
+        Listen until the speaker stops talking for end_silence seconds (or 'p' is pressed).
+        Voice activity detection cuts the audio into utterances at pauses of utterance_silence seconds,
+        every utterance is transcribed while the speaker goes on, silence is never sent to Whisper.
+        """
+        print("Starting continuous speech-to-text from microphone... Stop talking or press 'p' to stop.")
         self.stop_listening = False  # Reset stop condition each time this method is called
         all_results = []
+        segmenter = UtteranceSegmenter(self.vad, rate=self.mic.rate, end_silence_ms=int(utterance_silence * 1000))
 
         # Start listening for key presses in the background
         listener = keyboard.Listener(on_press=self.on_key_press)
         listener.start()
 
-        # Start continuous recording and transcription in chunks
+        self.mic.start()
+        self.mic.skip_to_now()
+        started = time.time()
         while not self.stop_listening:
-            # Record audio and get the file path
-            audio_file_path = self.record_audio_from_mic()
-            if not audio_file_path:
-                print("Error: Failed to record audio.")
-                continue
-
-            # Load the audio file into a NumPy array
-            audio_data = whisper.load_audio(audio_file_path)
-
-            # Transcribe the audio
-            result = self.transcribe_audio(audio_data)
-            print(f"Recognized: {result}")
-            all_results.append(result)
-
-            # Clean up the temporary audio file
-            os.remove(audio_file_path)
+            for utterance in segmenter.feed(self.mic.read(0.1)):
+                result = self._transcribe_utterance(utterance)
+                print(f"Recognized: {result}")
+                all_results.append(result)
+            # The turn ends once the speaker is quiet for long enough
+            if segmenter.heard_speech and segmenter.silence_seconds() >= end_silence:
+                break
+            if max_seconds and time.time() - started > max_seconds:
+                break
+
+        utterance = segmenter.flush()
+        if utterance is not None:
+            all_results.append(self._transcribe_utterance(utterance))
 
         # Stop the listener after finishing the loop
         listener.stop()
 
         final_result = " ".join(all_results).strip()
-        print(f"\nFinal result: {final_result}")
+        print(f"\nFinal result: {final_result} ({segmenter.stats()})")
         return final_result
 
-    def record_audio_from_mic(self, duration=5, rate=16000, channels=1, chunk_size=1024):
+    def _transcribe_utterance(self, utterance):
+        """transcribe_audio for the mic loop: a full, stuck or crashed worker pool loses the utterance, not the loop"""
         try:
-            # Set up the microphone
-            p = pyaudio.PyAudio()
-            stream = p.open(format=pyaudio.paInt16,
-                        channels=channels,
-                        rate=rate,
-                        input=True,
-                        frames_per_buffer=chunk_size)
-
+            return self.transcribe_audio(utterance)
+        except STTBusyError as e:
+            print(f"Utterance dropped: {e}")
+        except FutureTimeoutError:
+            print("Utterance dropped: the transcription took too long")
+        except RuntimeError as e:
+            # e.g. the STT worker died during the transcription
+            print(f"Utterance dropped: {e}")
+        return ""
+
+    def record_audio_from_mic(self, duration=5, fresh=True):
+        """
+        The next `duration` seconds from the microphone as a float32 array (16 kHz mono).
+        fresh drops what was recorded before the call, otherwise the audio follows right after the last read
+        """
+        try:
+            self.mic.start()
+            if fresh:
+                self.mic.skip_to_now()
             print("Recording...")
-            frames = []
-            for _ in range(0, int(rate / chunk_size * duration)):
-                data = stream.read(chunk_size)
-                frames.append(data)
-
+            audio_data = self.mic.read(duration)
             print("Recording finished.")
-            stream.stop_stream()
-            stream.close()
-            p.terminate()
-
-            # Save recorded audio to a unique temporary WAV file
-            filename = f"/tmp/temp_audio_{uuid.uuid4()}.wav"
-            with wave.open(filename, 'wb') as wf:
-                wf.setnchannels(channels)
-                wf.setsampwidth(p.get_sample_size(pyaudio.paInt16))
-                wf.setframerate(rate)
-                wf.writeframes(b''.join(frames))
-
-            return filename  # Return the path to the saved file
+            return audio_data
 
         except Exception as e:
             print(f"Error recording audio: {e}")
             return None
 
-    def transcribe_audio(self, audio_data):
-        # Ensure audio_data is in the correct format (already a NumPy array)
+    def reset_language(self):
+        """Forget the detected language (e.g. for a new speaker), a pinned language stays"""
+        self.language = self.pinned_language
+        self.language_probability = 1.0
+        self.calls_since_detection = 0
+
+    def log_mel(self, audio_data):
+        """
+        Log-mel spectrogram like whisper.log_mel_spectrogram(pad_or_trim(audio)), but only the real audio is transformed.
+        The frames after it get the value 30 s of zero padding would have had after Whisper's clamping
+        (max - 8 dB, or the 1e-10 floor itself for very quiet audio), so the result is the same as the padded version
+        """
+        audio = torch.from_numpy(audio_data[:N_SAMPLES]).to(self.whisper_model.device)
+        # One window of zeros, so the last frames see the same silence as in the padded version
+        audio = F.pad(audio, (0, N_FFT))
+        stft = torch.stft(audio, N_FFT, HOP_LENGTH, window=self.window, return_complex=True)
+        magnitudes = stft[..., :-1].abs() ** 2
+        log_spec = torch.clamp(self.mel_filters @ magnitudes, min=1e-10).log10()
+        log_spec = torch.maximum(log_spec, log_spec.max() - 8.0)
+        log_spec = (log_spec + 4.0) / 4.0
+        log_spec = log_spec[:, :N_FRAMES]
+        return F.pad(log_spec, (0, N_FRAMES - log_spec.shape[-1]), value=max(float(log_spec.max()) - 2.0, PADDING_FLOOR))
+
+    def _mel(self, audio_data, profile):
+        if profile["lean_mel"] and len(audio_data) > N_FFT:
+            return self.log_mel(audio_data)
         audio = whisper.pad_or_trim(audio_data)
+        return whisper.log_mel_spectrogram(audio, self.whisper_model.dims.n_mels).to(self.whisper_model.device)
 
-        # Generate log-Mel spectrogram
-        mel = whisper.log_mel_spectrogram(audio).to(self.whisper_model.device)
+    def transcribe_audio(self, audio_data, profile=None):
+        """Transcribe up to 30 s of 16 kHz float32 audio with a decode profile (see DECODE_PROFILES)"""
+        if self.worker_pool is not None:
+            return self.worker_pool.transcribe(audio_data, profile or self.profile)
+        return self.transcribe_batch([audio_data], profile)[0]
 
-        # Detect language
-        _, probs = self.whisper_model.detect_language(mel)
-        print(f"Detected language: {max(probs, key=probs.get)}")
+    def transcribe_batch(self, audio_chunks, profile=None):
+        """Transcribe several chunks of up to 30 s with one batched decode on the local model, returns their texts"""
+        profile = DECODE_PROFILES[profile or self.profile]
+        device = self.whisper_model.device
 
-        # Decode the audio into text
-        options = whisper.DecodingOptions()
-        result = whisper.decode(self.whisper_model, mel, options)
+        # Generate log-Mel spectrograms
+        mel = torch.stack([self._mel(chunk, profile) for chunk in audio_chunks])
 
-        return result.text
+        language = self._language_for(mel, profile)
+
+        # Decode the audio into text
+        options = whisper.DecodingOptions(language=language, fp16=device.type == "cuda", **profile["decoding"])
+        results = whisper.decode(self.whisper_model, mel, options)
+
+        return [result.text for result in results]
+
+    def _language_for(self, mel, profile):
+        """
+        The language to decode with. Detecting it is an extra encoder pass, so a sticky language is reused
+        unless it was uncertain or LANGUAGE_RECHECK_CALLS calls went by since it was detected
+        """
+        if self.pinned_language is not None:
+            return self.pinned_language
+        if profile["sticky_language"] and self.language is not None:
+            self.calls_since_detection += 1
+            if (self.language_probability >= LANGUAGE_MIN_PROBABILITY
+                    and self.calls_since_detection < LANGUAGE_RECHECK_CALLS):
+                return self.language
+        _, probs = self.whisper_model.detect_language(mel[0])
+        language = max(probs, key=probs.get)
+        print(f"Detected language: {language} ({probs[language]:.2f})")
+        if profile["sticky_language"]:
+            self.language = language
+            self.language_probability = probs[language]
+            self.calls_since_detection = 0
+        return language
+
+    def _transcribe_windows(self, windows, profile=None, batch_size=4):
+        """
+        Texts of all windows. They are decoded in parallel on the worker pool, or in batches on the local model.
+        One call keeps at most half of the pool's backlog busy, so other requests still get in
+        """
+        if self.worker_pool is None:
+            texts = []
+            for i in range(0, len(windows), batch_size):
+                texts.extend(self.transcribe_batch(windows[i:i + batch_size], profile))
+            return texts
+
+        futures = []
+        limit = max(1, self.worker_pool.max_backlog // 2)
+        for window in windows:
+            running = [future for future in futures if not future.done()]
+            if len(running) >= limit:
+                wait(running, timeout=300, return_when=FIRST_COMPLETED)
+            while True:
+                try:
+                    futures.append(self.worker_pool.submit(window, profile or self.profile))
+                    break
+                except STTBusyError:
+                    # The backlog is full, queue the next window once one of ours is done
+                    running = [future for future in futures if not future.done()]
+                    if not running:
+                        raise
+                    wait(running, timeout=300, return_when=FIRST_COMPLETED)
+        return [future.result(timeout=300) for future in futures]
+
+    def transcribe_long(self, audio_data, window_seconds=30, overlap_seconds=5, profile=None, batch_size=4):
+        """
+        Transcribe audio of any length: it's cut into overlapping windows that are decoded in parallel,
+        the words both sides of an overlap heard are only kept once.
+        Returns the text and the segments ({"start", "end", "text"}, one per window, times in seconds)
+        """
+        windows = split_windows(audio_data, window_seconds, overlap_seconds)
+        texts = self._transcribe_windows([samples for _, samples in windows], profile, batch_size)
+
+        segments = []
+        for index, ((start, samples), text) in enumerate(zip(windows, texts)):
+            words = text.split()
+            if segments:
+                previous_start, previous_samples = windows[index - 1]
+                overlap = previous_start + len(previous_samples) - start
+                keep, skip = merge_overlap(segments[-1]["words"], words,
+                                           overlap / len(previous_samples), overlap / len(samples))
+                segments[-1]["words"] = segments[-1]["words"][:keep]
+                words = words[skip:]
+            # Each window is responsible for its half of the overlaps
+            segment_start = start / SAMPLE_RATE + (overlap_seconds / 2 if index > 0 else 0)
+            segment_end = (start + len(samples)) / SAMPLE_RATE - (overlap_seconds / 2 if index < len(windows) - 1 else 0)
+            segments.append({"start": round(segment_start, 2), "end": round(segment_end, 2), "words": words})
+
+        for segment in segments:
+            segment["text"] = " ".join(segment.pop("words"))
+        segments = [segment for segment in segments if segment["text"]]
+        return " ".join(segment["text"] for segment in segments), segments
 
     def on_key_press(self, key):
         try: